@@ -15,6 +15,10 @@ PYTHONPATH="$CURDIR/src/search:${PYTHONPATH}"
 PYTHONPATH="$CURDIR/src/standup:${PYTHONPATH}"
 PYTHONPATH="$CURDIR/src/admin:${PYTHONPATH}"
 PYTHONPATH="$CURDIR/src/workspace:${PYTHONPATH}"
+PYTHONPATH="$CURDIR/src/batch:${PYTHONPATH}"
+PYTHONPATH="$CURDIR/src/stats:${PYTHONPATH}"
+PYTHONPATH="$CURDIR/src/changes:${PYTHONPATH}"
+PYTHONPATH="$CURDIR/src/bots:${PYTHONPATH}"
 PYTHONPATH="$CURDIR/src/definitions:${PYTHONPATH}"
 
 # Make the visible on the environment level
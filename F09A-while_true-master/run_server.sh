@@ -15,17 +15,29 @@ PYTHONPATH="$CURDIR/src/search:${PYTHONPATH}"
 PYTHONPATH="$CURDIR/src/standup:${PYTHONPATH}"
 PYTHONPATH="$CURDIR/src/admin:${PYTHONPATH}"
 PYTHONPATH="$CURDIR/src/workspace:${PYTHONPATH}"
+PYTHONPATH="$CURDIR/src/batch:${PYTHONPATH}"
+PYTHONPATH="$CURDIR/src/stats:${PYTHONPATH}"
+PYTHONPATH="$CURDIR/src/changes:${PYTHONPATH}"
+PYTHONPATH="$CURDIR/src/bots:${PYTHONPATH}"
 PYTHONPATH="$CURDIR/src/definitions:${PYTHONPATH}"
 
 # Make the visible on the environment level
 export PYTHONPATH
 
-# Run server.py with a port if supplied, else run without
+# Run async_server.py instead of server.py if the first
+# argument is "async"
+SERVER=src/server.py
+if [ "$1" = "async" ]; then
+    SERVER=src/async_server.py
+    shift
+fi
+
+# Run the server with a port if supplied, else run without
 # a chosen port
 if [ -n $1 ]; then
-    python3 src/server.py $1
+    python3 $SERVER $1
 else
-    python3 src/server.py
+    python3 $SERVER
 fi
 
 # Remove the variable on the environment level
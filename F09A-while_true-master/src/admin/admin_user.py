@@ -9,11 +9,7 @@ from flask import request, Blueprint
 # pylint: disable=multiple-statements
 ### Package Modules ###
 from error import InputError, AccessError
-from data_store import database
-
-### Permission Constants ###
-PERMISSION_OWNER = 1
-PERMISSION_MEMBER = 2
+from data_store import database, PERMISSION_OWNER, PERMISSION_MEMBER
 
 ### Page Blueprint ###
 ADMIN_USER_PAGE = Blueprint("admin_user_page", __name__)
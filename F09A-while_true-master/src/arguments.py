@@ -0,0 +1,21 @@
+"""
+Helpers for reading the arguments of HTTP requests shared by the routes of slackr
+"""
+
+### Package Modules ###
+from error import InputError
+
+### Functions ###
+
+def parse_int(value, name):
+    """
+    Converts an optional query string argument to an int, raising an
+    InputError if it is not a number
+    """
+    if value is None:
+        return None
+
+    try:
+        return int(value)
+    except ValueError:
+        raise InputError(description="Input error: " + name + " must be a number")
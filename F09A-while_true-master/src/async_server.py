@@ -0,0 +1,141 @@
+"""
+Asyncio (ASGI) entry point for slackr, which serves the same routes as
+server.py with uvicorn:
+
+    python3 src/async_server.py [port]
+
+uvicorn parses HTTP and reads and writes connections on its event loop,
+so idle keep-alive connections and slow clients do not each hold a thread.
+
+The routes themselves block, and the data store locks belong to the
+thread that takes them, so the Flask app is run through a2wsgi's
+WSGIMiddleware on a bounded pool of worker threads. A worker runs a route
+and hands its response to the event loop in chunks, through a queue of at
+most QUEUE_CHUNKS chunks, so a streamed response keeps its worker until it
+has been sent. Photo fetches and emails are already off the request path,
+on the photo worker pool and the outbox.
+
+The exception is a long poll of /changes (see changes.wait_for_changes),
+which does its waiting on the event loop and only takes a worker to answer.
+"""
+
+import sys
+import asyncio
+from threading import Thread
+from urllib.parse import parse_qs
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from data_store import database
+from hangman_words import words
+from error import InputError
+from changes import WAITED, wait_arguments, has_changes
+from server import APP
+
+### Server Settings ###
+# Threads that routes are run on
+WORKERS = 16
+# Most chunks of a response waiting to be sent
+QUEUE_CHUNKS = 16
+
+class AsyncApp:
+    """
+    ASGI app which runs a WSGI app on a pool of worker threads. A request
+    for changes which waits for one does its waiting on the event loop,
+    before it is given a worker.
+    """
+
+    def __init__(self, app, workers=WORKERS):
+        self.wsgi = WSGIMiddleware(terminated_input(app), workers=workers,
+                                   send_queue_size=QUEUE_CHUNKS)
+        self.loop = None
+        self.changed = None
+        database.subscribe(self.change_recorded)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self.wait_for_changes(scope)
+
+        await self.wsgi(scope, receive, send)
+
+    def change_recorded(self, _change):
+        """
+        Wakes the long polls once a change has been recorded, from any thread
+        """
+        if self.loop is None:
+            return
+
+        try:
+            self.loop.call_soon_threadsafe(self.wake)
+        except RuntimeError:
+            # The event loop has been closed
+            pass
+
+    def wake(self):
+        """
+        Wakes the long polls waiting on the current event
+        """
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def wait_for_changes(self, scope):
+        """
+        Waits on the event loop for a request for changes which gives `wait`,
+        until it has changes to return or the time is up
+        """
+        if scope["method"] != "GET" or scope["path"] != "/changes":
+            return
+
+        args = parse_qs(scope["query_string"].decode("latin-1"))
+        try:
+            waiting = wait_arguments(args.get("since", [None])[0], args.get("wait", [None])[0])
+        except InputError:
+            # The app reports the error
+            return
+
+        if waiting is None:
+            return
+
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.changed = asyncio.Event()
+
+        since, seconds = waiting
+        scope[WAITED] = True
+        deadline = self.loop.time() + seconds
+
+        while True:
+            changed = self.changed
+            remaining = deadline - self.loop.time()
+            if has_changes(since) or remaining <= 0:
+                return
+
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+### Helper Functions ###
+
+def terminated_input(app):
+    """
+    Returns the WSGI app, telling it that the request body it is given ends
+    where the request does. The adapter reads the body from the ASGI server
+    that way, and without this a chunked body, which has no Content-Length,
+    would be ignored.
+    """
+    def terminated_app(environ, start_response):
+        environ["wsgi.input_terminated"] = True
+        return app(environ, start_response)
+
+    return terminated_app
+
+ASGI_APP = AsyncApp(APP)
+
+if __name__ == "__main__":
+    # Sets up the Data Store
+    database.setup()
+    # Reads the hangman words before the first game needs them
+    Thread(target=words.preload, daemon=True).start()
+    PORT = int(sys.argv[1]) if len(sys.argv) == 2 else 8080
+    database.current_port = PORT
+    uvicorn.run(ASGI_APP, host="127.0.0.1", port=PORT, lifespan="off")
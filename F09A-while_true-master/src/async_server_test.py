@@ -0,0 +1,205 @@
+"""
+Tests for the asyncio web server.
+Most tests have self-explanatory names.
+"""
+
+import socket
+from json import dumps, loads
+from http.client import HTTPConnection
+from threading import Thread, Timer
+from time import perf_counter, sleep
+import pytest
+import uvicorn
+from async_server import AsyncApp
+from server import APP
+from changes import changes
+from data_store import database
+from auth import auth_register
+from channels import channels_create
+from users_all import users_all
+from workspace_reset import workspace_reset
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+### setup ###
+
+@pytest.fixture
+def token():
+    workspace_reset()
+    return auth_register("email0@domain.com", "a" * 8, "F" * 5, "L" * 5)["token"]
+
+@pytest.fixture
+def port():
+    listening = socket.socket()
+    listening.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(AsyncApp(APP, workers=2), lifespan="off",
+                                           log_level="warning"))
+    thread = Thread(target=server.run, kwargs={"sockets": [listening]}, daemon=True)
+    thread.start()
+    for _ in range(500):
+        if server.started:
+            break
+        sleep(0.01)
+
+    yield listening.getsockname()[1]
+
+    server.should_exit = True
+    thread.join(5)
+    listening.close()
+
+def request(connection, method, path, body=None, headers=None):
+    headers = dict(headers or {})
+    if body is not None:
+        body = dumps(body)
+        headers["Content-Type"] = "application/json"
+    connection.request(method, path, body, headers)
+    return connection.getresponse()
+
+### test serving ###
+
+def test_async_server_routes(token, port):
+    connection = HTTPConnection("127.0.0.1", port, timeout=5)
+    since = database.version_seq
+
+    response = request(connection, "POST", "/channels/create",
+                       {"token": token, "name": "channel", "is_public": True})
+    channel_id = loads(response.read())["channel_id"]
+
+    response = request(connection, "GET", "/changes?token=" + token + "&since=" + str(since))
+    data = loads(response.read())
+    assert data == changes(token, since)
+    assert data["changes"][0]["channel_id"] == channel_id
+
+    response = request(connection, "GET", "/nothing")
+    assert response.status == 404 and loads(response.read())["code"] == 404
+
+def test_async_server_keep_alive(token, port):
+    connection = HTTPConnection("127.0.0.1", port, timeout=5)
+
+    request(connection, "GET", "/users/all?token=" + token).read()
+    first = connection.sock
+    response = request(connection, "GET", "/users/all?token=" + token)
+    response.read()
+
+    # The second request went over the same connection
+    assert connection.sock is first
+    assert response.getheader("Connection") is None
+
+    response = request(connection, "GET", "/users/all?token=" + token,
+                       headers={"Connection": "close"})
+    response.read()
+    assert response.getheader("Connection") == "close"
+
+def test_async_server_chunked(token, port):
+    for index in range(50):
+        auth_register("user" + str(index) + "@domain.com", "a" * 8, "F" * 5, "L" * 5)
+    connection = HTTPConnection("127.0.0.1", port, timeout=5)
+
+    # A streamed response is sent chunked
+    response = request(connection, "GET", "/users/all?token=" + token)
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert loads(response.read()) == users_all(token)
+
+    # As can a request be
+    connection.putrequest("POST", "/auth/register")
+    connection.putheader("Content-Type", "application/json")
+    connection.putheader("Transfer-Encoding", "chunked")
+    connection.endheaders()
+    body = dumps({"email": "chunked@domain.com", "password": "a" * 8,
+                  "name_first": "F" * 5, "name_last": "L" * 5}).encode()
+    for start in range(0, len(body), 10):
+        chunk = body[start:start + 10]
+        connection.send(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+    connection.send(b"0\r\n\r\n")
+    assert "token" in loads(connection.getresponse().read())
+
+def test_async_server_head(token, port):
+    connection = HTTPConnection("127.0.0.1", port, timeout=5)
+
+    response = request(connection, "HEAD", "/users/all?token=" + token)
+    assert response.status == 200 and response.read() == b""
+
+    # The connection can still be used
+    response = request(connection, "GET", "/users/all?token=" + token)
+    assert loads(response.read()) == users_all(token)
+
+def test_async_server_not_modified(token, port):
+    connection = HTTPConnection("127.0.0.1", port, timeout=5)
+
+    response = request(connection, "GET", "/users/all?token=" + token)
+    response.read()
+    etag = response.getheader("ETag")
+
+    response = request(connection, "GET", "/users/all?token=" + token,
+                       headers={"If-None-Match": etag})
+    assert response.status == 304 and response.read() == b""
+    assert response.getheader("Transfer-Encoding") is None
+
+    response = request(connection, "GET", "/users/all?token=" + token)
+    assert response.status == 200 and loads(response.read()) == users_all(token)
+
+def test_async_server_bad_request(port):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as connection:
+        connection.sendall(b"nonsense\r\n\r\n")
+        received = b""
+        # The connection is closed after the response
+        while True:
+            data = connection.recv(1024)
+            if not data:
+                break
+            received += data
+        assert received.startswith(b"HTTP/1.1 400 ")
+
+### test waiting for changes ###
+
+def test_async_server_wait(token, port):
+    connection = HTTPConnection("127.0.0.1", port, timeout=10)
+    since = database.version_seq
+
+    timer = Timer(0.5, channels_create, (token, "channel", True))
+    timer.start()
+    started = perf_counter()
+    response = request(connection, "GET", "/changes?token=" + token + "&since=" + str(since)
+                       + "&wait=10")
+    data = loads(response.read())
+    timer.join()
+
+    assert data["changes"][0]["type"] == "channel_created"
+    assert perf_counter() - started < 5
+
+def test_async_server_wait_timeout(token, port):
+    connection = HTTPConnection("127.0.0.1", port, timeout=10)
+    since = database.version_seq
+
+    started = perf_counter()
+    response = request(connection, "GET", "/changes?token=" + token + "&since=" + str(since)
+                       + "&wait=1")
+
+    assert loads(response.read()) == {"changes": [], "next_since": since, "complete": True}
+    assert perf_counter() - started >= 1
+
+def test_async_server_wait_no_worker(token, port):
+    since = database.version_seq
+    answered = []
+
+    def poll():
+        connection = HTTPConnection("127.0.0.1", port, timeout=10)
+        response = request(connection, "GET", "/changes?token=" + token + "&since="
+                           + str(since) + "&wait=10")
+        answered.append(loads(response.read()))
+
+    # More polls than there are workers wait at once
+    polls = [Thread(target=poll) for _ in range(4)]
+    for thread in polls:
+        thread.start()
+    sleep(0.2)
+
+    connection = HTTPConnection("127.0.0.1", port, timeout=5)
+    response = request(connection, "GET", "/users/all?token=" + token)
+    assert loads(response.read()) == users_all(token)
+    assert not answered
+
+    channels_create(token, "channel", True)
+    for thread in polls:
+        thread.join(5)
+    assert len(answered) == 4
@@ -6,28 +6,29 @@ Contains auth functions and their HTTP routes
 import re
 import random
 import string
+from time import time
 from uuid import uuid4
 from json import dumps
 from flask import request, Blueprint
-import smtplib
-import ssl
 
 ### Package Modules ###
 from error import InputError
 from data_store import database
 from user_definition import User
+from locks import database_lock
+from scheduler import scheduler
+from outbox import outbox
 
 ### Page Blueprint ###
 AUTH_PAGE = Blueprint("auth_page", __name__)
 
-### Host Credentials for sending password resets ###
-# In practice, never, ever put credentials in code
-HOST_EMAIL = "f09whiletrue@gmail.com"
-HOST_PASSWORD = "whiletrue@F09"
-
 ### Reset Code Length ###
 RESET_CODE_LEN = 6
 
+### Reset Code Lifetime ###
+# Seconds a reset code can be used for after it is sent
+RESET_CODE_LIFETIME = 60 * 60
+
 ### Routes ###
 
 @AUTH_PAGE.route("/auth/register", methods=["POST"])
@@ -125,6 +126,8 @@ def auth_register(email, password, first, last):
 
     token = generate_token(new_user.user_id)
 
+    database.record("user_registered", {"u_id": new_user.user_id},
+                    "users", ("user", new_user.user_id))
     database.update()
 
     return {"u_id": new_user.user_id, "token": token}
@@ -171,20 +174,16 @@ def auth_logout(token):
 def auth_passwordreset_request(email):
     """
     Sends the email address an email containing a secret code to which
-    can be used to reset their password through /auth/passwordreset/reset
+    can be used to reset their password through /auth/passwordreset/reset.
+    The email is put in the outbox, which sends it in the background.
     """
-    u_id = database.get_user_by_email(email).user_id
-    if (u_id == None):
+    user = database.get_user_by_email(email)
+    if user is None:
         # Early return. This function should not raise any errors
         return {}
 
-    reset_code = generate_reset_code(u_id)
-    message = "Reset Code is " + reset_code
-
-    context = ssl.create_default_context()
-    with smtplib.SMTP_SSL("smtp.gmail.com", context=context) as email_server:
-        email_server.login(HOST_EMAIL, HOST_PASSWORD)
-        email_server.sendmail(HOST_EMAIL, email, message)
+    reset_code = generate_reset_code(user.user_id)
+    outbox.send(email, "Slackr password reset", "Reset Code is " + reset_code)
 
     return {}
 
@@ -242,8 +241,18 @@ def generate_reset_code(user_id):
     reset_code = "".join(random.choices(string.ascii_uppercase + \
             string.ascii_lowercase + string.digits, k=RESET_CODE_LEN))
     database.password_reset_codes[reset_code] = user_id
+    scheduler.schedule(time() + RESET_CODE_LIFETIME, "reset_code", expire_reset_code, reset_code)
     return reset_code
 
+def expire_reset_code(reset_code):
+    """
+    Stops a reset code from being used. This runs on the scheduler thread,
+    so it holds the data store lock itself.
+    """
+    with database_lock.write():
+        if database.password_reset_codes.pop(reset_code, None) is not None:
+            database.update()
+
 def count_duplicates(handle):
     """
     Counts the number of users with the given handle
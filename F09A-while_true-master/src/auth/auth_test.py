@@ -4,7 +4,9 @@ Most tests have self-explanatory names.
 """
 
 import pytest
-from auth import auth_register, auth_login, auth_logout
+from auth import auth_register, auth_login, auth_logout, auth_passwordreset_request, \
+                 auth_passwordreset_reset
+from outbox import outbox
 from user_profile import user_profile
 from error import InputError
 from workspace_reset import workspace_reset
@@ -236,3 +238,33 @@ def test_auth_logout_double():
     token = auth_register(EMAIL, PASSWORD, FIRST, LAST)["token"]
     assert auth_logout(token)["is_success"]
     assert not auth_logout(token)["is_success"]
+
+### test auth_passwordreset ###
+
+# pass cases #
+
+def test_auth_passwordreset_queued(monkeypatch):
+    emails = []
+    monkeypatch.setattr(outbox, "send", lambda *email: emails.append(email))
+    auth_register(EMAIL, PASSWORD, FIRST, LAST)
+
+    # The email is only put in the outbox, so this returns straight away
+    assert auth_passwordreset_request(EMAIL) == {}
+    [(to_address, _, body)] = emails
+    assert to_address == EMAIL
+
+    auth_passwordreset_reset(body.split()[-1], "b" * 8)
+    assert is_valid(auth_login(EMAIL, "b" * 8))
+
+def test_auth_passwordreset_unknown_email(monkeypatch):
+    emails = []
+    monkeypatch.setattr(outbox, "send", lambda *email: emails.append(email))
+
+    assert auth_passwordreset_request(EMAIL) == {}
+    assert not emails
+
+# fail cases #
+
+def test_auth_passwordreset_reset_invalid_code():
+    with pytest.raises(InputError):
+        auth_passwordreset_reset("invalid", "b" * 8)
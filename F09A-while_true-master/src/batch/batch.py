@@ -0,0 +1,162 @@
+"""
+Contains the batch function and its HTTP route, which runs many
+API calls in a single request:
+
+    /batch
+"""
+
+### Builtin/pip Modules ###
+import logging
+from json import dumps
+from flask import request, Blueprint
+from werkzeug.exceptions import HTTPException
+
+### Package Modules ###
+from error import InputError
+from data_store import database
+from auth import auth_register, auth_login, auth_logout
+from channel import channel_invite, channel_details, channel_messages, channel_leave, \
+                    channel_join, channel_addowner, channel_removeowner
+from channels import channels_list, channels_listall, channels_create
+from message import message_send, message_react, message_unreact, message_pin, \
+                    message_unpin, message_edit, message_remove, message_sendlater
+from user_profile import user_profile, user_profile_setname, user_profile_setemail, \
+                         user_profile_sethandle
+from users_all import users_all
+from search import search
+from standup import standup_start, standup_active, standup_send
+from admin_user import admin_user_permission_change, admin_user_remove
+
+LOGGER = logging.getLogger(__name__)
+
+### Page Blueprint ###
+BATCH_PAGE = Blueprint("batch_page", __name__)
+
+### Batch Limits ###
+MAX_OPERATIONS = 1000
+
+### Operations ###
+# Maps the route of each operation that can be batched to its function
+# and the names of its arguments, in the order the function takes them.
+# An argument which the route converts, such as int(channel_id), is given
+# as (name, converter) so that it is converted the same way here.
+OPERATIONS = {
+    "auth/register": (auth_register, ("email", "password", "name_first", "name_last")),
+    "auth/login": (auth_login, ("email", "password")),
+    "auth/logout": (auth_logout, ("token",)),
+    "channel/invite": (channel_invite, ("token", ("channel_id", int), "u_id")),
+    "channel/details": (channel_details, ("token", ("channel_id", int))),
+    "channel/messages": (channel_messages, ("token", ("channel_id", int), ("start", int))),
+    "channel/leave": (channel_leave, ("token", ("channel_id", int))),
+    "channel/join": (channel_join, ("token", ("channel_id", int))),
+    "channel/addowner": (channel_addowner, ("token", ("channel_id", int), "u_id")),
+    "channel/removeowner": (channel_removeowner, ("token", ("channel_id", int), "u_id")),
+    "channels/list": (channels_list, ("token",)),
+    "channels/listall": (channels_listall, ("token",)),
+    "channels/create": (channels_create, ("token", "name", "is_public")),
+    "message/send": (message_send, ("token", ("channel_id", int), "message", "idempotency_key")),
+    "message/sendlater": (message_sendlater, ("token", ("channel_id", int), "message",
+                                              "time_sent", "idempotency_key")),
+    "message/react": (message_react, ("token", "message_id", "react_id")),
+    "message/unreact": (message_unreact, ("token", "message_id", "react_id")),
+    "message/pin": (message_pin, ("token", "message_id")),
+    "message/unpin": (message_unpin, ("token", "message_id")),
+    "message/edit": (message_edit, ("token", "message_id", "message")),
+    "message/remove": (message_remove, ("token", "message_id")),
+    "user/profile": (user_profile, ("token", ("u_id", int))),
+    "user/profile/setname": (user_profile_setname, ("token", "name_first", "name_last")),
+    "user/profile/setemail": (user_profile_setemail, ("token", "email")),
+    "user/profile/sethandle": (user_profile_sethandle, ("token", "handle_str")),
+    "users/all": (users_all, ("token",)),
+    "search": (search, ("token", "query_str")),
+    "standup/start": (standup_start, ("token", ("channel_id", int), "length")),
+    "standup/active": (standup_active, ("token", ("channel_id", int))),
+    "standup/send": (standup_send, ("token", ("channel_id", int), "message")),
+    "admin/userpermission/change": (admin_user_permission_change,
+                                    ("token", "u_id", "permission_id")),
+    "admin/user/remove": (admin_user_remove, ("token", "u_id"))
+}
+
+### Routes ###
+
+@BATCH_PAGE.route("/batch", methods=["POST"])
+def route_batch():
+    """
+    HTTP route for batch
+    """
+    payload = request.get_json()
+    operations = payload.get("operations")
+
+    return dumps(batch(operations))
+
+### Functions ###
+
+def batch(operations):
+    """
+    Runs a list of operations in order, writing the data store only once
+    at the end instead of after every operation.
+
+    Arguments:
+        operations (list) - Dictionaries of the form {"op": route, "args": {...}},
+                            where route is a key of OPERATIONS and args holds
+                            the same fields the route itself takes
+
+    Exceptions:
+        InputError  - Occurs when operations is not a list
+                    - Occurs when there are more than MAX_OPERATIONS operations
+
+    Return Value:
+        Returns {results} on success, where each result is either
+        {"result": ...} or {"error": {"code", "message"}} for the
+        operation at the same index
+    """
+    if not isinstance(operations, list):
+        raise InputError(description="Input error: operations must be a list")
+
+    if len(operations) > MAX_OPERATIONS:
+        raise InputError(description="Input error: no more than " + str(MAX_OPERATIONS) \
+                                                   + " operations can be batched")
+
+    results = []
+
+    with database.deferred_updates():
+        for operation in operations:
+            try:
+                results.append({"result": run_operation(operation)})
+            except HTTPException as err:
+                results.append({"error": {"code": err.code, "message": err.description}})
+            except (TypeError, ValueError, AttributeError, KeyError):
+                results.append({"error": {"code": InputError.code,
+                                          "message": "Input error: invalid arguments"}})
+            except Exception: # pylint: disable=broad-except
+                # One operation failing does not stop the rest of the batch
+                LOGGER.exception("The batched operation %r failed", operation)
+                results.append({"error": {"code": 500,
+                                          "message": "Internal error: the operation failed"}})
+
+    return {"results": results}
+
+### Helper Functions ###
+
+def run_operation(operation):
+    """
+    Looks up a single batched operation and calls its function
+    """
+    if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+        raise InputError(description="Input error: unknown operation")
+
+    args = operation.get("args") or {}
+    if not isinstance(args, dict):
+        raise InputError(description="Input error: args must be an object")
+
+    function, names = OPERATIONS[operation["op"]]
+
+    values = []
+    for name in names:
+        if isinstance(name, tuple):
+            name, converter = name
+            values.append(converter(args.get(name)))
+        else:
+            values.append(args.get(name))
+
+    return function(*values)
@@ -0,0 +1,63 @@
+"""
+HTTP tests for the batch function.
+Most tests have self-explanatory names.
+"""
+
+import pytest
+from http_test import get, post
+from error import InputError
+
+# pylint: disable=missing-docstring,redefined-outer-name,invalid-name
+
+### setup ###
+
+def http_batch(operations):
+    return post("batch", {"operations": operations})["results"]
+
+def http_auth_register(email, password, first, last):
+    return post("auth/register", {"email": email, "password": password, \
+                                  "name_first": first, "name_last": last})
+
+def http_channels_create(token, name, is_public):
+    return post("channels/create", {"token": token, "name": name, "is_public": is_public})
+
+def http_workspace_reset():
+    post("workspace/reset")
+
+@pytest.fixture
+def setup():
+    http_workspace_reset()
+    user = http_auth_register("email0@domain.com", "a" * 8, "F" * 5, "L" * 5)
+    channel_id = http_channels_create(user["token"], "channel", True)["channel_id"]
+    return user, channel_id
+
+### test batch ###
+
+def test_http_batch(setup):
+    user, channel_id = setup
+    token = user["token"]
+    other = http_auth_register("email1@domain.com", "a" * 8, "F" * 5, "L" * 5)
+
+    results = http_batch([
+        {"op": "channel/invite",
+         "args": {"token": token, "channel_id": channel_id, "u_id": other["u_id"]}},
+        {"op": "message/send",
+         "args": {"token": other["token"], "channel_id": channel_id, "message": "hi"}},
+        {"op": "message/react",
+         "args": {"token": token, "message_id": 1, "react_id": 2}},
+        {"op": "message/react",
+         "args": {"token": token, "message_id": 1, "react_id": 1}}
+    ])
+
+    assert results[0] == {"result": {}}
+    assert results[1] == {"result": {"message_id": 1}}
+    assert "React ID is invalid" in results[2]["error"]["message"]
+    assert results[3] == {"result": {}}
+
+    messages = get("channel/messages", {"token": token, "channel_id": channel_id,
+                                        "start": 0})["messages"]
+    assert messages[0]["reacts"][0]["u_ids"] == [user["u_id"]]
+
+def test_http_batch_not_list(setup):
+    with pytest.raises(InputError):
+        http_batch("message/send")
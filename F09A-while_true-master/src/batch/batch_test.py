@@ -0,0 +1,141 @@
+"""
+Tests for the batch function.
+Most tests have self-explanatory names.
+"""
+
+from threading import Thread, Event
+import pytest
+import data_store
+import batch as _batch
+from batch import batch, MAX_OPERATIONS
+from auth import auth_register
+from channels import channels_create
+from channel import channel_messages
+from data_store import database
+from error import InputError
+from workspace_reset import workspace_reset
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+### setup ###
+
+@pytest.fixture
+def setup():
+    workspace_reset()
+    user = auth_register("email0@domain.com", "a" * 8, "F" * 5, "L" * 5)
+    channel_id = channels_create(user["token"], "channel", True)["channel_id"]
+    return user, channel_id
+
+def send(token, channel_id, message):
+    return {"op": "message/send",
+            "args": {"token": token, "channel_id": channel_id, "message": message}}
+
+### test batch ###
+
+def test_batch_in_order(setup):
+    user, channel_id = setup
+    token = user["token"]
+
+    results = batch([send(token, channel_id, "first"),
+                     send(token, channel_id, "second"),
+                     {"op": "message/react",
+                      "args": {"token": token, "message_id": 1, "react_id": 1}}])["results"]
+
+    assert results == [{"result": {"message_id": 1}},
+                       {"result": {"message_id": 2}},
+                       {"result": {}}]
+
+    messages = channel_messages(token, channel_id, 0)["messages"]
+    assert sorted(message["message"] for message in messages) == ["first", "second"]
+
+def test_batch_errors_do_not_stop_batch(setup):
+    user, channel_id = setup
+    token = user["token"]
+
+    results = batch([send(token, channel_id, "a" * 1001),
+                     send("invalidtoken", channel_id, "hello"),
+                     {"op": "workspace/reset"},
+                     send(token, channel_id, "hello")])["results"]
+
+    assert results[0]["error"]["code"] == 400
+    assert "1000 characters" in results[0]["error"]["message"]
+    assert "invalid token" in results[1]["error"]["message"]
+    assert "unknown operation" in results[2]["error"]["message"]
+    assert results[3] == {"result": {"message_id": 1}}
+
+def test_batch_missing_args(setup):
+    user, channel_id = setup
+    results = batch([{"op": "message/send", "args": {"token": user["token"],
+                                                     "channel_id": channel_id}}])["results"]
+    assert "error" in results[0]
+
+def test_batch_single_write(setup, monkeypatch):
+    user, channel_id = setup
+    token = user["token"]
+
+    writes = []
+    monkeypatch.setattr(data_store.pickle, "dump", lambda *args: writes.append(args))
+
+    batch([send(token, channel_id, str(i)) for i in range(20)])
+
+    assert len(writes) == 1
+
+def test_batch_not_list(setup):
+    with pytest.raises(InputError):
+        batch({"op": "search"})
+
+def test_batch_too_many(setup):
+    user, channel_id = setup
+    with pytest.raises(InputError):
+        batch([send(user["token"], channel_id, "hi")] * (MAX_OPERATIONS + 1))
+
+def test_batch_coerces_like_routes(setup):
+    user, channel_id = setup
+    token = user["token"]
+
+    results = batch([send(token, str(channel_id), "hello"),
+                     {"op": "channel/messages",
+                      "args": {"token": token, "channel_id": str(channel_id), "start": "0"}},
+                     {"op": "user/profile", "args": {"token": token, "u_id": str(user["u_id"])}},
+                     send(token, "abc", "hello")])["results"]
+
+    assert results[0] == {"result": {"message_id": 1}}
+    assert results[1]["result"]["messages"][0]["message"] == "hello"
+    assert results[2]["result"]["user"]["u_id"] == user["u_id"]
+    assert "invalid arguments" in results[3]["error"]["message"]
+
+def test_batch_unexpected_error(setup, monkeypatch):
+    user, channel_id = setup
+    token = user["token"]
+
+    def broken(_token):
+        raise IndexError
+
+    monkeypatch.setitem(_batch.OPERATIONS, "users/all", (broken, ("token",)))
+    results = batch([{"op": "users/all", "args": {"token": token}},
+                     send(token, channel_id, "hello")])["results"]
+
+    assert results[0]["error"]["code"] == 500
+    assert results[1] == {"result": {"message_id": 1}}
+
+def test_batch_other_threads_write(setup, monkeypatch):
+    user, channel_id = setup
+    token = user["token"]
+
+    writes = []
+    monkeypatch.setattr(data_store.pickle, "dump", lambda *args: writes.append(args))
+    written = Event()
+
+    def writer():
+        database.update()
+        written.set()
+
+    # An update from another thread is not held back by the batch
+    with database.deferred_updates():
+        thread = Thread(target=writer)
+        thread.start()
+        assert written.wait(5)
+        assert len(writes) == 1
+        batch([send(token, channel_id, "hello")])
+        assert len(writes) == 1
+    thread.join()
@@ -0,0 +1,126 @@
+'''
+bots.py
+
+Contains the engine which runs bots, such as hangman, in reply to slash
+commands sent in channels
+'''
+
+### Builtin/pip Modules ###
+import logging
+from queue import Queue
+from threading import Lock, Thread
+
+### Package Modules ###
+from data_store import database
+from locks import database_lock, channel_locks
+
+LOGGER = logging.getLogger(__name__)
+
+### Engine Settings ###
+WORKERS = 2
+
+class BotEngine:
+    '''
+    Runs the bot command which a sent message is for, such as /hangman, on a
+    worker thread, so that sending the message does not wait for the bot.
+    Bots are added with register.
+
+    Each channel's commands always go to the same worker, so they are run in
+    the order they were sent. A command runs holding the data store lock for
+    reading and its channel's lock for writing, so it is given the Channel and
+    may change it and add messages to it. A command which fails is logged and
+    counted, and the commands after it still run.
+    '''
+
+    def __init__(self, workers=WORKERS):
+        self.commands = {}
+        self.queues = [Queue() for _ in range(workers)]
+        self.threads = []
+        self.lock = Lock()
+        self.counts = {"queued": 0, "run": 0, "failed": 0}
+
+    def register(self, command, handler, exact=False):
+        '''
+        Calls handler(channel, text, time_sent) for every message sent which
+        starts with the command (such as "/guess"), or which is exactly the
+        command if `exact` is set, with the message's text and time
+        '''
+        self.commands[command] = (handler, exact)
+
+    def match(self, text):
+        '''
+        Returns the handler of the first command registered that the text
+        is for, or None
+        '''
+        for command, (handler, exact) in self.commands.items():
+            if text == command or (not exact and text.startswith(command)):
+                return handler
+
+        return None
+
+    def message_sent(self, channel_id, text, time_sent):
+        '''
+        Queues the command which a message is for, if it has a bot.
+        Returns whether a command was queued.
+        '''
+        handler = self.match(text)
+        if handler is None:
+            return False
+
+        with self.lock:
+            if not self.threads:
+                for queue in self.queues:
+                    thread = Thread(target=self.work, args=(queue,), name='bots', daemon=True)
+                    self.threads.append(thread)
+                    thread.start()
+            self.counts["queued"] += 1
+
+        self.queues[hash(channel_id) % len(self.queues)].put((handler, channel_id, text, time_sent))
+        return True
+
+    def work(self, queue):
+        '''
+        Runs the commands from one of the queues, forever
+        '''
+        while True:
+            handler, channel_id, text, time_sent = queue.get()
+            try:
+                with database_lock.read(), channel_locks.write(channel_id):
+                    channel = next((channel for channel in database.channels
+                                    if channel.channel_id == channel_id), None)
+                    # The channel is gone if the workspace was reset meanwhile
+                    if channel is not None:
+                        handler(channel, text, time_sent)
+                self.count("run")
+            except Exception: # pylint: disable=broad-except
+                # One failed command must not stop the others from running
+                LOGGER.exception("The bot command %r failed in channel %s", text, channel_id)
+                self.count("failed")
+            finally:
+                queue.task_done()
+
+    def wait(self):
+        '''
+        Waits until every queued command has been run
+        '''
+        for queue in self.queues:
+            queue.join()
+
+    def count(self, name):
+        '''
+        Adds one to a count of the engine's work
+        '''
+        with self.lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        '''
+        Returns the counts of commands queued, run and failed, and how many
+        are waiting
+        '''
+        with self.lock:
+            return dict(self.counts, waiting=sum(queue.qsize() for queue in self.queues))
+
+### Global Variables ###
+
+engine = BotEngine()
@@ -0,0 +1,138 @@
+'''
+Tests for the bot engine and the hangman bot
+'''
+# pylint: disable=redefined-outer-name
+
+from threading import Event
+import pytest
+from auth import auth_register
+from channels import channels_create
+from channel import channel_messages
+from message import message_send
+from workspace_reset import workspace_reset
+from bots import engine, BotEngine
+import hangman_bot
+
+### setup ###
+
+@pytest.fixture
+def setup_channel():
+    '''
+    Resets the workspace, and returns a token and the ID of a channel it is in
+    '''
+    workspace_reset()
+    token = auth_register("validemail@gmail.com", "123456", "John", "Citizen")["token"]
+    return token, channels_create(token, "Channel", True)["channel_id"]
+
+def bot_messages(token, channel_id):
+    '''
+    Returns the text of the bot's messages in the channel, in the order sent
+    '''
+    engine.wait()
+    messages = channel_messages(token, channel_id, 0)["messages"]
+    return [message["message"] for message in sorted(messages, key=lambda item: item["message_id"])
+            if message["u_id"] == hangman_bot.HANGMAN_ID]
+
+### test the engine ###
+
+def test_bots_off_request(setup_channel, monkeypatch):
+    '''
+    Tests that a send returns before its command has been run
+    '''
+    token, channel_id = setup_channel
+    release = Event()
+    ran = []
+
+    def slow(channel, text, time_sent):
+        release.wait(5)
+        ran.append((channel.channel_id, text))
+
+    monkeypatch.setitem(engine.commands, "/slow", (slow, False))
+    message_send(token, channel_id, "/slow down")
+    assert not ran
+
+    release.set()
+    engine.wait()
+    assert ran == [(channel_id, "/slow down")]
+
+def test_bots_not_commands(setup_channel):
+    '''
+    Tests that only messages starting with a command are queued
+    '''
+    _, channel_id = setup_channel
+    assert not engine.message_sent(channel_id, "hello /hangman", 0)
+    assert not engine.message_sent(channel_id, "", 0)
+
+def test_bots_matching(setup_channel):
+    '''
+    Tests that exact commands only match the whole message, and others
+    match any message starting with them
+    '''
+    _, channel_id = setup_channel
+    bots = BotEngine(workers=1)
+    bots.register("/exact", lambda channel, text, time_sent: None, exact=True)
+    bots.register("/prefix", lambda channel, text, time_sent: None)
+
+    assert bots.message_sent(channel_id, "/exact", 0)
+    assert not bots.message_sent(channel_id, "/exact foo", 0)
+    assert bots.message_sent(channel_id, "/prefix foo", 0)
+    assert bots.message_sent(channel_id, "/prefixfoo", 0)
+    bots.wait()
+
+def test_bots_failure(setup_channel, caplog):
+    '''
+    Tests that a command which fails is logged and counted, and does not
+    stop later commands
+    '''
+    _, channel_id = setup_channel
+    bots = BotEngine(workers=1)
+    ran = []
+
+    def fail(channel, text, time_sent):
+        raise ValueError(text)
+
+    bots.register("/fail", fail)
+    bots.register("/run", lambda channel, text, time_sent: ran.append(text))
+    bots.message_sent(channel_id, "/fail", 0)
+    bots.message_sent(channel_id, "/run", 0)
+    bots.wait()
+
+    assert ran == ["/run"]
+    assert bots.stats() == {"queued": 2, "run": 1, "failed": 1, "waiting": 0}
+    assert "ValueError" in caplog.text
+
+### test the hangman bot ###
+
+def test_hangman_not_started(setup_channel):
+    '''
+    Tests that guessing without a game asks for one to be started
+    '''
+    token, channel_id = setup_channel
+    message_send(token, channel_id, "/guess a")
+
+    assert bot_messages(token, channel_id) == ["Please start a game first, with /hangman"]
+
+def test_hangman_exact_start(setup_channel):
+    '''
+    Tests that only the exact message /hangman starts a game
+    '''
+    token, channel_id = setup_channel
+    message_send(token, channel_id, "/hangman please")
+
+    assert bot_messages(token, channel_id) == []
+
+def test_hangman_solved(setup_channel, monkeypatch):
+    '''
+    Tests a game of hangman played in order through the queue
+    '''
+    monkeypatch.setattr(hangman_bot, "get_hangman_word", lambda: "cat")
+    token, channel_id = setup_channel
+
+    message_send(token, channel_id, "/hangman")
+    message_send(token, channel_id, "/guess x")
+    message_send(token, channel_id, "/guess cat")
+
+    replies = bot_messages(token, channel_id)
+    assert replies[:2] == ["cat&&", "cat&&x"]
+    assert sorted(replies[2].split("&")[1].split(",")) == ["a", "c", "t"]
+    assert replies[3:] == ["Hangman solved!"]
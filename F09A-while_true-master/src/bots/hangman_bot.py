@@ -0,0 +1,100 @@
+'''
+hangman_bot.py
+
+Contains the hangman bot, which plays hangman in a channel through the
+/hangman and /guess commands
+'''
+
+### Package Modules ###
+from data_store import database
+from message_definition import Message
+from message import add_message
+from hangman_words import words
+from bots import engine
+
+HANGMAN_ID = 0
+
+### Commands ###
+
+def start_game(channel, message, time_now):
+    '''
+    Starts a game of hangman in the channel, for /hangman
+    '''
+    channel_id = channel.channel_id
+
+    # Start a game of hangman
+    channel.hangman_word = get_hangman_word()
+    channel.hangman_active = True
+    channel.hangman_guesses_correct = set()
+    channel.hangman_guesses_incorrect = set()
+
+    hangman_message = Message(HANGMAN_ID, channel_id, f'{channel.hangman_word}&&', time_now)
+    add_message(hangman_message)
+
+    database.update()
+
+def make_guess(channel, message, time_now):
+    '''
+    Makes a guess of a letter or the word in the channel's game, for /guess
+    '''
+    channel_id = channel.channel_id
+
+    if not channel.hangman_active:
+        hangman_message = Message(HANGMAN_ID, channel_id, "Please start a game first, with /hangman", time_now)
+        add_message(hangman_message)
+        database.update()
+        return
+
+    # Make a guess
+    guess = message.lstrip('/guess')
+
+    guess = guess[1:].lower()
+    if not guess.isalpha():
+        return
+
+    if len(guess) > 1:
+        if guess == channel.hangman_word:
+            channel.hangman_guesses_correct = channel.hangman_guesses_correct | set(guess)
+        else:
+            channel.hangman_guesses_incorrect.add(str(len(channel.hangman_guesses_incorrect)))
+    else:
+        if guess in channel.hangman_word:
+            # Correct guess
+            channel.hangman_guesses_correct.add(guess)
+        else:
+            channel.hangman_guesses_incorrect.add(guess)
+
+    correct_guess_format = ','.join(list(channel.hangman_guesses_correct))
+    incorrect_guess_format = ','.join(list(channel.hangman_guesses_incorrect))
+    hangman_message = Message(HANGMAN_ID, channel_id, f'{channel.hangman_word}&{correct_guess_format}&{incorrect_guess_format}', time_now)
+    add_message(hangman_message)
+
+    # Check if the hangman is solved
+    solved = True
+    for letter in channel.hangman_word:
+        if not letter in channel.hangman_guesses_correct:
+            solved = False
+            break
+
+    dead = len(channel.hangman_guesses_incorrect) >= 6
+    if solved or dead:
+        string = 'Hangman solved!'
+        if dead: string = 'Hangman dead! The word was "' + channel.hangman_word + '"'
+        hangman_message = Message(HANGMAN_ID, channel_id, string, time_now + 1)
+        add_message(hangman_message)
+        channel.hangman_active = False
+
+    database.update()
+
+### Helper Functions ###
+
+def get_hangman_word():
+    '''
+    Returns a random word for a game of hangman
+    '''
+    return words.choose()
+
+# As before the engine, a game is only started by exactly /hangman, and any
+# message starting with /guess is a guess
+engine.register('/hangman', start_game, exact=True)
+engine.register('/guess', make_guess)
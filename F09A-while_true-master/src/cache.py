@@ -0,0 +1,127 @@
+"""
+In-memory caches used to avoid rebuilding responses for slackr
+"""
+
+### Builtin/pip Modules ###
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+### Global Variables ###
+
+# Every cache that has been made, by name, so their statistics can be reported
+CACHES = {}
+
+class LRUCache:
+    """
+    A thread safe cache which evicts the least recently used entries once
+    it holds more than `max_entries` entries, or once the sizes given for
+    its entries add up to more than `max_size`. Hits and misses are counted.
+    When `ttl` is given, entries also expire that many seconds after being put.
+    """
+
+    def __init__(self, name, max_entries, max_size=None, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        CACHES[name] = self
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for the key, or `default` if there is none
+        """
+        with self.lock:
+            if key in self.entries and self._expired(key):
+                self._remove(key)
+
+            if key not in self.entries:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key, value, size=1):
+        """
+        Caches a value under the key, evicting old entries to make room.
+        Values bigger than the whole cache are not stored.
+        """
+        with self.lock:
+            self._remove(key)
+
+            if self.max_size is not None and size > self.max_size:
+                return
+
+            expires = monotonic() + self.ttl if self.ttl is not None else None
+            self.entries[key] = (value, size, expires)
+            self.size += size
+
+            while len(self.entries) > self.max_entries or \
+                    (self.max_size is not None and self.size > self.max_size):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def discard(self, key):
+        """
+        Removes the entry for the key if there is one
+        """
+        with self.lock:
+            self._remove(key)
+
+    def discard_if(self, predicate):
+        """
+        Removes every entry whose key the predicate returns True for
+        """
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                self._remove(key)
+
+    def clear(self):
+        """
+        Removes every entry
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Returns the usage statistics of the cache
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.entries),
+                    "size": self.size,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def _expired(self, key):
+        # Must be called with the lock held
+        expires = self.entries[key][2]
+        return expires is not None and monotonic() >= expires
+
+    def _remove(self, key):
+        # Must be called with the lock held
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+
+### Functions ###
+
+def cache_stats():
+    """
+    Returns the statistics of every cache, by name
+    """
+    return {name: cache.stats() for name, cache in CACHES.items()}
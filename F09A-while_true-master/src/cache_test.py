@@ -0,0 +1,54 @@
+"""
+Tests for the LRU cache.
+Most tests have self-explanatory names.
+"""
+
+import cache as _cache
+from cache import LRUCache
+
+# pylint: disable=missing-docstring
+
+### test LRUCache ###
+
+def test_cache_hits():
+    cache = LRUCache("test_cache_hits", max_entries=2)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    assert cache.stats() == {"entries": 1, "size": 1, "hits": 1, "misses": 1,
+                             "evictions": 0, "hit_rate": 0.5}
+
+def test_cache_eviction():
+    cache = LRUCache("test_cache_eviction", max_entries=2, max_size=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    # b was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    # c is now the least recently used
+    cache.put("d", 4, size=9)
+    assert cache.get("c") is None
+
+    # a goes to make room for a third entry, then d as the sizes add up to 14
+    cache.put("e", 5, size=5)
+    assert cache.get("a") is None and cache.get("d") is None and cache.get("e") == 5
+    assert cache.stats()["evictions"] == 4
+
+def test_cache_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(_cache, "monotonic", lambda: now[0])
+    cache = LRUCache("test_cache_expiry", max_entries=2, ttl=10)
+
+    cache.put("a", 1)
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 1
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["entries"] == 0 and stats["hits"] == 1 and stats["misses"] == 1
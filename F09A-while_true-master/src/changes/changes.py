@@ -0,0 +1,157 @@
+"""
+Contains the changes function and its HTTP route, which lets other
+programs follow everything that changes in the workspace:
+
+    /changes
+
+A request for changes may also wait for one to be recorded (a long poll),
+by giving the most seconds to wait as `wait`.
+"""
+
+### Builtin/pip Modules ###
+from json import dumps
+from threading import Condition
+from flask import request, Blueprint
+
+### Package Modules ###
+from error import InputError, AccessError
+from data_store import database
+from arguments import parse_int
+
+### Page Blueprint ###
+CHANGES_PAGE = Blueprint("changes_page", __name__)
+
+### Feed Limits ###
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+### Long Polling ###
+# Most seconds that a request may wait for a change
+MAX_WAIT = 30
+# Set in the ASGI scope of a request which has already done its waiting on
+# an event loop, such as by async_server.py. The scope reaches the app in the
+# WSGI environ as "asgi.scope".
+WAITED = "slackr.changes_waited"
+
+# Notified whenever a change is recorded, for the requests waiting on one
+change_recorded = Condition()
+
+### Routes ###
+
+@CHANGES_PAGE.route("/changes", methods=["GET"])
+def route_changes():
+    """
+    HTTP route for changes. A request which gives `wait` has already waited
+    for a change in wait_for_changes by the time it gets here.
+    """
+    token = request.args.get("token")
+    since = parse_int(request.args.get("since"), "since")
+    limit = parse_int(request.args.get("limit"), "limit")
+
+    return dumps(changes(token, since, limit))
+
+### Functions ###
+
+def changes(token, since, limit=None):
+    """
+    Returns the changes recorded after the sequence number `since`, oldest
+    first. Each change has its sequence number as "seq", its type (such as
+    "message_created" or "member_added") as "type", and the IDs it involves.
+
+    Arguments:
+        token (string)  - Token of an owner of the slackr
+        since (int)     - Sequence number of the last change already seen,
+                          or 0 for every change that is still kept
+        limit (int)     - Most changes to return, DEFAULT_LIMIT if not given
+
+    Exceptions:
+        InputError  - Occurs when since is not a number of 0 or more
+                    - Occurs when limit is not between 1 and MAX_LIMIT
+        AccessError - Occurs when the user is not an owner of the slackr
+
+    Return Value:
+        Returns {changes, next_since, complete} on success, where next_since
+        is passed back as `since` to get the following changes, and complete
+        is False when some changes after `since` are no longer kept, so the
+        caller must fetch everything again
+    """
+    user = database.get_authed_user(token)
+
+    if not user.is_owner():
+        raise AccessError(description="Access error: the user making the request is not an owner")
+
+    if not isinstance(since, int) or since < 0:
+        raise InputError(description="Input error: since must be 0 or more")
+
+    limit = DEFAULT_LIMIT if limit is None else limit
+    if not isinstance(limit, int) or not 1 <= limit <= MAX_LIMIT:
+        raise InputError(description="Input error: limit must be between 1 and " \
+                                     + str(MAX_LIMIT))
+
+    found, complete = database.changes.since(since, limit)
+
+    return {"changes": found,
+            "next_since": found[-1]["seq"] if found else since,
+            "complete": complete}
+
+def wait_for_changes():
+    """
+    This is run before each request, before the data store lock is taken.
+    A request for changes which gives `wait`, and has no changes to return
+    yet, waits until one is recorded or `wait` seconds have passed. It holds
+    no locks while waiting, but does keep its thread, unless it has already
+    waited before reaching the app (see WAITED).
+
+    Exceptions:
+        InputError  - Occurs when wait is not between 0 and MAX_WAIT
+    """
+    if request.endpoint != "changes_page.route_changes" \
+            or request.environ.get("asgi.scope", {}).get(WAITED):
+        return
+
+    waiting = wait_arguments(request.args.get("since"), request.args.get("wait"))
+    if waiting is not None:
+        since, seconds = waiting
+        with change_recorded:
+            change_recorded.wait_for(lambda: has_changes(since), seconds)
+
+### Helper Functions ###
+
+def wait_arguments(since, wait):
+    """
+    Returns the (since, seconds) that a request for changes with the given
+    query string arguments waits for, or None if it does not wait. Raises an
+    InputError if wait is not between 0 and MAX_WAIT.
+    """
+    wait = parse_int(wait, "wait")
+    if not wait:
+        return None
+
+    if not 0 < wait <= MAX_WAIT:
+        raise InputError(description="Input error: wait must be between 0 and " \
+                                     + str(MAX_WAIT))
+
+    # An invalid since is reported by changes once the request is run
+    try:
+        since = parse_int(since, "since")
+    except InputError:
+        return None
+
+    return (since, wait) if since is not None and since >= 0 else None
+
+def has_changes(since):
+    """
+    Returns whether a request for the changes after `since` has something
+    to return straight away
+    """
+    found, complete = database.changes.since(since, 1)
+    return bool(found) or not complete
+
+def notify_waiters(_change):
+    """
+    Wakes the requests waiting for a change, once one has been recorded
+    """
+    with change_recorded:
+        change_recorded.notify_all()
+
+database.subscribe(notify_waiters)
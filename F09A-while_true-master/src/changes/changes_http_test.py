@@ -0,0 +1,69 @@
+"""
+HTTP tests for the changes function.
+Most tests have self-explanatory names.
+"""
+
+from threading import Timer
+from time import perf_counter
+import pytest
+from http_test import get, post
+from error import InputError, AccessError
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+### setup ###
+
+def http_auth_register(email, password, first, last):
+    return post("auth/register", {"email": email, "password": password, \
+                                  "name_first": first, "name_last": last})
+
+@pytest.fixture
+def users():
+    post("workspace/reset")
+    owner = http_auth_register("email0@domain.com", "a" * 8, "F" * 5, "L" * 5)
+    member = http_auth_register("email1@domain.com", "a" * 8, "F" * 5, "L" * 5)
+    return owner, member
+
+### test changes ###
+
+def test_http_changes(users):
+    owner, member = users
+    since = get("changes", {"token": owner["token"], "since": 0})["next_since"]
+
+    channel_id = post("channels/create", {"token": owner["token"], "name": "channel",
+                                          "is_public": True})["channel_id"]
+    post("message/send", {"token": owner["token"], "channel_id": channel_id, "message": "hi"})
+
+    data = get("changes", {"token": owner["token"], "since": since})
+    assert [change["type"] for change in data["changes"]] \
+        == ["channel_created", "owner_added", "member_added", "message_created"]
+    assert data["next_since"] == data["changes"][-1]["seq"]
+
+def test_http_changes_not_owner(users):
+    owner, member = users
+    with pytest.raises(AccessError):
+        get("changes", {"token": member["token"], "since": 0})
+
+def test_http_changes_invalid_since(users):
+    owner, member = users
+    with pytest.raises(InputError):
+        get("changes", {"token": owner["token"], "since": "abc"})
+
+def test_http_changes_wait(users):
+    owner, member = users
+    since = get("changes", {"token": owner["token"], "since": 0})["next_since"]
+
+    timer = Timer(0.5, post, ("channels/create", {"token": owner["token"], "name": "channel",
+                                                  "is_public": True}))
+    timer.start()
+    started = perf_counter()
+    data = get("changes", {"token": owner["token"], "since": since, "wait": 10})
+    timer.join()
+
+    assert data["changes"][0]["type"] == "channel_created"
+    assert perf_counter() - started < 5
+
+def test_http_changes_invalid_wait(users):
+    owner, member = users
+    with pytest.raises(InputError):
+        get("changes", {"token": owner["token"], "since": 0, "wait": 100})
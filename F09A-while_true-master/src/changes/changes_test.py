@@ -0,0 +1,170 @@
+"""
+Tests for the changes function.
+Most tests have self-explanatory names.
+"""
+
+from json import loads
+from threading import Timer
+from time import perf_counter
+import pytest
+from server import APP
+from changes import changes, wait_arguments, MAX_WAIT, WAITED
+from data_store import database
+from auth import auth_register
+from channels import channels_create
+from channel import channel_join
+from message import message_send, message_react, message_edit
+from user_profile import user_profile_setname
+from admin_user import admin_user_permission_change
+from workspace_reset import workspace_reset
+from error import InputError, AccessError
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+### setup ###
+
+@pytest.fixture
+def users():
+    workspace_reset()
+    owner = auth_register("email0@domain.com", "a" * 8, "F" * 5, "L" * 5)
+    member = auth_register("email1@domain.com", "a" * 8, "F" * 5, "L" * 5)
+    return owner, member
+
+### test changes ###
+
+def test_changes_types(users):
+    owner, member = users
+    since = database.version_seq
+
+    channel_id = channels_create(owner["token"], "channel", True)["channel_id"]
+    channel_join(member["token"], channel_id)
+    message_id = message_send(member["token"], channel_id, "hello")["message_id"]
+    message_react(owner["token"], message_id, 1)
+    message_edit(member["token"], message_id, "hi")
+    user_profile_setname(member["token"], "G" * 5, "M" * 5)
+    admin_user_permission_change(owner["token"], member["u_id"], 1)
+
+    found = changes(owner["token"], since)["changes"]
+    assert [change["type"] for change in found] \
+        == ["channel_created", "owner_added", "member_added", "member_added",
+            "message_created", "message_reacted", "message_edited",
+            "profile_updated", "permission_changed"]
+
+    assert found[3] == {"seq": found[3]["seq"], "type": "member_added",
+                        "channel_id": channel_id, "u_id": member["u_id"]}
+    assert found[5]["react_id"] == 1 and found[5]["u_id"] == owner["u_id"]
+    assert found[8]["permission_id"] == 1
+
+    seqs = [change["seq"] for change in found]
+    assert seqs == sorted(seqs) and seqs[0] > since
+
+def test_changes_paged(users):
+    owner, member = users
+    since = database.version_seq
+
+    channel_id = channels_create(owner["token"], "channel", True)["channel_id"]
+    for _ in range(3):
+        message_send(owner["token"], channel_id, "hello")
+
+    first = changes(owner["token"], since, limit=2)
+    assert len(first["changes"]) == 2 and first["complete"]
+
+    rest = changes(owner["token"], first["next_since"])
+    assert [change["type"] for change in rest["changes"]] \
+        == ["member_added"] + ["message_created"] * 3
+
+    empty = changes(owner["token"], rest["next_since"])
+    assert empty == {"changes": [], "next_since": rest["next_since"], "complete": True}
+
+def test_changes_subscriber(users, monkeypatch):
+    owner, member = users
+    # The subscribers are kept on the class, so that they are never pickled
+    monkeypatch.setattr(type(database), "subscribers", list(database.subscribers))
+    seen = []
+    database.subscribe(seen.append, "channel_created")
+
+    channels_create(owner["token"], "channel", True)
+    assert [change["type"] for change in seen] == ["channel_created"]
+
+def test_changes_incomplete(users, monkeypatch):
+    owner, member = users
+    since = database.version_seq
+    channels_create(owner["token"], "channel", True)
+
+    # As if the change after `since` had been dropped from the log
+    monkeypatch.setattr(database.changes, "floor", since + 1)
+    assert not changes(owner["token"], since)["complete"]
+    assert changes(owner["token"], since + 1)["complete"]
+
+def test_changes_not_owner(users):
+    owner, member = users
+    with pytest.raises(AccessError):
+        changes(member["token"], 0)
+
+def test_changes_invalid_since(users):
+    owner, member = users
+    with pytest.raises(InputError):
+        changes(owner["token"], -1)
+    with pytest.raises(InputError):
+        changes(owner["token"], None)
+
+def test_changes_invalid_limit(users):
+    owner, member = users
+    with pytest.raises(InputError):
+        changes(owner["token"], 0, limit=0)
+
+### test waiting for changes ###
+
+def test_changes_wait_arguments():
+    assert wait_arguments("5", None) is None
+    assert wait_arguments("5", "0") is None
+    assert wait_arguments("5", "2") == (5, 2)
+    assert wait_arguments("abc", "2") is None
+    with pytest.raises(InputError):
+        wait_arguments("5", str(MAX_WAIT + 1))
+    with pytest.raises(InputError):
+        wait_arguments("5", "-1")
+
+def test_changes_wait(users):
+    owner, member = users
+    since = database.version_seq
+
+    timer = Timer(0.5, channels_create, (owner["token"], "channel", True))
+    timer.start()
+    started = perf_counter()
+    response = APP.test_client().get("/changes", query_string={
+        "token": owner["token"], "since": since, "wait": 10})
+    timer.join()
+
+    assert loads(response.data)["changes"][0]["type"] == "channel_created"
+    assert perf_counter() - started < 5
+
+def test_changes_wait_timeout(users):
+    owner, member = users
+    since = database.version_seq
+
+    started = perf_counter()
+    response = APP.test_client().get("/changes", query_string={
+        "token": owner["token"], "since": since, "wait": 1})
+
+    assert loads(response.data) == {"changes": [], "next_since": since, "complete": True}
+    assert perf_counter() - started >= 1
+
+def test_changes_wait_already_waited(users):
+    owner, member = users
+    since = database.version_seq
+
+    # A request which waited elsewhere is answered straight away
+    started = perf_counter()
+    response = APP.test_client().get("/changes", query_string={
+        "token": owner["token"], "since": since, "wait": 10},
+                                     environ_overrides={"asgi.scope": {WAITED: True}})
+
+    assert loads(response.data)["changes"] == []
+    assert perf_counter() - started < 5
+
+def test_changes_invalid_wait(users):
+    owner, member = users
+    response = APP.test_client().get("/changes", query_string={
+        "token": owner["token"], "since": 0, "wait": MAX_WAIT + 1})
+    assert response.status_code == 400
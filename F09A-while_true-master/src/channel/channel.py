@@ -12,11 +12,21 @@ Contains channel routes and their functions of the following:
 
 ### Builtin/pip Modules ###
 from json import dumps
+from bisect import bisect_right
 from flask import request, Blueprint
 
 ### Package Modules ###
 from error import AccessError, InputError
 from data_store import database
+from channel_definition import Channel, channel_key
+from message_definition import json_for
+from locks import holding_channel, channel_scoped
+from responses import conditional_response
+from cache import LRUCache
+
+### Page Cache ###
+# Encoded pages of /channel/messages, which are shared by every member
+PAGE_CACHE = LRUCache("channel_messages", max_entries=4096, max_size=32 * 1024 * 1024)
 
 ### Page Blueprint ###
 CHANNEL_PAGE = Blueprint("channel_page", __name__)
@@ -24,6 +34,7 @@ CHANNEL_PAGE = Blueprint("channel_page", __name__)
 ### Routes ###
 
 @CHANNEL_PAGE.route("/channel/invite", methods=["POST"])
+@channel_scoped
 def route_channel_invite():
     """
     /channel/invite POST route
@@ -43,7 +54,8 @@ def route_channel_details():
     token = request.args.get("token")
     channel_id = int(request.args.get("channel_id"))
 
-    return dumps(channel_details(token, channel_id))
+    return conditional_response(channel_details_version(token, channel_id),
+                                lambda: channel_details(token, channel_id))
 
 @CHANNEL_PAGE.route("/channel/messages", methods=["GET"])
 def route_channel_messages():
@@ -54,9 +66,11 @@ def route_channel_messages():
     channel_id = int(request.args.get("channel_id"))
     start = int(request.args.get("start"))
 
-    return dumps(channel_messages(token, channel_id, start))
+    return conditional_response(channel_messages_version(token, channel_id, start),
+                                lambda: channel_messages_encoded(token, channel_id, start))
 
 @CHANNEL_PAGE.route("/channel/leave", methods=["POST"])
+@channel_scoped
 def route_channel_leave():
     """
     /channel/leave POST route
@@ -68,6 +82,7 @@ def route_channel_leave():
     return dumps(channel_leave(token, channel_id))
 
 @CHANNEL_PAGE.route("/channel/join", methods=["POST"])
+@channel_scoped
 def route_channel_join():
     """
     /channel/join POST route
@@ -79,6 +94,7 @@ def route_channel_join():
     return dumps(channel_join(token, channel_id))
 
 @CHANNEL_PAGE.route("/channel/addowner", methods=["POST"])
+@channel_scoped
 def route_channel_addowner():
     """
     /channel/addowner POST route
@@ -91,6 +107,7 @@ def route_channel_addowner():
     return dumps(channel_addowner(token, channel_id, u_id))
 
 @CHANNEL_PAGE.route("/channel/removeowner", methods=["POST"])
+@channel_scoped
 def route_channel_removeowner():
     """
     /channel/removeowner POST route
@@ -104,6 +121,7 @@ def route_channel_removeowner():
 
 ### Functions ###
 
+@holding_channel(channel_key)
 def channel_invite(token, channel_id, u_id):
     """
     Invites a user to a channel
@@ -151,14 +169,7 @@ def channel_details(token, channel_id):
     Return Value:
         Returns {} on success
     """
-    authed_user = database.get_authed_user(token)
-
-    # Get the channel
-    channel = database.get_channel(channel_id)
-
-    # Error checking
-    if not channel.has_member(authed_user):
-        raise AccessError(description="Unauthorised User")
+    channel = get_member_channel(token, channel_id)[1]
 
     return channel.json()
 
@@ -180,14 +191,10 @@ def channel_messages(token, channel_id, start):
     Return Value:
         Returns {} on success
     """
-    authed_user = database.get_authed_user(token)
-    channel = database.get_channel(channel_id)
+    authed_user, channel = get_member_channel(token, channel_id)
 
-    # Error checking
-    if not channel.has_member(authed_user):
-        raise AccessError(description="Unauthorised User")
-
-    messages = channel.json_messages(authed_user)
+    # Read from a snapshot of the channel, so no lock is held
+    messages = channel.visible_messages()
 
     # Error checking
     # Do not raise error if there are no messages and start is 0
@@ -204,12 +211,13 @@ def channel_messages(token, channel_id, start):
     # Slice the messages list to get messages from index of
     # start + 0 ... start + 49 messages inclusive
     messages = messages[start:]
-    messages = messages[:50]
+    messages = [json_for(fragment, authed_user) for fragment in messages[:50]]
 
     # Store data in payload and return
     payload = {"messages": messages, "start": start, "end": end}
     return payload
 
+@holding_channel(channel_key)
 def channel_leave(token, channel_id):
     """
     Removes a user from the channel
@@ -241,6 +249,7 @@ def channel_leave(token, channel_id):
 
     return {}
 
+@holding_channel(channel_key)
 def channel_join(token, channel_id):
     """
     Adds a user to the channel
@@ -273,6 +282,7 @@ def channel_join(token, channel_id):
 
     return {}
 
+@holding_channel(channel_key)
 def channel_addowner(token, channel_id, u_id):
     """
     Makes a user an owner of the channel
@@ -310,6 +320,7 @@ def channel_addowner(token, channel_id, u_id):
 
     return {}
 
+@holding_channel(channel_key)
 def channel_removeowner(token, channel_id, u_id):
     """
     Remove a user as an owner of the channel
@@ -346,3 +357,105 @@ def channel_removeowner(token, channel_id, u_id):
     database.update()
 
     return {}
+
+### Helper Functions ###
+
+def get_member_channel(token, channel_id):
+    """
+    Returns the authorised user and the channel with the given ID,
+    raising an AccessError if the user is not a member of the channel
+    """
+    authed_user = database.get_authed_user(token)
+    channel = database.get_channel(channel_id)
+
+    # Error checking
+    if not channel.has_member(authed_user):
+        raise AccessError(description="Unauthorised User")
+
+    return authed_user, channel
+
+def channel_details_version(token, channel_id):
+    """
+    Checks the authorised user can see the channel details, and returns
+    the versions they depend on. Members' names and pictures come from
+    their profiles, so the version of the channel's roster is included.
+    """
+    get_member_channel(token, channel_id)
+
+    return (database.version(("channel", channel_id)),
+            database.version(("channel_roster", channel_id)))
+
+def channel_messages_version(token, channel_id, start):
+    """
+    Checks the authorised user can see the channel messages, and returns
+    the versions they depend on. Reacts are shown from the user's point
+    of view, so the user is included.
+    """
+    authed_user = get_member_channel(token, channel_id)[0]
+
+    return messages_version(channel_id) + (authed_user.user_id, start)
+
+def messages_version(channel_id):
+    """
+    Returns the version of a channel's messages. Messages sent later
+    appear once their time passes, so the number of those now visible
+    is part of it.
+    """
+    scheduled = database.scheduled_times.get(channel_id, [])
+    released = bisect_right(scheduled, Channel.visible_until())
+
+    return (database.version(("channel_messages", channel_id)), released)
+
+def channel_messages_encoded(token, channel_id, start):
+    """
+    Returns the same payload as channel_messages, already encoded as JSON.
+
+    Pages are cached by channel, version and start. The only part of a page
+    that differs between members is is_this_user_reacted, so the cached
+    page is split around those values and they are filled in per member.
+    """
+    authed_user = get_member_channel(token, channel_id)[0]
+    key = (channel_id,) + messages_version(channel_id) + (start,)
+
+    template = PAGE_CACHE.get(key)
+    if template is None:
+        template = page_template(channel_messages(token, channel_id, start))
+        PAGE_CACHE.put(key, template, sum(len(part) for part in template))
+
+    return "".join(part if isinstance(part, str) else
+                   ("true" if authed_user.user_id in part else "false")
+                   for part in template)
+
+def page_template(payload):
+    """
+    Encodes a channel_messages payload as JSON, returning a list of the
+    encoded pieces in which each is_this_user_reacted value is replaced by
+    the frozenset of users who made that react
+    """
+    template = []
+    pieces = []
+
+    def flush():
+        if pieces:
+            template.append("".join(pieces))
+            pieces.clear()
+
+    pieces.append('{"messages": [')
+    for index, message in enumerate(payload["messages"]):
+        reacts = message["reacts"]
+        encoded = dumps(dict(message, reacts=[]))
+        head, tail = encoded.split('"reacts": []', 1)
+
+        pieces.append((", " if index else "") + head + '"reacts": [')
+        for react_index, react in enumerate(reacts):
+            pieces.append((", " if react_index else "") + '{"react_id": ' + dumps(react["react_id"])
+                          + ', "u_ids": ' + dumps(react["u_ids"]) + ', "is_this_user_reacted": ')
+            flush()
+            template.append(frozenset(react["u_ids"]))
+            pieces.append("}")
+        pieces.append("]" + tail)
+
+    pieces.append('], "start": ' + dumps(payload["start"]) + ', "end": ' + dumps(payload["end"]) + "}")
+    flush()
+
+    return template
@@ -224,6 +224,40 @@ def test_channel_details_unauth(setup_user_1, setup_user_2):
     data = json.loads(response.text)
     assert response.status_code == 400 and "Unauthorised User" in data["message"]
 
+def test_channel_details_not_modified(setup_user_1, setup_user_2):
+    ''' Tests that an unchanged channel/details responds with 304 for its ETag '''
+    user_1_token = setup_user_1["token"]
+    channel_id = call_channels_create(user_1_token, "channel 1", True)
+
+    payload = {"token": user_1_token, "channel_id": channel_id}
+    response = requests.get(APP_URL + "/channel/details", params=payload)
+    etag = response.headers["ETag"]
+
+    response = requests.get(APP_URL + "/channel/details", params=payload,
+                            headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.text == ""
+
+    # A new member changes the details, so the full response is sent again
+    call_channel_invite(user_1_token, channel_id, setup_user_2["u_id"])
+    response = requests.get(APP_URL + "/channel/details", params=payload,
+                            headers={"If-None-Match": etag})
+    data = json.loads(response.text)
+    assert response.status_code == 200 and len(data["all_members"]) == 2
+    assert response.headers["ETag"] != etag
+
+def test_channel_details_not_modified_unauth(setup_user_1, setup_user_2):
+    ''' Tests that an ETag does not let a non-member skip the access check '''
+    user_1_token = setup_user_1["token"]
+    channel_id = call_channels_create(user_1_token, "channel 1", True)
+
+    payload = {"token": user_1_token, "channel_id": channel_id}
+    etag = requests.get(APP_URL + "/channel/details", params=payload).headers["ETag"]
+
+    payload = {"token": setup_user_2["token"], "channel_id": channel_id}
+    response = requests.get(APP_URL + "/channel/details", params=payload,
+                            headers={"If-None-Match": etag})
+    assert response.status_code == 400
+
 # channel/messages Tests
 
 def test_channel_messages_normal(setup_user_1):
@@ -291,6 +325,25 @@ def test_channel_messages_start_greater(setup_user_1):
     assert response.status_code == 400 and "Start is not valid" \
             in data["message"]
 
+def test_channel_messages_not_modified(setup_user_1):
+    ''' Tests that channel/messages responds with 304 until a message is sent '''
+    user_token = setup_user_1["token"]
+    channel_id = call_channels_create(user_token, "channel 1", True)
+    call_message_send(user_token, channel_id, "Hello")
+
+    payload = {"token": user_token, "channel_id": channel_id, "start": 0}
+    etag = requests.get(APP_URL + "/channel/messages", params=payload).headers["ETag"]
+
+    response = requests.get(APP_URL + "/channel/messages", params=payload,
+                            headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    call_message_send(user_token, channel_id, "Hello again")
+    response = requests.get(APP_URL + "/channel/messages", params=payload,
+                            headers={"If-None-Match": etag})
+    data = json.loads(response.text)
+    assert response.status_code == 200 and len(data["messages"]) == 2
+
 # channel/leave Tests
 
 def test_channel_leave_normal(setup_user_1, setup_user_2):
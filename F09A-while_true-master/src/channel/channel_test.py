@@ -4,13 +4,21 @@ Tests the backend functionality of the channel routes
 '''
 
 from time import time
+import pickle
+from json import dumps
+from threading import Thread, Event
 import pytest
 from channel import channel_invite, channel_details, channel_messages, channel_leave, \
-                    channel_join, channel_addowner, channel_removeowner
+                    channel_join, channel_addowner, channel_removeowner, \
+                    channel_messages_encoded, PAGE_CACHE
 from auth import auth_register, auth_logout
 from channels import channels_create
-from message import message_send, message_sendlater
+from message import message_send, message_sendlater, message_react, message_edit, \
+                    message_remove
+from user_profile import user_profile_setname
 from workspace_reset import workspace_reset
+from data_store import database
+from locks import channel_locks
 from error import InputError, AccessError
 
 
@@ -153,6 +161,29 @@ def test_channel_details_normal(setup_user_1):
 
     assert is_details_valid(channel_details(token, channel_id))
 
+def test_channel_details_roster_updated(setup_user_1, setup_user_2):
+    ''' Tests that the cached members follow membership and profile changes '''
+    token = setup_user_1["token"]
+    other = setup_user_2
+    channel_id = channels_create(token, "Chan1", True)["channel_id"]
+    assert len(channel_details(token, channel_id)["all_members"]) == 1
+
+    channel_join(other["token"], channel_id)
+    assert [member["u_id"] for member in channel_details(token, channel_id)["all_members"]] \
+           == [setup_user_1["u_id"], other["u_id"]]
+
+    channel_addowner(token, channel_id, other["u_id"])
+    assert len(channel_details(token, channel_id)["owner_members"]) == 2
+
+    user_profile_setname(other["token"], "Janet", "Citizen")
+    assert channel_details(token, channel_id)["all_members"][1]["name_first"] == "Janet"
+    assert channel_details(token, channel_id)["owner_members"][1]["name_first"] == "Janet"
+
+    channel_removeowner(token, channel_id, other["u_id"])
+    channel_leave(other["token"], channel_id)
+    details = channel_details(token, channel_id)
+    assert len(details["owner_members"]) == 1 and len(details["all_members"]) == 1
+
 # fail cases #
 
 def test_channel_details_invalid_token(setup_user_1):
@@ -242,6 +273,109 @@ def test_channel_messages_sendlater(setup_user_1):
     assert len(messages["messages"]) == 1
     assert messages["end"] == -1
 
+def test_channel_messages_encoded(setup_user_1, setup_user_2):
+    ''' Tests cached pages match channel_messages for each member '''
+    user_1_token = setup_user_1["token"]
+    user_2_token = setup_user_2["token"]
+    channel_id = channels_create(user_1_token, "Chan1", True)["channel_id"]
+    channel_join(user_2_token, channel_id)
+    create_messages(channel_id, user_1_token, "hello \"reacts\": []", 3, 0)
+    message_react(user_1_token, 2, 1)
+
+    for token in (user_1_token, user_2_token, user_1_token):
+        assert channel_messages_encoded(token, channel_id, 0) \
+                == dumps(channel_messages(token, channel_id, 0))
+
+def test_channel_messages_encoded_cache(setup_user_1):
+    ''' Tests pages are served from the cache until the messages change '''
+    token = setup_user_1["token"]
+    channel_id = channels_create(token, "Chan1", True)["channel_id"]
+    create_messages(channel_id, token, "hello", 3, 0)
+
+    hits = PAGE_CACHE.stats()["hits"]
+    channel_messages_encoded(token, channel_id, 0)
+    channel_messages_encoded(token, channel_id, 0)
+    assert PAGE_CACHE.stats()["hits"] == hits + 1
+
+    message_edit(token, 1, "edited")
+    assert "edited" in channel_messages_encoded(token, channel_id, 0)
+
+def test_channel_messages_snapshot(setup_user_1):
+    ''' Tests snapshots are kept until a change, and are not changed by it '''
+    token = setup_user_1["token"]
+    channel_id = channels_create(token, "Chan1", True)["channel_id"]
+    message_id = message_send(token, channel_id, "hello")["message_id"]
+    channel = database.get_channel(channel_id)
+
+    snapshot = channel.view()
+    assert channel.view() is snapshot
+
+    message_edit(token, message_id, "edited")
+    assert snapshot.messages[0]["message"] == "hello"
+    assert channel.view() is not snapshot
+    assert channel_messages(token, channel_id, 0)["messages"][0]["message"] == "edited"
+
+def test_channel_snapshot_roster_version(setup_user_1):
+    ''' Tests only profile changes of a channel's members make a new snapshot '''
+    token = setup_user_1["token"]
+    channel_id = channels_create(token, "Chan1", True)["channel_id"]
+    channel = database.get_channel(channel_id)
+    snapshot = channel.view()
+
+    # Someone outside the channel registering or changing their name
+    other = auth_register("other@unsw.edu.au", "123456", "Other", "User")["token"]
+    user_profile_setname(other, "Changed", "Name")
+    assert channel.view() is snapshot
+
+    user_profile_setname(token, "Changed", "Name")
+    assert channel.view() is not snapshot
+    assert channel.view().all_members[0]["name_first"] == "Changed"
+
+def test_channel_messages_index(setup_user_1):
+    ''' Tests the message index is kept in order without the data store being searched '''
+    token = setup_user_1["token"]
+    channel_id = channels_create(token, "Chan1", True)["channel_id"]
+    other_id = channels_create(token, "Chan2", True)["channel_id"]
+    first = message_send(token, channel_id, "first")["message_id"]
+    message_send(token, other_id, "other")
+    later = message_sendlater(token, channel_id, "later", int(time()) + 60)["message_id"]
+    second = message_send(token, channel_id, "second")["message_id"]
+    removed = message_send(token, channel_id, "removed")["message_id"]
+    message_remove(token, removed)
+    channel = database.get_channel(channel_id)
+
+    # Most recent first, and messages sent in the same second in the order they were sent
+    expected = [message.message_id for message in sorted(
+        (message for message in database.messages if message.channel == channel_id),
+        key=lambda message: -message.time_sent)]
+    assert expected[0] == later and sorted(expected) == [first, later, second]
+    assert [message.message_id for message in channel.indexed_messages()] == expected
+    assert [message["message_id"] for message in channel.view().messages] == expected
+
+    # A loaded channel builds its index again from the data store
+    loaded = pickle.loads(pickle.dumps(channel))
+    assert loaded.message_index is None
+    assert [message.message_id for message in loaded.indexed_messages()] == expected
+
+def test_channel_messages_while_locked(setup_user_1):
+    ''' Tests the messages can be read while the channel is being changed '''
+    token = setup_user_1["token"]
+    channel_id = channels_create(token, "Chan1", True)["channel_id"]
+    message_send(token, channel_id, "hello")
+    channel_messages(token, channel_id, 0)
+    read = Event()
+
+    def reader():
+        channel_messages(token, channel_id, 0)
+        channel_details(token, channel_id)
+        read.set()
+
+    with channel_locks.write(channel_id):
+        thread = Thread(target=reader)
+        thread.start()
+        assert read.wait(5)
+    thread.join()
+
 # fail cases #
 
 def test_channel_messages_invalid_token(setup_user_1):
@@ -16,10 +16,22 @@ from flask import request, Blueprint
 from error import AccessError, InputError
 from data_store import database
 from channel_definition import Channel
+from channel_directory import directory
+from responses import conditional_response
+from cache import LRUCache
 
 ### Page Blueprint ###
 CHANNELS_PAGE = Blueprint("channels_page", __name__)
 
+### Payload Caches ###
+# Encoded lists of channels. A user's list is keyed by the version of their
+# channels, while the list of all channels is dropped whenever one is made.
+LIST_CACHE = LRUCache("channels_list", max_entries=4096, max_size=16 * 1024 * 1024)
+LISTALL_CACHE = LRUCache("channels_listall", max_entries=16, max_size=16 * 1024 * 1024)
+database.watch("channel_list", lambda key: LISTALL_CACHE.clear())
+database.watch("workspace", lambda key: LIST_CACHE.clear())
+database.watch("workspace", lambda key: LISTALL_CACHE.clear())
+
 ### Routes ###
 
 @CHANNELS_PAGE.route("/channels/list", methods=['GET'])
@@ -29,7 +41,9 @@ def route_channels_list():
     '''
     token = request.args.get('token')
 
-    return dumps(channels_list(token))
+    return conditional_response(channels_list_version(token),
+                                lambda: channels_list(token),
+                                cache=LIST_CACHE)
 
 @CHANNELS_PAGE.route('/channels/listall', methods=['GET'])
 def route_channels_listall():
@@ -38,7 +52,9 @@ def route_channels_listall():
     '''
     token = request.args.get('token')
 
-    return dumps(channels_listall(token))
+    return conditional_response(channels_listall_version(token),
+                                lambda: channels_listall_payload(token),
+                                stream=True, cache=LISTALL_CACHE)
 
 @CHANNELS_PAGE.route('/channels/create', methods=['POST'])
 def route_channels_create():
@@ -66,15 +82,7 @@ def channels_list(token):
     '''
     user = database.get_authed_user(token)
 
-    channels = []
-
-    for channel in database.channels:
-        if channel.has_member(user):
-            new = {'channel_id': channel.channel_id,
-                   'name': channel.name}
-            channels.append(new)
-
-    return {'channels': channels}
+    return {'channels': directory.channels_of(user)}
 
 def channels_listall(token):
     '''
@@ -86,17 +94,10 @@ def channels_listall(token):
     Return Value:
         Returns a list of all the channels on success
     '''
-    user = database.get_authed_user(token)
-
-    channels = []
+    data = channels_listall_payload(token)
+    data['channels'] = list(data['channels'])
 
-    # Iterates through all channels and adds dictionaries with their details
-    for channel in database.channels:
-        entry = {'channel_id': channel.channel_id,
-                 'name': channel.name}
-        channels.append(entry)
-
-    return {'channels': channels}
+    return data
 
 def channels_create(token, name, is_public):
     '''
@@ -121,13 +122,46 @@ def channels_create(token, name, is_public):
 
     # Create a new channel and add it to the DB
     new_channel = Channel(name, is_public)
+    database.channels.append(new_channel)
+    database.record("channel_created", {"channel_id": new_channel.channel_id, "name": name,
+                                        "is_public": is_public}, "channel_list")
 
     # Make the user a member and owner
     new_channel.add_owner(user)
     new_channel.add_member(user)
-    database.channels.append(new_channel)
 
     # Update the pickle file
     database.update()
 
     return {'channel_id': new_channel.channel_id}
+
+### Helper Functions ###
+
+def channels_listall_payload(token):
+    '''
+    Does the work of channels_listall, leaving the channels as a generator
+    so they can be streamed to the client
+    '''
+    database.get_authed_user(token)
+
+    # Iterates through all channels and yields dictionaries with their details
+    channels = ({'channel_id': channel.channel_id,
+                 'name': channel.name} for channel in database.channels)
+
+    return {'channels': channels}
+
+def channels_list_version(token):
+    '''
+    Returns the versions that the authorised user's list of channels depends on
+    '''
+    user = database.get_authed_user(token)
+
+    return (database.version(("user_channels", user.user_id)), user.user_id)
+
+def channels_listall_version(token):
+    '''
+    Returns the versions that the list of all channels depends on
+    '''
+    database.get_authed_user(token)
+
+    return (database.version("channel_list"),)
@@ -94,6 +94,29 @@ def test_channels_list_multiple(setup_user):
         ]
     }
 
+def test_channels_list_after_leave(setup_user):
+    '''
+    test that a repeated list is served again and follows a join and leave
+    '''
+    token = setup_user
+    call_channels_create(token, "First Channel", True)
+    other = requests.post(APP_URL + "/auth/register",
+                          json={'email': 'other@ad.unsw.edu.au', 'password': 'abc123',
+                                'name_first': 'Jane', 'name_last': 'Bloggs'}).json()['token']
+    payload = {'token': other}
+
+    first = requests.get(APP_URL + "/channels/list", params=payload).text
+    assert requests.get(APP_URL + "/channels/list", params=payload).text == first
+
+    requests.post(APP_URL + "/channel/join", json={'token': other, 'channel_id': 1})
+    response = requests.get(APP_URL + "/channels/list", params=payload)
+    assert json.loads(response.text) == {'channels': [{'channel_id': 1,
+                                                       'name': 'First Channel'}]}
+
+    requests.post(APP_URL + "/channel/leave", json={'token': other, 'channel_id': 1})
+    response = requests.get(APP_URL + "/channels/list", params=payload)
+    assert json.loads(response.text) == {'channels': []}
+
 def test_channels_list_invalid_token():
     '''
     test when the token is invalid
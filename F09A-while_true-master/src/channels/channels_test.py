@@ -17,6 +17,8 @@ from error import InputError, AccessError
 # Functions to help with setup
 from workspace_reset import workspace_reset
 from channels import channels_list, channels_create, channels_listall
+from channel import channel_join, channel_leave, channel_invite
+from admin_user import admin_user_remove
 from auth import auth_register
 
 @pytest.fixture(autouse=True)
@@ -88,6 +90,42 @@ def test_channels_list_multiple(setup_user):
             ]
     }
 
+def test_channels_list_updated(setup_user):
+    '''
+    Tests that a user's list of channels follows joins, leaves, invites
+    and removals after it has first been built
+    '''
+    token = setup_user
+    other = auth_register('other@ad.unsw.edu.au', 'abc123', 'Jane', 'Bloggs')
+
+    first = channels_create(token, 'First', True)['channel_id']
+    second = channels_create(token, 'Second', True)['channel_id']
+    third = channels_create(token, 'Third', False)['channel_id']
+    assert channels_list(other['token']) == {'channels': []}
+
+    channel_join(other['token'], second)
+    channel_invite(token, third, other['u_id'])
+    channel_join(other['token'], first)
+    assert channels_list(other['token']) == {'channels': [
+        {'channel_id': first, 'name': 'First'},
+        {'channel_id': second, 'name': 'Second'},
+        {'channel_id': third, 'name': 'Third'}
+    ]}
+
+    channel_leave(other['token'], second)
+    assert channels_list(other['token']) == {'channels': [
+        {'channel_id': first, 'name': 'First'},
+        {'channel_id': third, 'name': 'Third'}
+    ]}
+
+    channels_list(token)
+    admin_user_remove(token, other['u_id'])
+    assert channels_list(token) == {'channels': [
+        {'channel_id': first, 'name': 'First'},
+        {'channel_id': second, 'name': 'Second'},
+        {'channel_id': third, 'name': 'Third'}
+    ]}
+
 def test_channels_listall(setup_user):
     '''
     Testing the channels_listall function
@@ -2,8 +2,66 @@
 A file that stores all the data for slackr
 """
 import pickle
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock, local
 from error import AccessError, InputError
+from locks import channel_locks, store_lock
 #pylint: disable=bare-except, invalid-name, global-at-module-level, inconsistent-return-statements, multiple-statements, missing-docstring, undefined-variable
+
+# Global permission IDs, as recorded in permission_changed changes
+PERMISSION_OWNER = 1
+PERMISSION_MEMBER = 2
+
+class ChangeLog:
+    """
+    The most recent changes recorded by the data store, oldest first.
+    Changes from before the server started, or that have been dropped to
+    make room, are not kept; `floor` is the sequence number up to which
+    changes may be missing.
+    """
+
+    def __init__(self, size):
+        self.changes = deque()
+        self.size = size
+        self.floor = 0
+        self.lock = Lock()
+
+    def append(self, change):
+        with self.lock:
+            if len(self.changes) >= self.size:
+                self.floor = self.changes.popleft()["seq"]
+            self.changes.append(change)
+
+    def since(self, seq, limit):
+        """
+        Returns up to `limit` of the changes after the sequence number `seq`,
+        and whether every change after `seq` is still kept
+        """
+        with self.lock:
+            start = bisect_left(self.changes, seq + 1, key=lambda change: change["seq"])
+            changes = [dict(self.changes[index])
+                       for index in range(start, min(start + limit, len(self.changes)))]
+
+            return changes, seq >= self.floor
+
+def integral_id(value):
+    """
+    Returns an ID given as an int, a float with no fractional part or a
+    string of digits as an int, or None if it is anything else
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.isdigit() and value.isascii():
+        return int(value)
+
+    return None
+
 class DataStore:
     """
     All data for a single state/instance of the Slackr app is stored in an
@@ -13,22 +71,85 @@ class DataStore:
     # Data Store Storage Pickle File
     PICKLE_FILE = 'data_store.p'
 
+    # Functions to call when a version changes, by the name of the version.
+    # This is kept on the class so that it is never pickled or reset.
+    watchers = {}
+
+    # Recent changes and the functions to pass every new change to, which
+    # are also kept on the class
+    CHANGE_LOG_SIZE = 10000
+    changes = ChangeLog(CHANGE_LOG_SIZE)
+    subscribers = []
+
+    # Functions to call once setup() has loaded the data store, such as to
+    # schedule work that was pending when the server stopped, and once
+    # data_store.p has been written
+    loaders = []
+    flushers = []
+
+    # Nesting depth of deferred_updates in each thread, and whether the
+    # thread skipped an update, kept on the class like the watchers
+    deferred = local()
+
     def __init__(self):
         self.active_tokens = {}
         self.users = []
         self.channels = []
         self.messages = []
+        # The same messages by their IDs, see get_message
+        self.messages_by_id = {}
         self.slackr_owner_ids = []
         self.next_id = {}
         self.current_port = None
         self.password_reset_codes = {}
 
+        # Version of each entity, taken from version_seq whenever it changes
+        self.versions = {}
+        self.version_seq = 0
+        # Send times of messages sent later, for each channel ID
+        self.scheduled_times = {}
+
     def update(self):
         """
-        Updates the data_store.p file with the contents of the DataStore instance
+        Updates the data_store.p file with the contents of the DataStore instance.
+        Inside deferred_updates, the write is postponed until the thread's
+        block ends, and while a channel lock is held, until the thread
+        releases it.
         """
-        with open(self.PICKLE_FILE, "wb") as file:
-            pickle.dump(self, file)
+        if getattr(self.deferred, "depth", 0) > 0:
+            self.deferred.pending = True
+            return
+
+        channel_locks.defer(self.flush)
+
+    def flush(self):
+        """
+        Writes data_store.p, holding every channel lock for reading so that
+        no channel is being changed while it is written
+        """
+        with channel_locks.read(*[channel.channel_id for channel in self.channels]), \
+             store_lock:
+            with open(self.PICKLE_FILE, "wb") as file:
+                pickle.dump(self, file)
+
+            for callback in self.flushers:
+                callback()
+
+    @contextmanager
+    def deferred_updates(self):
+        """
+        Collapses every update() made by this thread inside the with block
+        into a single write of data_store.p when the outermost block exits.
+        Updates made by other threads meanwhile are not held back.
+        """
+        self.deferred.depth = getattr(self.deferred, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            self.deferred.depth -= 1
+            if self.deferred.depth == 0 and getattr(self.deferred, "pending", False):
+                self.deferred.pending = False
+                self.update()
 
     def load(self):
         """
@@ -41,8 +162,12 @@ class DataStore:
             self.users = loaded_data.users
             self.channels = loaded_data.channels
             self.messages = loaded_data.messages
+            self.messages_by_id = {message.message_id: message for message in self.messages}
             self.slackr_owner_ids = loaded_data.slackr_owner_ids
             self.next_id = loaded_data.next_id
+            self.versions = getattr(loaded_data, "versions", {})
+            self.version_seq = getattr(loaded_data, "version_seq", 0)
+            self.scheduled_times = getattr(loaded_data, "scheduled_times", {})
 
 
     def setup(self):
@@ -55,28 +180,108 @@ class DataStore:
         except:
             self.update()
 
+        # Changes made before now were not recorded by this process
+        self.changes.floor = self.version_seq
+
+        for callback in self.loaders:
+            callback()
+
     def reset(self):
         """
         Resets all fields inside the DataStore object and the
         instance stored in data_store.p
         """
+        version_seq = self.version_seq
         self.__init__()
+
+        # Versions keep counting up so nothing from before the reset
+        # can be mistaken for a version after it
+        self.version_seq = version_seq
+        self.record("workspace_reset", {}, "workspace")
         self.update()
 
     def generate_id(self, object_type):
         """
         Generates an id for a new object to be added to a list in DataStore instance
         """
-        result = 1
+        with store_lock:
+            result = 1
 
-        if object_type in self.next_id:
-            result = self.next_id[object_type]
-        else:
-            self.next_id[object_type] = result
+            if object_type in self.next_id:
+                result = self.next_id[object_type]
+            else:
+                self.next_id[object_type] = result
 
-        self.next_id[object_type] += 1
+            self.next_id[object_type] += 1
 
-        return result
+            return result
+
+    def bump(self, *keys):
+        """
+        Records that the entities with the given version keys have changed,
+        giving them all a new version. Keys are either a name such as "users"
+        or a (name, id) tuple such as ("channel", 1).
+        """
+        with store_lock:
+            self.version_seq += 1
+            for key in keys:
+                self.versions[key] = self.version_seq
+
+            for key in keys:
+                name = key[0] if isinstance(key, tuple) else key
+                for callback in self.watchers.get(name, []):
+                    callback(key)
+
+    def record(self, change_type, details, *keys):
+        """
+        Records a change of the given type, such as "message_created", along
+        with a dictionary of its details, such as the IDs involved. The
+        version keys are bumped, and the change takes the new sequence number
+        as its "seq" before it is logged and passed to the subscribers.
+        """
+        with store_lock:
+            self.bump(*keys)
+            change = dict(details, seq=self.version_seq, type=change_type)
+            self.changes.append(change)
+
+            for change_types, callback in self.subscribers:
+                if not change_types or change_type in change_types:
+                    callback(change)
+
+            return change
+
+    def subscribe(self, callback, *change_types):
+        """
+        Calls callback(change) for every change recorded from now on,
+        or only for changes of the given types
+        """
+        self.subscribers.append((frozenset(change_types), callback))
+
+    def on_load(self, callback):
+        """
+        Calls callback() each time setup() loads the data store
+        """
+        self.loaders.append(callback)
+
+    def on_flush(self, callback):
+        """
+        Calls callback() each time data_store.p has been written, while
+        every channel is still locked
+        """
+        self.flushers.append(callback)
+
+    def watch(self, name, callback):
+        """
+        Calls callback(key) whenever a version with the given name changes,
+        such as "users" or "channel" for the key ("channel", 1)
+        """
+        self.watchers.setdefault(name, []).append(callback)
+
+    def version(self, key):
+        """
+        Returns the current version of the entity with the given key
+        """
+        return self.versions.get(key, 0)
 
     ### Getters ###
 
@@ -85,9 +290,14 @@ class DataStore:
         Returns the User Object using the user ID passed in if found,
         otherwise raises InputError
         """
-        for user in self.users:
-            if user.user_id == user_id:
-                return user
+        user_id = integral_id(user_id)
+        if user_id is None:
+            raise InputError(description="Input error: invalid user ID")
+
+        # Users are always kept in order of their IDs, so binary search
+        index = bisect_left(self.users, user_id, key=lambda user: user.user_id)
+        if index < len(self.users) and self.users[index].user_id == user_id:
+            return self.users[index]
 
         raise InputError(description="Input error: invalid user ID")
 
@@ -129,11 +339,27 @@ class DataStore:
         Returns a Message Object from the data store based on it's id.
         If there is no message with the id, it returns None
         """
-        for message in self.messages:
-            if message.message_id == message_id:
-                return message
+        try:
+            return self.messages_by_id.get(message_id)
+        except TypeError:
+            # The ID is something unhashable, such as a list
+            return None
 
-        return None
+    def add_message(self, message):
+        """
+        Adds a message to the data store, and to the index of its channel
+        """
+        self.messages.append(message)
+        self.messages_by_id[message.message_id] = message
+        self.get_channel(message.channel).index_message(message)
+
+    def remove_message(self, message):
+        """
+        Removes a message from the data store, and from the index of its channel
+        """
+        self.messages.remove(message)
+        self.messages_by_id.pop(message.message_id, None)
+        self.get_channel(message.channel).unindex_message(message)
 
     def add_owner(self, user):
         """
@@ -141,6 +367,8 @@ class DataStore:
         """
         if user.user_id not in self.slackr_owner_ids:
             self.slackr_owner_ids.append(user.user_id)
+            self.record("permission_changed",
+                        {"u_id": user.user_id, "permission_id": PERMISSION_OWNER})
 
     def remove_owner(self, user):
         """
@@ -148,20 +376,26 @@ class DataStore:
         """
         if user.user_id in self.slackr_owner_ids:
             self.slackr_owner_ids.remove(user.user_id)
+            self.record("permission_changed",
+                        {"u_id": user.user_id, "permission_id": PERMISSION_MEMBER})
 
     def remove_user(self, user_id):
         user = self.get_user(user_id)
 
         # Remove all traces of the user from the database
-        for message in self.messages:
+        for message in list(self.messages):
             if message.sent_by == user_id:
-                self.messages.remove(message)
+                self.remove_message(message)
+                self.record("message_removed",
+                            {"message_id": message.message_id, "channel_id": message.channel},
+                            ("channel_messages", message.channel))
 
         for channel in self.channels:
             channel.remove_member(user)
 
         self.remove_owner(user)
         self.users.remove(user)
+        self.record("user_removed", {"u_id": user_id}, "users", ("user", user_id))
 
     ### Data Checking Functions ###
 
@@ -2,7 +2,12 @@
 A file for the definitions of Channel
 '''
 from time import time
+from bisect import insort
 from data_store import database
+from channel_directory import directory
+from channel_snapshot import ChannelSnapshot
+from message_definition import json_for
+from locks import channel_locks
 
 # pylint: disable=missing-docstring, too-many-instance-attributes
 
@@ -22,25 +27,65 @@ class Channel:
         self.is_active = False
         self.time_finish = None
         self.buffer = []
+        # ID of the user who started the standup, who posts its summary
+        self.standup_user = None
 
         self.hangman_active = False
 
+        # The json of the owners and members, see roster_json
+        self.roster = None
+
+        # The latest ChannelSnapshot, see view
+        self.snapshot = None
+
+        # The channel's messages, see indexed_messages
+        self.message_index = []
+
+    def __getstate__(self):
+        # The roster, snapshot and message index can be rebuilt, so they are not pickled
+        state = dict(self.__dict__)
+        state.pop("roster", None)
+        state.pop("snapshot", None)
+        state.pop("message_index", None)
+        return state
+
+    def __setstate__(self, state):
+        self.standup_user = None
+        self.__dict__.update(state)
+        self.roster = None
+        self.snapshot = None
+        self.message_index = None
+
     def add_member(self, user):
         if user and user not in self.members:
             self.members.append(user)
+            self.invalidate_roster()
+            directory.joined(self, user)
+            database.record("member_added", {"channel_id": self.channel_id, "u_id": user.user_id},
+                            ("channel", self.channel_id), ("user_channels", user.user_id))
 
     def remove_member(self, user):
         self.remove_owner(user)
         if user and user in self.members:
             self.members.remove(user)
+            self.invalidate_roster()
+            directory.left(self, user)
+            database.record("member_removed", {"channel_id": self.channel_id, "u_id": user.user_id},
+                            ("channel", self.channel_id), ("user_channels", user.user_id))
 
     def add_owner(self, user):
         if user and user not in self.owners:
             self.owners.append(user)
+            self.invalidate_roster()
+            database.record("owner_added", {"channel_id": self.channel_id, "u_id": user.user_id},
+                            ("channel", self.channel_id))
 
     def remove_owner(self, user):
         if user and user in self.owners:
             self.owners.remove(user)
+            self.invalidate_roster()
+            database.record("owner_removed", {"channel_id": self.channel_id, "u_id": user.user_id},
+                            ("channel", self.channel_id))
 
     def has_member(self, user):
         return user in self.members
@@ -49,41 +94,150 @@ class Channel:
         return user in self.owners
 
     def json(self):
-        return {
-            "name": self.name,
-            "owner_members": self.json_members(self.owners),
-            "all_members": self.json_members(self.members)
-        }
+        return self.view().json()
+
+    def view(self):
+        """
+        Returns a ChannelSnapshot of the channel as it is now, which can be
+        read without holding the channel's lock.
+
+        Each change to the channel, its messages or a user gives it a new
+        version. The snapshot of the latest version is kept, so it is only
+        made (under the channel's lock) by the first reader after a change.
+        Swapping in the new snapshot is a single assignment, so readers
+        always see either the old one or the new one.
+        """
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == ChannelSnapshot.current_version(self.channel_id):
+            return snapshot
+
+        with channel_locks.read(self.channel_id):
+            snapshot = self.snapshot
+            if snapshot is None or \
+                    snapshot.version != ChannelSnapshot.current_version(self.channel_id):
+                snapshot = ChannelSnapshot(self, snapshot)
+                self.snapshot = snapshot
+
+            return snapshot
+
+    def roster_json(self):
+        """
+        Returns the json of the owners and of the members, which is built
+        once and kept until the roster is invalidated. It is shared, so it
+        must not be changed.
+        """
+        if self.roster is None:
+            self.roster = (self.json_members(self.owners),
+                           self.json_members(self.members),
+                           frozenset(user.user_id for user in self.owners + self.members))
+
+        return self.roster[:2]
+
+    def invalidate_roster(self):
+        """
+        Discards the cached roster, which must be done whenever the owners
+        or members change, or the details of one of them do
+        """
+        self.roster = None
+
+    def has_cached_member(self, user_id):
+        """
+        Returns True if the user is in the cached roster
+        """
+        return self.roster is not None and user_id in self.roster[2]
+
+    def indexed_messages(self):
+        """
+        Returns the channel's messages, most recent first, with messages
+        sent at the same time in the order they were added. The index is
+        built from the data store once, after the channel is loaded, and
+        then kept up to date as messages are added and removed. It is
+        shared, so it must not be changed.
+        """
+        if self.message_index is None:
+            self.message_index = sorted((message for message in list(database.messages)
+                                         if message.channel == self.channel_id),
+                                        key=lambda message: -message.time_sent)
+
+        return self.message_index
+
+    def index_message(self, message):
+        """
+        Adds a message which has just been added to the data store to the index
+        """
+        # An index which has not been built yet will include it once it is
+        if self.message_index is not None:
+            insort(self.message_index, message, key=lambda message: -message.time_sent)
+
+    def unindex_message(self, message):
+        """
+        Removes a message which has just been removed from the data store from the index
+        """
+        if self.message_index is not None and message in self.message_index:
+            self.message_index.remove(message)
 
     @classmethod
     def json_members(cls, member_list):
         return [user.json_member() for user in member_list]
 
+    @classmethod
+    def visible_until(cls):
+        """
+        Returns the latest send time of messages which are currently visible
+        """
+        return int(time()) + 2
+
     def json_messages(self, user):
         """
         Returns all of the channel's messages that were sent at the current
         time or in the past, in json format
         """
-        messages = []
+        return [json_for(fragment, user) for fragment in self.visible_messages()]
 
-        for message in database.messages:
-            now = int(time())
-            if message.channel == self.channel_id and message.time_sent <= now + 2:
-                reacts = []
+    def visible_messages(self):
+        """
+        Returns the shared json (see Message.json) of all of the channel's
+        messages that were sent at the current time or in the past, most
+        recent first
+        """
+        return self.view().visible_messages(self.visible_until())
+
+### Lock Keys ###
 
-                for key in message.reacts:
-                    user_reacted = user.user_id in message.reacts[key]
-                    reacts.append({"react_id": key,
-                                   "u_ids": message.reacts[key],
-                                   "is_this_user_reacted": user_reacted})
+def channel_key(arguments):
+    """
+    Returns the ID of the channel given by a function's channel_id argument,
+    or None if there is no such channel, for use with holding_channel
+    """
+    channel_id = arguments.get("channel_id")
+    for channel in database.channels:
+        if channel.channel_id == channel_id:
+            return channel_id
+    return None
 
-                messages.append({"message_id": message.message_id,
-                                 "u_id": message.sent_by,
-                                 "message": message.content,
-                                 "time_created": message.time_sent,
-                                 "reacts": reacts,
-                                 "is_pinned": message.pinned})
+def message_channel_key(arguments):
+    """
+    Returns the ID of the channel of the message given by a function's
+    message_id argument, or None if there is no such message. Messages are
+    looked up by their IDs, so no lock is needed to find the channel.
+    """
+    message = database.get_message(arguments.get("message_id"))
+    return message.channel if message else None
+
+### Roster Invalidation ###
+
+def invalidate_rosters(change):
+    """
+    Invalidates the roster of every channel the changed user is shown in,
+    and gives the roster of every channel they are a member of a new
+    version, so that only those channels are sent again
+    """
+    for channel in database.channels:
+        if channel.has_cached_member(change["u_id"]):
+            channel.invalidate_roster()
 
-        messages = sorted(messages, key=lambda item: item["time_created"], reverse=True)
+    user = database.get_user(change["u_id"])
+    database.bump(*[("channel_roster", entry["channel_id"])
+                    for entry in directory.channels_of(user)])
 
-        return messages
+database.subscribe(invalidate_rosters, "profile_updated")
@@ -0,0 +1,71 @@
+'''
+A file for the definition of ChannelDirectory
+'''
+from bisect import insort
+from threading import Lock
+from data_store import database
+
+class ChannelDirectory:
+    """
+    Remembers which channels each user is a member of, so that a user's
+    channels do not have to be found by scanning every channel.
+
+    A user's list is built from the channels the first time it is asked
+    for, and from then on is kept up to date by Channel.add_member and
+    Channel.remove_member. Every list is dropped when the workspace is reset.
+    """
+
+    def __init__(self):
+        # Maps user IDs to sorted lists of (channel_id, name) tuples
+        self.user_channels = {}
+        self.lock = Lock()
+
+    def channels_of(self, user):
+        """
+        Returns the {channel_id, name} of every channel the user is a member
+        of, in the order the channels were created
+        """
+        with self.lock:
+            if user.user_id not in self.user_channels:
+                self.user_channels[user.user_id] = [
+                    (channel.channel_id, channel.name)
+                    for channel in sorted(database.channels, key=lambda item: item.channel_id)
+                    if channel.has_member(user)]
+
+            entries = self.user_channels[user.user_id]
+
+            return [{'channel_id': channel_id, 'name': name} for channel_id, name in entries]
+
+    def joined(self, channel, user):
+        """
+        Records that the user has become a member of the channel
+        """
+        with self.lock:
+            entries = self.user_channels.get(user.user_id)
+            entry = (channel.channel_id, channel.name)
+
+            if entries is not None and entry not in entries:
+                insort(entries, entry)
+
+    def left(self, channel, user):
+        """
+        Records that the user is no longer a member of the channel
+        """
+        with self.lock:
+            entries = self.user_channels.get(user.user_id)
+            entry = (channel.channel_id, channel.name)
+
+            if entries is not None and entry in entries:
+                entries.remove(entry)
+
+    def clear(self):
+        """
+        Forgets every user's list of channels
+        """
+        with self.lock:
+            self.user_channels.clear()
+
+### Global Variables ###
+
+directory = ChannelDirectory()
+database.watch("workspace", lambda key: directory.clear())
@@ -0,0 +1,66 @@
+'''
+A file for the definition of ChannelSnapshot
+'''
+from bisect import bisect_left
+from data_store import database
+
+# pylint: disable=missing-docstring, too-few-public-methods
+
+class ChannelSnapshot:
+    """
+    An immutable view of a channel's name, owners, members and messages
+    at one version of the channel.
+
+    Channel.view() hands these out, so readers can use one for as long as
+    they like without holding the channel's lock, while writers go on to
+    change the channel. Nothing in a snapshot may be changed: the json it
+    holds is shared by every reader.
+    """
+
+    __slots__ = ("version", "messages_version", "name", "owner_members", "all_members",
+                 "member_ids", "messages", "times")
+
+    def __init__(self, channel, previous=None):
+        channel_id = channel.channel_id
+
+        self.version = ChannelSnapshot.current_version(channel_id)
+        self.messages_version = self.version[1]
+        self.name = channel.name
+
+        owner_members, all_members = channel.roster_json()
+        self.owner_members = owner_members
+        self.all_members = all_members
+        self.member_ids = frozenset(user.user_id for user in channel.members)
+
+        # The messages are only gathered again if they have changed
+        if previous is not None and previous.messages_version == self.messages_version:
+            self.messages = previous.messages
+            self.times = previous.times
+        else:
+            messages = channel.indexed_messages()
+            self.messages = tuple(message.json() for message in messages)
+            # Negated, so that they are in ascending order for bisect
+            self.times = tuple(-message.time_sent for message in messages)
+
+    @classmethod
+    def current_version(cls, channel_id):
+        """
+        Returns the version of the channel that a snapshot of it now would have
+        """
+        return (database.version(("channel", channel_id)),
+                database.version(("channel_messages", channel_id)),
+                database.version(("channel_roster", channel_id)))
+
+    def visible_messages(self, visible_until):
+        """
+        Returns the json of the messages sent no later than visible_until,
+        most recent first
+        """
+        return self.messages[bisect_left(self.times, -visible_until):]
+
+    def json(self):
+        return {
+            "name": self.name,
+            "owner_members": self.owner_members,
+            "all_members": self.all_members
+        }
@@ -18,3 +18,53 @@ class Message:
         self.time_sent = time_sent
         self.reacts = {}
         self.pinned = False
+
+        # The json of the message that is the same for every user
+        self.fragment = None
+
+    def __getstate__(self):
+        # The fragment can be rebuilt, so it is not pickled
+        state = dict(self.__dict__)
+        del state["fragment"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.fragment = None
+
+    def invalidate(self):
+        """
+        Discards the cached json, which must be done whenever the message changes
+        """
+        self.fragment = None
+
+    def json(self):
+        """
+        Returns the json of the message without is_this_user_reacted, which
+        is built once and kept until the message is invalidated. It is
+        shared, so it must not be changed.
+        """
+        if self.fragment is None:
+            self.fragment = {"message_id": self.message_id,
+                             "u_id": self.sent_by,
+                             "message": self.content,
+                             "time_created": self.time_sent,
+                             "reacts": [{"react_id": key, "u_ids": list(u_ids)}
+                                        for key, u_ids in self.reacts.items()],
+                             "is_pinned": self.pinned}
+
+        return self.fragment
+
+    def json_for(self, user):
+        """
+        Returns the json of the message as seen by the given user
+        """
+        return json_for(self.json(), user)
+
+def json_for(fragment, user):
+    """
+    Returns the json of a message as seen by the given user, from the
+    json that is the same for every user
+    """
+    return dict(fragment, reacts=[dict(react, is_this_user_reacted=user.user_id in react["u_ids"])
+                                  for react in fragment["reacts"]])
@@ -0,0 +1,356 @@
+"""
+Locks used to keep the data store of slackr consistent between threads.
+
+Lock order: a thread may only take these locks in the order below, and
+never a lock earlier in the list while holding a later one.
+
+    1. database_lock     - held by every request. Work confined to a few
+                           channels holds it for reading, and anything
+                           that changes the workspace as a whole (users,
+                           tokens, the list of channels, a reset) holds it
+                           for writing, which keeps out all channel work.
+    2. channel_locks     - one per channel, covering its members, owners,
+                           standup and messages. Taken for writing to change
+                           a channel, and for reading to make a snapshot of
+                           it (see Channel.view), which readers then use
+                           without holding any channel lock. Several
+                           channels are always taken in ascending channel ID,
+                           which channel_locks.hold() does.
+    3. anything else     - such as store_lock, the cache locks and the
+                           idempotency lock, which are only held briefly
+                           and never while taking a lock above.
+
+Writing the data store to disk reads every channel lock, so it sees no
+channel half way through a change. A write made while holding a channel
+lock is put off until that thread has released its channel locks.
+"""
+
+### Builtin/pip Modules ###
+import inspect
+from functools import wraps
+from contextlib import contextmanager, ExitStack
+from threading import Condition, Lock, RLock, local, get_ident
+from time import perf_counter
+
+### Global Variables ###
+
+# Every lock that has been made, by name, so their statistics can be reported
+LOCKS = {}
+
+class RWLock:
+    """
+    A lock which many readers can hold at once, or a single writer.
+
+    Waiting writers are served before new readers, so a steady stream of
+    reads cannot keep a write waiting forever. Both sides can be taken again
+    by a thread that already holds them, and a writer may also read. The
+    number of acquisitions, how many had to wait and for how long are kept.
+    """
+
+    def __init__(self, name, register=True):
+        self.name = name
+        self.condition = Condition(Lock())
+
+        self.readers = 0
+        self.writer = None
+        self.write_depth = 0
+        self.writers_waiting = 0
+        self.held = local()
+
+        self.stats_lock = Lock()
+        self.counts = {"read": [0, 0, 0.0, 0.0], "write": [0, 0, 0.0, 0.0]}
+
+        if register:
+            LOCKS[name] = self
+
+    def acquire_read(self):
+        """
+        Takes the lock for reading, waiting while it is held for writing
+        """
+        # Reads by the writer count as part of its write
+        if self.writer == get_ident():
+            self.write_depth += 1
+            return
+
+        depth = getattr(self.held, "reads", 0)
+        if depth:
+            self.held.reads = depth + 1
+            return
+
+        with self.condition:
+            started = None
+            while self.writer is not None or self.writers_waiting:
+                started = started or perf_counter()
+                self.condition.wait()
+            self.readers += 1
+
+        self.held.reads = 1
+        self.count("read", started)
+
+    def release_read(self):
+        """
+        Releases a hold on the lock for reading
+        """
+        if self.writer == get_ident():
+            self.release_write()
+            return
+
+        self.held.reads -= 1
+        if self.held.reads:
+            return
+
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        """
+        Takes the lock for writing, waiting until no one else holds it
+        """
+        if self.writer == get_ident():
+            self.write_depth += 1
+            return
+
+        if getattr(self.held, "reads", 0):
+            raise RuntimeError("The " + self.name + " lock cannot be written while it is read")
+
+        with self.condition:
+            started = None
+            self.writers_waiting += 1
+            while self.writer is not None or self.readers:
+                started = started or perf_counter()
+                self.condition.wait()
+            self.writers_waiting -= 1
+            self.writer = get_ident()
+            self.write_depth = 1
+
+        self.count("write", started)
+
+    def release_write(self):
+        """
+        Releases a hold on the lock for writing
+        """
+        self.write_depth -= 1
+        if self.write_depth:
+            return
+
+        with self.condition:
+            self.writer = None
+            self.condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        """
+        Holds the lock for reading inside the with block
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """
+        Holds the lock for writing inside the with block
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def count(self, side, started):
+        """
+        Counts an acquisition, which had to wait if `started` is not None
+        """
+        waited = perf_counter() - started if started is not None else 0.0
+
+        with self.stats_lock:
+            counts = self.counts[side]
+            counts[0] += 1
+            if started is not None:
+                counts[1] += 1
+                counts[2] += waited
+                counts[3] = max(counts[3], waited)
+
+    def stats(self):
+        """
+        Returns the usage statistics of the lock, for reads and for writes
+        """
+        with self.stats_lock:
+            return {side: {"acquired": acquired,
+                           "contended": contended,
+                           "wait_seconds": waited,
+                           "max_wait_seconds": longest}
+                    for side, (acquired, contended, waited, longest) in self.counts.items()}
+
+class KeyedLocks:
+    """
+    A RWLock for each key, such as a channel ID, made when first needed.
+    Each thread's holds are counted, so that work which must not happen
+    while any of these locks are held can be put off until they are released.
+    Statistics are reported for all of the locks together.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.locks = {}
+        self.guard = Lock()
+        self.held = local()
+
+        LOCKS[name] = self
+
+    def lock(self, key):
+        """
+        Returns the lock for the key
+        """
+        with self.guard:
+            if key not in self.locks:
+                self.locks[key] = RWLock(self.name + ":" + str(key), register=False)
+            return self.locks[key]
+
+    @contextmanager
+    def hold(self, *keys, write=True):
+        """
+        Holds the locks for the given keys inside the with block, taking
+        them in ascending order. Keys which are None are skipped.
+        """
+        keys = sorted({key for key in keys if key is not None})
+
+        with ExitStack() as stack:
+            for key in keys:
+                lock = self.lock(key)
+                # Counted first so that it is only uncounted once the lock is released
+                self.held.depth = self.depth() + 1
+                stack.callback(self.released)
+                stack.enter_context(lock.write() if write else lock.read())
+            yield
+
+    def read(self, *keys):
+        """
+        Holds the locks for the given keys for reading
+        """
+        return self.hold(*keys, write=False)
+
+    def write(self, *keys):
+        """
+        Holds the locks for the given keys for writing
+        """
+        return self.hold(*keys, write=True)
+
+    def depth(self):
+        """
+        Returns how many of these locks the current thread holds
+        """
+        return getattr(self.held, "depth", 0)
+
+    def defer(self, callback):
+        """
+        Calls callback() once the current thread holds none of these locks,
+        which is straight away if it holds none now. A callback which is
+        already waiting is not added again.
+        """
+        if not self.depth():
+            callback()
+            return
+
+        deferred = self.held.__dict__.setdefault("deferred", [])
+        if callback not in deferred:
+            deferred.append(callback)
+
+    def released(self):
+        # Called each time one of the thread's locks is released
+        self.held.depth -= 1
+        if not self.held.depth:
+            deferred = self.held.__dict__.pop("deferred", [])
+            for callback in deferred:
+                callback()
+
+    def stats(self):
+        """
+        Returns the usage statistics of all of the locks added together
+        """
+        with self.guard:
+            locks = list(self.locks.values())
+
+        totals = {"read": {"acquired": 0, "contended": 0, "wait_seconds": 0.0,
+                           "max_wait_seconds": 0.0},
+                  "write": {"acquired": 0, "contended": 0, "wait_seconds": 0.0,
+                            "max_wait_seconds": 0.0}}
+
+        for lock in locks:
+            for side, stats in lock.stats().items():
+                total = totals[side]
+                total["acquired"] += stats["acquired"]
+                total["contended"] += stats["contended"]
+                total["wait_seconds"] += stats["wait_seconds"]
+                total["max_wait_seconds"] = max(total["max_wait_seconds"],
+                                                stats["max_wait_seconds"])
+
+        return totals
+
+### Functions ###
+
+def holding_channel(find_channel, write=True):
+    """
+    Makes a function hold the lock of a channel while it runs. `find_channel`
+    is given the function's arguments by name and returns the channel ID, or
+    None when there is no such channel, in which case nothing is locked and
+    the function reports the error itself.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            arguments = signature.bind(*args, **kwargs).arguments
+            with channel_locks.hold(find_channel(arguments), write=write):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def channel_scoped(route):
+    """
+    Marks a route whose changes are confined to channels that it locks itself,
+    so it only needs the data store lock for reading
+    """
+    route.channel_scoped = True
+    return route
+
+def writes_data_store(route):
+    """
+    Marks a route which changes the data store even though it uses a method
+    that normally only reads, so that it is given the lock for writing
+    """
+    route.writes_data_store = True
+    return route
+
+def locks_data_store(route):
+    """
+    Marks a route which takes the data store lock itself, around only the
+    parts of it that use the data store, so it is given no lock. This is for
+    routes that wait on work which needs the lock, such as another thread.
+    """
+    route.locks_data_store = True
+    return route
+
+def lock_stats():
+    """
+    Returns the statistics of every lock, by name
+    """
+    return {name: lock.stats() for name, lock in LOCKS.items()}
+
+### Global Locks ###
+
+# Held for reading while the data store is read, and for writing while it is changed
+database_lock = RWLock("database")
+
+# Held while a channel is read or changed
+channel_locks = KeyedLocks("channels")
+
+# Held while the version numbers, change log or IDs of the data store change
+store_lock = RLock()
@@ -0,0 +1,147 @@
+"""
+Tests for the locks of the data store.
+Most tests have self-explanatory names.
+"""
+
+from threading import Thread, Event
+from time import monotonic, sleep
+import pytest
+from locks import RWLock, KeyedLocks, channel_locks
+from auth import auth_register
+from channels import channels_create
+from message import message_send
+from workspace_reset import workspace_reset
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+### setup ###
+
+@pytest.fixture
+def token():
+    workspace_reset()
+    return auth_register("email0@domain.com", "a" * 8, "F" * 5, "L" * 5)["token"]
+
+def wait_until(condition, timeout=5):
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            return False
+        sleep(0.01)
+    return True
+
+### test RWLock ###
+
+def test_locks_readers_share():
+    lock = RWLock("test_locks_readers_share")
+    inside = Event()
+    done = Event()
+
+    def reader():
+        with lock.read():
+            inside.set()
+            done.wait(5)
+
+    thread = Thread(target=reader)
+    thread.start()
+    assert inside.wait(5)
+
+    # A second reader does not wait for the first
+    with lock.read():
+        pass
+    done.set()
+    thread.join()
+
+    stats = lock.stats()
+    assert stats["read"]["acquired"] == 2 and stats["read"]["contended"] == 0
+
+def test_locks_writer_waits():
+    lock = RWLock("test_locks_writer_waits")
+    order = []
+
+    def writer():
+        with lock.write():
+            order.append("write")
+
+    with lock.read():
+        thread = Thread(target=writer)
+        thread.start()
+        assert wait_until(lambda: lock.writers_waiting)
+        order.append("read")
+    thread.join()
+
+    assert order == ["read", "write"]
+    stats = lock.stats()
+    assert stats["write"]["contended"] == 1 and stats["write"]["wait_seconds"] > 0
+
+def test_locks_reentrant():
+    lock = RWLock("test_locks_reentrant")
+
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                pass
+        assert lock.writer is not None
+    assert lock.writer is None
+
+    with lock.read():
+        with lock.read():
+            pass
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    assert lock.readers == 0
+
+### test KeyedLocks ###
+
+def test_locks_keyed_independent():
+    locks = KeyedLocks("test_locks_keyed_independent")
+    done = Event()
+
+    def writer():
+        with locks.write(2):
+            done.set()
+
+    # Holding one key does not keep out a writer of another
+    with locks.write(1):
+        thread = Thread(target=writer)
+        thread.start()
+        assert done.wait(5)
+    thread.join()
+
+    stats = locks.stats()
+    assert stats["write"]["acquired"] == 2 and stats["write"]["contended"] == 0
+
+def test_locks_keyed_defer():
+    locks = KeyedLocks("test_locks_keyed_defer")
+    calls = []
+
+    locks.defer(lambda: calls.append("now"))
+    assert calls == ["now"]
+
+    def later():
+        calls.append("later")
+
+    with locks.write(3, 1, None):
+        with locks.read(2):
+            locks.defer(later)
+            locks.defer(later)
+        assert calls == ["now"]
+        assert locks.depth() == 2
+
+    assert calls == ["now", "later"]
+    assert locks.depth() == 0
+
+def test_locks_channels_concurrent(token):
+    channel_a = channels_create(token, "a", True)["channel_id"]
+    channel_b = channels_create(token, "b", True)["channel_id"]
+    sent = Event()
+
+    def sender():
+        message_send(token, channel_b, "hello")
+        sent.set()
+
+    # A message can be sent to one channel while another is being read
+    with channel_locks.read(channel_a):
+        thread = Thread(target=sender)
+        thread.start()
+        assert sent.wait(5)
+    thread.join()
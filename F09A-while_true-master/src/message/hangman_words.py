@@ -0,0 +1,148 @@
+'''
+hangman_words.py
+
+Contains the list of words that games of hangman are played with
+'''
+
+### Builtin/pip Modules ###
+import os
+import pickle
+from bisect import bisect_right
+from random import randrange
+from threading import Lock
+
+### Word Settings ###
+DICTIONARY_FILE = '/usr/share/dict/british-english'
+MAX_LENGTH = 9
+
+# The filtered words are kept here between restarts, so the dictionary only
+# has to be read again when it changes. Set to None to not keep them.
+CACHE_FILE = 'hangman_words.p'
+
+class WordList:
+    '''
+    The words of a dictionary which can be used for hangman: those made
+    only of letters and no longer than MAX_LENGTH. They are read the first
+    time a word is needed.
+
+    Words are bucketed by length, and each bucket is stored as one string
+    of its words joined together. As every word in a bucket is the same
+    length, any word can be sliced straight out of it.
+    '''
+
+    def __init__(self, dictionary_file=DICTIONARY_FILE, cache_file=CACHE_FILE):
+        self.dictionary_file = dictionary_file
+        self.cache_file = cache_file
+
+        self.buckets = None
+        self.lock = Lock()
+
+        # The total number of words up to and including each bucket
+        self.lengths = []
+        self.totals = []
+
+    def choose(self):
+        '''
+        Returns a random word, with every word equally likely
+        '''
+        self.load()
+
+        if not self.totals:
+            raise ValueError('The dictionary has no words for hangman')
+
+        index = randrange(self.totals[-1])
+        bucket = bisect_right(self.totals, index)
+        length = self.lengths[bucket]
+        index -= self.totals[bucket - 1] if bucket else 0
+
+        return self.buckets[length][index * length:(index + 1) * length]
+
+    def preload(self):
+        '''
+        Reads the words ahead of time. A dictionary that cannot be read is
+        left to be reported when a game is started.
+        '''
+        try:
+            self.load()
+        except OSError:
+            pass
+
+    def load(self):
+        '''
+        Reads the words if they have not been read yet
+        '''
+        with self.lock:
+            if self.buckets is not None:
+                return
+
+            stamp = dictionary_stamp(self.dictionary_file)
+            buckets = self.read_cache(stamp)
+
+            if buckets is None:
+                buckets = self.read_dictionary()
+                self.write_cache(stamp, buckets)
+
+            total = 0
+            for length in sorted(buckets):
+                total += len(buckets[length]) // length
+                self.lengths.append(length)
+                self.totals.append(total)
+
+            self.buckets = buckets
+
+    def read_dictionary(self):
+        '''
+        Returns the buckets of the words in the dictionary file
+        '''
+        buckets = {}
+
+        with open(self.dictionary_file, encoding='utf-8') as file:
+            for line in file:
+                word = line.strip('\n')
+                if word.isalpha() and len(word) <= MAX_LENGTH:
+                    buckets.setdefault(len(word), []).append(word)
+
+        return {length: ''.join(words) for length, words in buckets.items()}
+
+    def read_cache(self, stamp):
+        '''
+        Returns the buckets kept in the cache file, or None if there are
+        none or they were made from a different dictionary
+        '''
+        if self.cache_file is None:
+            return None
+
+        try:
+            with open(self.cache_file, 'rb') as file:
+                cached_stamp, buckets = pickle.load(file)
+        except (OSError, pickle.PickleError, EOFError, ValueError, TypeError):
+            return None
+
+        return buckets if cached_stamp == stamp else None
+
+    def write_cache(self, stamp, buckets):
+        '''
+        Keeps the buckets in the cache file, if there is one
+        '''
+        if self.cache_file is None:
+            return
+
+        try:
+            with open(self.cache_file, 'wb') as file:
+                pickle.dump((stamp, buckets), file)
+        except OSError:
+            pass
+
+### Helper Functions ###
+
+def dictionary_stamp(path):
+    '''
+    Returns what identifies the current contents of a dictionary file
+    '''
+    status = os.stat(path)
+
+    return (os.path.abspath(path), status.st_size, status.st_mtime_ns)
+
+### Global Variables ###
+
+words = WordList()
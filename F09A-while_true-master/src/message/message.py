@@ -8,20 +8,37 @@ sending, editing, reacting, removing and pinning messages in a channel
 ### Builtin/pip Modules ###
 from json import dumps
 from time import time
-from random import choice
+from bisect import insort, bisect_left
+from threading import Lock
+from concurrent.futures import Future
 from flask import request, Blueprint
 
 ### Package Modules ###
 from error import AccessError, InputError
 from data_store import database
 from message_definition import Message
+from channel_definition import channel_key, message_channel_key
+from locks import holding_channel, channel_scoped, database_lock, channel_locks
+from bots import engine
+from cache import LRUCache
+from scheduler import scheduler
 
 ### Page Blueprint ###
 MESSAGE_PAGE = Blueprint('message_page', __name__)
 
+### Idempotency Keys ###
+# The results of sends made with an idempotency key, keyed by the user and
+# the key, so that a retried send returns the original message_id. The lock
+# is only held to look up or reserve a key, not while sending.
+SENT_CACHE = LRUCache('idempotency_keys', max_entries=100000, ttl=24 * 60 * 60)
+SENT_LOCK = Lock()
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+database.watch('workspace', lambda key: SENT_CACHE.clear())
+
 ### Routes ###
 
 @MESSAGE_PAGE.route('/message/send', methods=['POST'])
+@channel_scoped
 def route_message_send():
     '''
     Calls function to send a message with POST request contents
@@ -30,10 +47,12 @@ def route_message_send():
     token = payload.get('token')
     channel_id = int(payload.get('channel_id'))
     message = payload.get('message')
+    idempotency_key = request.headers.get('Idempotency-Key')
 
-    return dumps(message_send(token, channel_id, message))
+    return dumps(message_send(token, channel_id, message, idempotency_key))
 
 @MESSAGE_PAGE.route('/message/react', methods=['POST'])
+@channel_scoped
 def route_message_react():
     '''
     Calls function to record a react to a message
@@ -46,6 +65,7 @@ def route_message_react():
     return dumps(message_react(token, message_id, react_id))
 
 @MESSAGE_PAGE.route('/message/unreact', methods=['POST'])
+@channel_scoped
 def route_message_unreact():
     '''
     Calls function to record an unreact to a message
@@ -58,6 +78,7 @@ def route_message_unreact():
     return dumps(message_unreact(token, message_id, react_id))
 
 @MESSAGE_PAGE.route('/message/pin', methods=['POST'])
+@channel_scoped
 def route_message_pin():
     '''
     Calls a function to record a pin to a message
@@ -69,6 +90,7 @@ def route_message_pin():
     return dumps(message_pin(token, message_id))
 
 @MESSAGE_PAGE.route('/message/unpin', methods=['POST'])
+@channel_scoped
 def route_message_unpin():
     '''
     Calls a function to record a message being unpinned
@@ -80,6 +102,7 @@ def route_message_unpin():
     return dumps(message_unpin(token, message_id))
 
 @MESSAGE_PAGE.route('/message/edit', methods=['PUT'])
+@channel_scoped
 def route_message_edit():
     '''
     Calls function to record an edit to a message.
@@ -92,6 +115,7 @@ def route_message_edit():
     return dumps(message_edit(token, message_id, message))
 
 @MESSAGE_PAGE.route('/message/remove', methods=['DELETE'])
+@channel_scoped
 def route_message_remove():
     '''
     Calls a function to remove a message.
@@ -103,6 +127,7 @@ def route_message_remove():
     return dumps(message_remove(token, message_id))
 
 @MESSAGE_PAGE.route('/message/sendlater', methods=['POST'])
+@channel_scoped
 def route_message_sendlater():
     '''
     Calls function to send a message with POST request contents at a given time
@@ -112,12 +137,14 @@ def route_message_sendlater():
     channel_id = int(payload.get('channel_id'))
     message = payload.get('message')
     send_time = payload.get('time_sent')
+    idempotency_key = request.headers.get('Idempotency-Key')
 
-    return dumps(message_sendlater(token, channel_id, message, send_time))
+    return dumps(message_sendlater(token, channel_id, message, send_time, idempotency_key))
 
 ### Functions ###
 
-def message_send(token, channel_id, message):
+@holding_channel(channel_key)
+def message_send(token, channel_id, message, idempotency_key=None):
     '''
     Sends a message to a channel
 
@@ -125,9 +152,13 @@ def message_send(token, channel_id, message):
         token (string)          - Token of the user sending the message
         channel_id (int)        - ID of the channel to send the message to
         message (string)        - text to send
+        idempotency_key (str)   - optional key which makes a retry with the same
+                                  key return the original message_id instead
+                                  of sending the message again
 
     Exceptions:
         InputError               - When the message is more than 1000 characters long
+                                 - When the idempotency key was used for a different message
         AccessError              - When the user is not in the channel they are posting to
 
     Return Value:
@@ -136,27 +167,10 @@ def message_send(token, channel_id, message):
     '''
     user = database.get_authed_user(token)
 
-    # Check the message is not more than 1000 characters long
-    if len(message) > 1000:
-        raise InputError(description='Message is more than 1000 characters long')
-
-    channel = database.get_channel(channel_id)
-
-    if not channel.has_member(user):
-        raise AccessError(description='User is not in the channel they are posting to')
-
-    # Send the message to the channel
-    time_now = int(time())
-    sent_by = user.user_id
-    new_message = Message(sent_by, channel.channel_id, message, time_now)
-    database.messages.append(new_message)
-
-    play_hangman(channel_id, message, time_now + 1)
-
-    # Update pickle file
-    database.update()
-    return {'message_id': new_message.message_id}
+    return idempotent(user, idempotency_key, ('message/send', channel_id, message),
+                      lambda: send_message(user, channel_id, message))
 
+@holding_channel(message_channel_key)
 def message_react(token, message_id, react_id):
     '''
     Records a react to a message
@@ -202,11 +216,14 @@ def message_react(token, message_id, react_id):
         message.reacts[react_id].append(user.user_id)
     else:
         message.reacts[react_id] = [user.user_id]
+    message.invalidate()
+    record_message_change('message_reacted', message, user, react_id=react_id)
 
     # Update pickle file
     database.update()
     return {}
 
+@holding_channel(message_channel_key)
 def message_unreact(token, message_id, react_id):
     '''
     Records an unreact to a message
@@ -255,11 +272,14 @@ def message_unreact(token, message_id, react_id):
     message.reacts[react_id].remove(user.user_id)
     if not message.reacts[react_id]:
         del message.reacts[react_id]
+    message.invalidate()
+    record_message_change('message_unreacted', message, user, react_id=react_id)
 
     # Update pickle file
     database.update()
     return {}
 
+@holding_channel(message_channel_key)
 def message_pin(token, message_id):
     '''
     Records a message being pinned
@@ -294,11 +314,14 @@ def message_pin(token, message_id):
 
     # Update the message with the pin
     message.pinned = True
+    message.invalidate()
+    record_message_change('message_pinned', message, user)
 
     # Update pickle file
     database.update()
     return {}
 
+@holding_channel(message_channel_key)
 def message_unpin(token, message_id):
     '''
     Records a message being unpinned
@@ -333,11 +356,14 @@ def message_unpin(token, message_id):
 
     # Update the message with the unpin
     message.pinned = False
+    message.invalidate()
+    record_message_change('message_unpinned', message, user)
 
     # Update pickle file
     database.update()
     return {}
 
+@holding_channel(message_channel_key)
 def message_edit(token, message_id, updated_content):
     '''
     Edits a message by overwriting the current content with given content.
@@ -380,11 +406,14 @@ def message_edit(token, message_id, updated_content):
         message_remove(token, message_id)
     else:
         message.content = updated_content
+        message.invalidate()
+        record_message_change('message_edited', message, user)
 
     # Update pickle file
     database.update()
     return {}
 
+@holding_channel(message_channel_key)
 def message_remove(token, message_id):
     '''
     Removes a message with the given ID.
@@ -417,13 +446,15 @@ def message_remove(token, message_id):
         raise AccessError(description='User did not send the message they are trying to remove')
 
     # Removes the message
-    database.messages.remove(message)
+    database.remove_message(message)
+    record_message_change('message_removed', message, user)
 
     # Update pickle file
     database.update()
     return {}
 
-def message_sendlater(token, channel_id, message, send_time):
+@holding_channel(channel_key)
+def message_sendlater(token, channel_id, message, send_time, idempotency_key=None):
     '''
     Saves a message to be sent at a given time to a channel
 
@@ -432,10 +463,12 @@ def message_sendlater(token, channel_id, message, send_time):
         channel_id (int)        - ID of the channel to send the message to
         message (string)        - text to send
         send_time (int)         - time to send the message
+        idempotency_key (str)   - optional key, as for message_send
 
     Exceptions:
         InputError               - When the message is more than 1000 characters long
                                  - When the time to send is in the past
+                                 - When the idempotency key was used for a different message
         AccessError              - When the user is not in the channel they are posting to
 
     Return Value:
@@ -444,6 +477,130 @@ def message_sendlater(token, channel_id, message, send_time):
     '''
     user = database.get_authed_user(token)
 
+    return idempotent(user, idempotency_key,
+                      ('message/sendlater', channel_id, message, send_time),
+                      lambda: send_message_later(user, channel_id, message, send_time))
+
+### Helper Functions ###
+
+def idempotent(user, idempotency_key, request_args, send):
+    '''
+    Calls send() and returns its result, unless the user has already sent
+    with the same idempotency key, in which case the first result is
+    returned without sending again. A key can only be reused for the same
+    request, given by request_args.
+    '''
+    if idempotency_key is None:
+        return send()
+
+    if not isinstance(idempotency_key, str) or not idempotency_key or \
+       len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise InputError(description='Invalid idempotency key')
+
+    key = (user.user_id, idempotency_key)
+
+    while True:
+        # The key is reserved with a future for the result, which a send
+        # with the same key made meanwhile waits on
+        with SENT_LOCK:
+            sent = SENT_CACHE.get(key)
+            reserved = sent is None
+            if reserved:
+                sent = (request_args, Future())
+                SENT_CACHE.put(key, sent)
+
+        if sent[0] != request_args:
+            raise InputError(description='Idempotency key was already used for a different message')
+
+        if reserved:
+            break
+
+        try:
+            return dict(sent[1].result())
+        except Exception: # pylint: disable=broad-except
+            # The first send failed, so this one tries again
+            continue
+
+    try:
+        result = send()
+    except BaseException as err:
+        with SENT_LOCK:
+            if SENT_CACHE.get(key) is sent:
+                SENT_CACHE.discard(key)
+        sent[1].set_exception(err)
+        raise
+
+    sent[1].set_result(result)
+    return dict(result)
+
+def add_message(new_message):
+    '''
+    Adds a message to the data store, recording that it was created
+    '''
+    database.add_message(new_message)
+    database.record('message_created', {'message_id': new_message.message_id,
+                                        'channel_id': new_message.channel,
+                                        'u_id': new_message.sent_by,
+                                        'time_created': new_message.time_sent},
+                    ('channel_messages', new_message.channel))
+
+def deliver_message(message):
+    '''
+    Records that a message sent with message_sendlater has become visible,
+    and forgets its send time. This runs on the scheduler thread, so it
+    takes the locks itself.
+    '''
+    with database_lock.read(), channel_locks.write(message.channel):
+        scheduled = database.scheduled_times.get(message.channel, [])
+        index = bisect_left(scheduled, message.time_sent)
+        if index < len(scheduled) and scheduled[index] == message.time_sent:
+            del scheduled[index]
+
+        if database.get_message(message.message_id) is message:
+            database.record('message_delivered', {'message_id': message.message_id,
+                                                  'channel_id': message.channel,
+                                                  'time_created': message.time_sent},
+                            ('channel_messages', message.channel))
+        database.update()
+
+def record_message_change(change_type, message, user, **details):
+    '''
+    Records a change made by the user to a message in the data store
+    '''
+    database.record(change_type, dict(details, message_id=message.message_id,
+                                      channel_id=message.channel, u_id=user.user_id),
+                    ('channel_messages', message.channel))
+
+def send_message(user, channel_id, message):
+    '''
+    Does the work of message_send for an authorised user
+    '''
+    # Check the message is not more than 1000 characters long
+    if len(message) > 1000:
+        raise InputError(description='Message is more than 1000 characters long')
+
+    channel = database.get_channel(channel_id)
+
+    if not channel.has_member(user):
+        raise AccessError(description='User is not in the channel they are posting to')
+
+    # Send the message to the channel
+    time_now = int(time())
+    sent_by = user.user_id
+    new_message = Message(sent_by, channel.channel_id, message, time_now)
+    add_message(new_message)
+
+    # Bot commands such as /hangman are answered in the background
+    engine.message_sent(channel_id, message, time_now + 1)
+
+    # Update pickle file
+    database.update()
+    return {'message_id': new_message.message_id}
+
+def send_message_later(user, channel_id, message, send_time):
+    '''
+    Does the work of message_sendlater for an authorised user
+    '''
     # Check the message is not more than 1000 characters long
     if len(message) > 1000:
         raise InputError(description='Message is more than 1000 characters long')
@@ -462,88 +619,43 @@ def message_sendlater(token, channel_id, message, send_time):
     if send_time < time_now:
         raise InputError(description='Time sent is a time in the past')
 
-    sent_by = database.active_tokens[token]
+    sent_by = user.user_id
 
     new_message = Message(sent_by, channel.channel_id, message, send_time)
     # If the message send time is after the current time,
     # then channel/messages and /search won't list it
 
     # Send the message to the channel
-    database.messages.append(new_message)
+    add_message(new_message)
+
+    # The message becomes visible at send_time without any other change,
+    # so its time is kept to tell readers when the channel will change
+    insort(database.scheduled_times.setdefault(channel.channel_id, []), send_time)
+    scheduler.schedule(send_time, 'sendlater', deliver_message, new_message)
 
     # Update pickle file
     database.update()
     return {'message_id': new_message.message_id}
 
-HANGMAN_ID = 0
-
-def play_hangman(channel_id, message, time_now):
-
-    channel = database.get_channel(channel_id)
-    if message == '/hangman':
-        # Start a game of hangman
-        # print('We are going to play a game of hangman')
-        channel.hangman_word = get_hangman_word()
-        channel.hangman_active = True
-        channel.hangman_guesses_correct = set()
-        channel.hangman_guesses_incorrect = set()
-
-        hangman_message = Message(HANGMAN_ID, channel_id, f'{channel.hangman_word}&&', time_now)
-        database.messages.append(hangman_message)
-
-    elif message.startswith('/guess'):
-        if not channel.hangman_active:
-            hangman_message = Message(HANGMAN_ID, channel_id, "Please start a game first, with /hangman", time_now)
-            database.messages.append(hangman_message)
-            return
-
-        # Make a guess
-        guess = message.lstrip('/guess')
-
-        guess = guess[1:].lower()
-        if not guess.isalpha():
-            return
-        
-        if len(guess) > 1:
-            if guess == channel.hangman_word:
-                channel.hangman_guesses_correct = channel.hangman_guesses_correct | set(guess)
-            else:
-                channel.hangman_guesses_incorrect.add(str(len(channel.hangman_guesses_incorrect)))
-        else:
-            if guess in channel.hangman_word:
-                # Correct guess
-                channel.hangman_guesses_correct.add(guess)
-            else:
-                channel.hangman_guesses_incorrect.add(guess)
-
-        correct_guess_format = ','.join(list(channel.hangman_guesses_correct))
-        incorrect_guess_format = ','.join(list(channel.hangman_guesses_incorrect))
-        hangman_message = Message(HANGMAN_ID, channel_id, f'{channel.hangman_word}&{correct_guess_format}&{incorrect_guess_format}', time_now)
-        database.messages.append(hangman_message)
-
-        # Check if the hangman is solved
-        solved = True
-        for letter in channel.hangman_word:
-            if not letter in channel.hangman_guesses_correct:
-                solved = False
-                break
-
-        dead = len(channel.hangman_guesses_incorrect) >= 6
-        if solved or dead:
-            string = 'Hangman solved!'
-            if dead: string = 'Hangman dead! The word was "' + channel.hangman_word + '"'
-            hangman_message = Message(HANGMAN_ID, channel_id, string, time_now + 1)
-            database.messages.append(hangman_message)
-            channel.hangman_active = False
-
-    database.update()
-
+def resume_sendlaters():
+    '''
+    Schedules the delivery of every message sent with message_sendlater
+    whose send time was still pending when the data store was last written.
+    Those that are overdue are delivered straight away, and send times
+    whose message has since been removed are forgotten.
+    '''
+    for channel_id, scheduled in database.scheduled_times.items():
+        pending = {}
+        for send_time in scheduled:
+            pending[send_time] = pending.get(send_time, 0) + 1
 
-def get_hangman_word():
+        kept = []
+        for message in database.messages:
+            if message.channel == channel_id and pending.get(message.time_sent):
+                pending[message.time_sent] -= 1
+                kept.append(message.time_sent)
+                scheduler.schedule(message.time_sent, 'sendlater', deliver_message, message)
 
-    words = open('/usr/share/dict/british-english').readlines()
-    words = map(lambda word: word.strip('\n'), words)
-    words = list(filter(lambda word: word.isalpha() and len(word) <= 9, words))
-    word = choice(words)
+        scheduled[:] = sorted(kept)
 
-    return word
+database.on_load(resume_sendlaters)
@@ -73,6 +73,25 @@ def test_valid_message_send(setup_channel):
     assert searched_message['message_id'] == 1
     assert searched_message['message'] == 'Hey everyone'
 
+def test_message_send_idempotency_key(setup_channel):
+    '''
+    Testing that a retried send with an Idempotency-Key is only sent once
+    '''
+    token, channel_id, _ = setup_channel
+
+    payload = {'token': token,
+               'channel_id': channel_id,
+               'message': 'Hey everyone'}
+    headers = {'Idempotency-Key': 'retry-1'}
+
+    first = requests.post(f'{APP_URL}/message/send', json=payload, headers=headers).json()
+    retry = requests.post(f'{APP_URL}/message/send', json=payload, headers=headers).json()
+    assert first == retry == {'message_id': 1}
+
+    get_payload = {'token': token, 'channel_id': channel_id, 'start': 0}
+    response = requests.get(f'{APP_URL}/channel/messages', params=get_payload)
+    assert len(response.json()['messages']) == 1
+
 def test_long_message_send(setup_channel):
     '''
     Testing a message that is longer than 1000 characters
@@ -17,6 +17,7 @@ Integration tests for message functions:
 
 # Builtin modules
 from time import time, sleep
+from threading import Thread, Event
 import pytest
 # Core Package Modules
 from error import InputError, AccessError
@@ -27,9 +28,15 @@ from channel import channel_removeowner, channel_messages
 from search import search
 from workspace_reset import workspace_reset
 # Functions to be tested
-from message import message_send, message_edit, message_remove, message_sendlater
+from message import message_send, message_edit, message_remove, message_sendlater, idempotent, \
+                    SENT_CACHE
+from hangman_words import WordList
 from message import message_react, message_unreact, message_pin, message_unpin
 from admin_user import admin_user_permission_change
+from channel import channel_join
+from data_store import database
+from scheduler import scheduler
+from channel_definition import message_channel_key
 
 @pytest.fixture(autouse=True)
 def call_workspace_reset():
@@ -69,6 +76,78 @@ def test_valid_message_send(setup_channel):
     assert searched_message['message_id'] == 1
     assert searched_message['message'] == 'Hey everyone'
 
+def test_message_send_idempotent(setup_channel, monkeypatch):
+    '''
+    Testing that a retried send with the same key is only sent once
+    '''
+    token, channel_id, _ = setup_channel
+
+    first = message_send(token, channel_id, 'Hey everyone', 'retry-1')
+
+    writes = []
+    monkeypatch.setattr(database, 'update', lambda: writes.append(1))
+    assert message_send(token, channel_id, 'Hey everyone', 'retry-1') == first
+    assert writes == []
+
+    assert len(channel_messages(token, channel_id, 0)['messages']) == 1
+    assert message_send(token, channel_id, 'Hey everyone', 'retry-2') != first
+
+def test_message_send_idempotent_mismatch(setup_channel):
+    '''
+    Testing that a key cannot be reused for a different message
+    '''
+    token, channel_id, _ = setup_channel
+
+    message_send(token, channel_id, 'Hey everyone', 'retry-1')
+    with pytest.raises(InputError):
+        message_send(token, channel_id, 'Something else', 'retry-1')
+    with pytest.raises(InputError):
+        message_sendlater(token, channel_id, 'Hey everyone', int(time()) + 5, 'retry-1')
+    with pytest.raises(InputError):
+        message_send(token, channel_id, 'Hey everyone', 'k' * 256)
+
+def test_message_send_idempotent_per_user(setup_channel):
+    '''
+    Testing that keys of different users do not clash
+    '''
+    token, channel_id, _ = setup_channel
+    other = auth_register('other@ad.unsw.edu.au', 'abc123', 'Jane', 'Bloggs')['token']
+    channel_join(other, channel_id)
+
+    first = message_send(token, channel_id, 'Hey everyone', 'retry-1')
+    assert message_send(other, channel_id, 'Hey everyone', 'retry-1') != first
+
+def test_message_send_idempotent_concurrent(setup_channel):
+    '''
+    Testing that a keyed send does not hold up sends with other keys, and
+    that a send with the same key waits for the first result
+    '''
+    _, _, u_id = setup_channel
+    user = database.get_user(u_id)
+    release = Event()
+    results = []
+
+    def slow_send():
+        release.wait(5)
+        return {'message_id': 1}
+
+    first = Thread(target=lambda: results.append(idempotent(user, 'slow', ('a',), slow_send)))
+    first.start()
+    for _ in range(100):
+        if SENT_CACHE.get((u_id, 'slow')) is not None:
+            break
+        sleep(0.01)
+    retry = Thread(target=lambda: results.append(idempotent(user, 'slow', ('a',), lambda: {})))
+    retry.start()
+
+    assert idempotent(user, 'other', ('b',), lambda: {'message_id': 2}) == {'message_id': 2}
+    assert not results
+
+    release.set()
+    first.join(5)
+    retry.join(5)
+    assert results == [{'message_id': 1}, {'message_id': 1}]
+
 def test_long_message_send(setup_channel):
     '''
     Testing a message that is longer than 1000 characters
@@ -224,6 +303,21 @@ def test_valid_message_remove(setup_message):
     messages = channel_messages(token, channel_id, 0)['messages']
     assert len(messages) == 0
 
+def test_message_channel_key(setup_message, monkeypatch):
+    '''
+    Testing the channel of a message is found by its ID, without the
+    message list being searched
+    '''
+    token, message_id, u_id, channel_id = setup_message
+    removed_id = message_send(token, channel_id, 'removed')['message_id']
+    message_remove(token, removed_id)
+
+    monkeypatch.setattr(database, 'messages', None)
+    assert message_channel_key({'message_id': message_id}) == channel_id
+    assert message_channel_key({'message_id': removed_id}) is None
+    assert message_channel_key({'message_id': [message_id]}) is None
+    assert database.get_message(message_id).message_id == message_id
+
 def test_invalidtoken_message_remove(setup_message):
     '''
     Testing removing a message with an invalid token
@@ -273,6 +367,28 @@ def test_message_react_valid(setup_message):
                                            'react_id': 1,
                                            'u_ids': [1]}]
 
+def test_message_react_other_user(setup_message):
+    '''
+    Testing a react is seen as made by another user, and that the
+    shared json of the message is rebuilt only when it changes
+    '''
+    token, message_id, u_id, channel_id = setup_message
+    other_token = auth_register('z5555555@ad.unsw.edu.au', 'abc123', 'Jane', 'Bloggs')['token']
+    channel_join(other_token, channel_id)
+
+    message = database.get_message(message_id)
+    fragment = message.json()
+    channel_messages(other_token, channel_id, 0)
+    assert message.json() is fragment
+
+    message_react(token, message_id, 1)
+    assert message.json() is not fragment
+
+    other_view = channel_messages(other_token, channel_id, 0)['messages'][0]
+    own_view = channel_messages(token, channel_id, 0)['messages'][0]
+    assert other_view['reacts'] == [{'react_id': 1, 'u_ids': [u_id], 'is_this_user_reacted': False}]
+    assert own_view['reacts'] == [{'react_id': 1, 'u_ids': [u_id], 'is_this_user_reacted': True}]
+
 def test_message_react_invalid_token(setup_message):
     '''
     Testing reacting to a message with an invalid token
@@ -546,6 +662,28 @@ def test_valid_message_sendlater_later(setup_channel):
     searched_message = search(token, 'It is a nice day')['messages'][0]
     assert searched_message['message'] == 'It is a nice day'
 
+def test_message_sendlater_resumed_after_restart(setup_channel, monkeypatch):
+    '''
+    Testing a message which was due while the server was stopped is
+    delivered once the data store is loaded again
+    '''
+    monkeypatch.setattr(database.changes, 'floor', database.changes.floor)
+    token, channel_id, _ = setup_channel
+    since = database.version_seq
+    message_id = message_sendlater(token, channel_id, 'Later', int(time()) + 1)['message_id']
+
+    # The server stops before the message is due, and starts after
+    scheduler.cancel_all()
+    database.flush()
+    sleep(1)
+    database.setup()
+    sleep(1)
+
+    delivered, _ = database.changes.since(since, 100)
+    assert [change['message_id'] for change in delivered
+            if change['type'] == 'message_delivered'] == [message_id]
+    assert database.scheduled_times[channel_id] == []
+
 def test_valid_message_sendlater_past(setup_channel):
     '''
     Testing a valid message that is sent in the past
@@ -609,3 +747,31 @@ def test_invalid_id_message_sendlater(setup_channel):
 
     with pytest.raises(InputError) as _:
         message_id = message_sendlater(token, fake_channel_id, 'Hey everyone', sendtime)
+
+# Tests for the hangman word list
+
+def test_hangman_words_filtered(tmp_path):
+    '''
+    Tests that only words of letters no longer than 9 characters are chosen
+    '''
+    dictionary = tmp_path / 'words'
+    dictionary.write_text("cat\nmoon's\nhorse\nabbreviations\n\nzebra\n", encoding='utf-8')
+    words = WordList(str(dictionary), str(tmp_path / 'words.p'))
+
+    chosen = {words.choose() for _ in range(200)}
+    assert chosen == {'cat', 'horse', 'zebra'}
+
+def test_hangman_words_cache_file(tmp_path, monkeypatch):
+    '''
+    Tests that the filtered words are read back from the cache file
+    '''
+    dictionary = tmp_path / 'words'
+    dictionary.write_text("cat\nhorse\n", encoding='utf-8')
+    WordList(str(dictionary), str(tmp_path / 'words.p')).load()
+
+    def read_dictionary(self):
+        raise AssertionError('the dictionary should not be read again')
+    monkeypatch.setattr(WordList, 'read_dictionary', read_dictionary)
+
+    words = WordList(str(dictionary), str(tmp_path / 'words.p'))
+    assert words.choose() in ('cat', 'horse')
@@ -0,0 +1,192 @@
+"""
+The outbox which sends the emails of slackr in the background, so that a
+request never waits for an email server
+"""
+
+### Builtin/pip Modules ###
+import os
+import ssl
+import smtplib
+from email.message import EmailMessage
+from queue import Queue, Empty
+from threading import Lock, Thread
+from time import time
+
+### Package Modules ###
+from scheduler import scheduler
+
+### SMTP Settings ###
+# Where emails are sent from, which is set through the environment. By
+# default they go to a local debugging server, such as
+# `python3 -m aiosmtpd -n -l localhost:1025`, without logging in. For a real
+# server, set SLACKR_SMTP_HOST, SLACKR_SMTP_PORT and SLACKR_SMTP_SSL=1, and
+# give SLACKR_SMTP_USER and SLACKR_SMTP_PASSWORD. Credentials never go in code.
+SMTP_HOST = os.environ.get("SLACKR_SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SLACKR_SMTP_PORT", "1025"))
+SMTP_SSL = os.environ.get("SLACKR_SMTP_SSL", "0") != "0"
+SMTP_USER = os.environ.get("SLACKR_SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("SLACKR_SMTP_PASSWORD", "")
+SENDER = os.environ.get("SLACKR_SMTP_SENDER", SMTP_USER or "slackr@localhost")
+
+### Outbox Settings ###
+WORKERS = 2
+# Most emails sent over a connection in one go
+BATCH_SIZE = 20
+# Seconds a connection is kept open for more emails
+IDLE_SECONDS = 30
+# Attempts made at sending an email, and seconds before the first retry,
+# which doubles for each retry after
+MAX_ATTEMPTS = 5
+RETRY_SECONDS = 5
+
+def smtp_connect():
+    """
+    Returns a connection to the SMTP server in the settings, logged in if
+    SLACKR_SMTP_USER is set, which needs SLACKR_SMTP_PASSWORD as well
+    """
+    if SMTP_SSL:
+        connection = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=ssl.create_default_context(),
+                                      timeout=30)
+    else:
+        connection = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+
+    if SMTP_USER:
+        if not SMTP_PASSWORD:
+            connection.close()
+            raise smtplib.SMTPAuthenticationError(535, "SLACKR_SMTP_PASSWORD is not set")
+        connection.login(SMTP_USER, SMTP_PASSWORD)
+
+    return connection
+
+class Outbox:
+    """
+    A queue of emails which worker threads send in the background. Each
+    worker sends the emails it takes in batches over one connection, which
+    it keeps open until it has been idle for IDLE_SECONDS. An email that
+    cannot be sent is tried again later with the scheduler, up to
+    MAX_ATTEMPTS times. The workers are started when the first email is put.
+    """
+
+    def __init__(self, connect=smtp_connect, workers=WORKERS):
+        self.connect = connect
+        self.workers = workers
+        self.queue = Queue()
+        self.threads = []
+        self.lock = Lock()
+        self.counts = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "batches": 0,
+                       "connections": 0}
+
+    def send(self, to_address, subject, body):
+        """
+        Queues an email to be sent, returning straight away
+        """
+        message = EmailMessage()
+        message["From"] = SENDER
+        message["To"] = to_address
+        message["Subject"] = subject
+        message.set_content(body)
+
+        self.count("queued")
+        self.put((message, 1))
+
+    def put(self, email):
+        """
+        Queues a (message, attempt) pair, starting the workers if needed
+        """
+        with self.lock:
+            while len(self.threads) < self.workers:
+                thread = Thread(target=self.work, name="outbox", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+        self.queue.put(email)
+
+    def work(self):
+        """
+        Sends emails from the queue, forever
+        """
+        connection = None
+
+        while True:
+            try:
+                batch = [self.queue.get(timeout=IDLE_SECONDS if connection else None)]
+            except Empty:
+                connection = self.disconnect(connection)
+                continue
+
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            connection = self.send_batch(connection, batch)
+
+    def send_batch(self, connection, batch):
+        """
+        Sends a batch of emails, connecting first if needed, and returns the
+        connection to use for the next batch. Emails which could not be sent
+        are retried later, and the connection is dropped.
+        """
+        self.count("batches")
+
+        for index, (message, attempt) in enumerate(batch):
+            try:
+                if connection is None:
+                    connection = self.connect()
+                    self.count("connections")
+                connection.send_message(message)
+                self.count("sent")
+            except (smtplib.SMTPException, OSError):
+                connection = self.disconnect(connection)
+                self.retry(message, attempt)
+                # The rest of the batch was not tried, so it is queued again as it is
+                for email in batch[index + 1:]:
+                    self.put(email)
+                break
+
+        return connection
+
+    def retry(self, message, attempt):
+        """
+        Schedules another attempt at sending an email, or gives up on it
+        """
+        if attempt >= MAX_ATTEMPTS:
+            self.count("failed")
+            return
+
+        self.count("retried")
+        scheduler.schedule(time() + RETRY_SECONDS * 2 ** (attempt - 1), "email_retry",
+                           self.put, (message, attempt + 1))
+
+    @classmethod
+    def disconnect(cls, connection):
+        """
+        Closes a connection, ignoring any errors, and returns None
+        """
+        if connection is not None:
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+        return None
+
+    def count(self, name):
+        """
+        Adds one to a count of the outbox's work
+        """
+        with self.lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        """
+        Returns the counts of emails queued, sent, retried and failed, the
+        batches and connections made, and how many emails are waiting
+        """
+        with self.lock:
+            return dict(self.counts, waiting=self.queue.qsize())
+
+### Global Variables ###
+
+outbox = Outbox()
@@ -0,0 +1,76 @@
+"""
+Tests for the outbox.
+Most tests have self-explanatory names.
+"""
+
+from time import monotonic, sleep
+import outbox as _outbox
+from outbox import Outbox
+
+# pylint: disable=missing-docstring
+
+### setup ###
+
+class FakeSMTP:
+    def __init__(self, sent, fail=False):
+        self.sent = sent
+        self.fail = fail
+
+    def send_message(self, message):
+        if self.fail:
+            raise OSError("connection lost")
+        self.sent.append(message["To"])
+
+    def quit(self):
+        pass
+
+def wait_until(condition, timeout=5):
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            return False
+        sleep(0.01)
+    return True
+
+### test Outbox ###
+
+def test_outbox_batches():
+    sent = []
+    outbox = Outbox(connect=lambda: FakeSMTP(sent), workers=1)
+
+    for index in range(3):
+        outbox.send("user" + str(index) + "@domain.com", "subject", "body")
+    assert wait_until(lambda: len(sent) == 3)
+
+    stats = outbox.stats()
+    assert sorted(sent) == ["user0@domain.com", "user1@domain.com", "user2@domain.com"]
+    assert stats["queued"] == 3 and stats["sent"] == 3 and stats["waiting"] == 0
+    # The connection is kept for the next batch
+    assert stats["connections"] == 1
+
+def test_outbox_retry(monkeypatch):
+    monkeypatch.setattr(_outbox, "RETRY_SECONDS", 0)
+    sent = []
+    connections = []
+
+    def connect():
+        # The first connection fails part way through
+        connections.append(1)
+        return FakeSMTP(sent, fail=len(connections) == 1)
+
+    outbox = Outbox(connect=connect, workers=1)
+    outbox.send("user@domain.com", "subject", "body")
+    assert wait_until(lambda: sent)
+
+    stats = outbox.stats()
+    assert sent == ["user@domain.com"]
+    assert stats["retried"] == 1 and stats["sent"] == 1 and stats["failed"] == 0
+
+def test_outbox_gives_up(monkeypatch):
+    monkeypatch.setattr(_outbox, "RETRY_SECONDS", 0)
+    monkeypatch.setattr(_outbox, "MAX_ATTEMPTS", 2)
+    outbox = Outbox(connect=lambda: FakeSMTP([], fail=True), workers=1)
+    outbox.send("user@domain.com", "subject", "body")
+    assert wait_until(lambda: outbox.stats()["failed"])
+
+    assert outbox.stats()["retried"] == 1
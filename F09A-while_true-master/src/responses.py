@@ -0,0 +1,144 @@
+"""
+Helpers for building HTTP responses shared by the routes of slackr
+"""
+
+### Builtin/pip Modules ###
+from json import dumps
+from collections.abc import Iterator
+from flask import request, make_response, stream_with_context, Response
+
+### Package Modules ###
+from data_store import database
+
+### Streaming ###
+# Size in characters that streamed JSON is gathered into before being sent
+CHUNK_SIZE = 16 * 1024
+
+### Functions ###
+
+def conditional_response(parts, build, stream=False, cache=None):
+    """
+    Returns the response for a GET route whose payload only changes when
+    one of `parts` does. `parts` are the version numbers (and any other
+    values such as the requesting user or the page asked for) that the
+    payload depends on, and
+    `build` is called to produce the payload, or a string of the payload
+    already encoded as JSON.
+
+    The parts become the ETag of the response. When the request already
+    carries that ETag in If-None-Match, an empty 304 response is returned
+    without calling `build`, so nothing is serialised or sent. Otherwise
+    the payload is sent with stream_response when `stream` is set.
+
+    When a `cache` is given, the encoded payload is kept in it under the
+    ETag, and is sent from there as long as the ETag is the same.
+    """
+    etag = ".".join(str(part) for part in (database.version("workspace"),) + tuple(parts))
+    key = (etag,)
+    not_modified = request.if_none_match.contains(etag)
+
+    # The cache is only looked in when a body is sent, so that a 304 does
+    # not count as a hit or a miss
+    encoded = cache.get(key) if cache is not None and not not_modified else None
+
+    if not_modified:
+        response = make_response("", 304)
+    elif encoded is not None:
+        response = make_response(encoded)
+    else:
+        payload = build()
+
+        if isinstance(payload, str):
+            response = make_response(payload)
+        elif stream:
+            response = stream_response(payload, cache, key)
+        else:
+            encoded = dumps(payload)
+            if cache is not None:
+                cache.put(key, encoded, len(encoded))
+            response = make_response(encoded)
+
+    response.set_etag(etag)
+    return response
+
+def stream_response(payload, cache=None, key=None):
+    """
+    Returns a response which sends `payload` as JSON while it is being
+    encoded. Any generator in the payload is consumed one item at a time
+    as the response is sent, rather than being built into one big list
+    and string first. The body is exactly what dumps(payload) would give
+    for the same payload with its generators turned into lists.
+
+    Anything that can fail should be checked before the payload is made,
+    as errors raised by a generator come after the response has started.
+
+    When a `cache` is given, the encoded payload is put in it under `key`
+    once all of it has been sent.
+    """
+    chunks = stream_json(payload)
+    if cache is not None:
+        chunks = cache_chunks(chunks, cache, key)
+
+    return Response(stream_with_context(chunks))
+
+def stream_json(payload):
+    """
+    Yields the JSON encoding of `payload` in chunks of about CHUNK_SIZE
+    """
+    chunk = []
+    size = 0
+
+    for piece in iter_json(payload):
+        chunk.append(piece)
+        size += len(piece)
+
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield "".join(chunk)
+
+### Helper Functions ###
+
+def cache_chunks(chunks, cache, key):
+    """
+    Yields the chunks, then caches all of them joined together. Nothing is
+    cached if the chunks are not all used, such as when a client hangs up.
+    """
+    sent = []
+    for chunk in chunks:
+        sent.append(chunk)
+        yield chunk
+
+    encoded = "".join(sent)
+    cache.put(key, encoded, len(encoded))
+
+def iter_json(value):
+    """
+    Yields the JSON encoding of `value` piece by piece. Dictionaries and
+    iterators are walked through, while everything else (including lists
+    and the items of an iterator) is small or already built, so it is
+    encoded in one go.
+    """
+    if isinstance(value, dict):
+        yield "{"
+        for index, (key, item) in enumerate(value.items()):
+            yield (", " if index else "") + dumps(str(key)) + ": "
+            yield from iter_json(item)
+        yield "}"
+
+    elif isinstance(value, Iterator):
+        yield "["
+        for index, item in enumerate(value):
+            if index:
+                yield ", "
+            if isinstance(item, Iterator):
+                yield from iter_json(item)
+            else:
+                yield dumps(item)
+        yield "]"
+
+    else:
+        yield dumps(value)
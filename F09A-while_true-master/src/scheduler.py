@@ -0,0 +1,161 @@
+"""
+A single thread which runs work at given times for slackr, such as ending
+standups, rather than a thread being made to wait for each one
+"""
+
+### Builtin/pip Modules ###
+import heapq
+import logging
+from itertools import count
+from threading import Condition, Lock, Thread
+from time import time
+
+### Package Modules ###
+from data_store import database
+
+LOGGER = logging.getLogger(__name__)
+
+class Job:
+    """
+    Work scheduled to run at `due`, a time in seconds since the epoch
+    """
+
+    def __init__(self, due, kind, callback, args):
+        self.due = due
+        self.kind = kind
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Stops the job from running, if it has not already
+        """
+        self.cancelled = True
+
+class Scheduler:
+    """
+    Keeps the jobs in a heap ordered by when they are due, and runs each one
+    on a single thread once it is due. The thread is started when the first
+    job is scheduled, and sleeps until the earliest job is due or an earlier
+    one is added.
+
+    Jobs run one after another, so they should be short, and they hold no
+    lock when they start, so they take the data store locks they need. For
+    each kind of job, the number run, cancelled and failed are kept, along
+    with how late those that ran were (the lag between being due and being
+    run). A job that fails is logged, and counted as failed but not as run.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.sequence = count()
+        self.condition = Condition(Lock())
+        self.thread = None
+
+        self.stats_lock = Lock()
+        self.counts = {}
+
+    def schedule(self, due, kind, callback, *args):
+        """
+        Runs callback(*args) at `due`, or as soon as possible if that has
+        passed. `kind`, such as "standup", groups the job in the statistics.
+        Returns the Job, which can be cancelled.
+        """
+        job = Job(due, kind, callback, args)
+
+        with self.condition:
+            heapq.heappush(self.heap, (due, next(self.sequence), job))
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name="scheduler", daemon=True)
+                self.thread.start()
+            # Only an earlier job changes how long the thread should sleep
+            if self.heap[0][2] is job:
+                self.condition.notify()
+
+        return job
+
+    def cancel_all(self):
+        """
+        Cancels every job which has not run yet
+        """
+        with self.condition:
+            for _, _, job in self.heap:
+                if not job.cancelled:
+                    job.cancel()
+                    self.count(job.kind, "cancelled")
+            self.heap.clear()
+
+    def pending(self):
+        """
+        Returns how many jobs are waiting to run, including cancelled jobs
+        which have not been reached yet
+        """
+        with self.condition:
+            return len(self.heap)
+
+    def run(self):
+        """
+        Runs each job when it is due, forever
+        """
+        while True:
+            job = self.next_job()
+            lag = max(0.0, time() - job.due)
+
+            try:
+                job.callback(*job.args)
+            except Exception: # pylint: disable=broad-except
+                # One failed job must not stop the others from running
+                LOGGER.exception("The scheduled %s job failed", job.kind)
+                self.count(job.kind, "failed")
+                continue
+
+            self.count(job.kind, "run", lag)
+
+    def next_job(self):
+        """
+        Waits for the earliest job which has not been cancelled to be due,
+        and takes it off the heap
+        """
+        with self.condition:
+            while True:
+                while self.heap and self.heap[0][2].cancelled:
+                    self.count(heapq.heappop(self.heap)[2].kind, "cancelled")
+
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+
+                wait = self.heap[0][0] - time()
+                if wait <= 0:
+                    return heapq.heappop(self.heap)[2]
+
+                self.condition.wait(wait)
+
+    def count(self, kind, outcome, lag=None):
+        """
+        Counts a job of the given kind being run, cancelled or failing
+        """
+        with self.stats_lock:
+            counts = self.counts.setdefault(kind, {"run": 0, "cancelled": 0, "failed": 0,
+                                                   "lag_seconds": 0.0, "max_lag_seconds": 0.0})
+            counts[outcome] += 1
+            if lag is not None:
+                counts["lag_seconds"] += lag
+                counts["max_lag_seconds"] = max(counts["max_lag_seconds"], lag)
+
+    def stats(self):
+        """
+        Returns how many jobs are pending, and for each kind of job, how
+        many were run, cancelled and failed, and their total and longest
+        lag in seconds
+        """
+        with self.stats_lock:
+            kinds = {kind: dict(counts) for kind, counts in self.counts.items()}
+
+        return {"pending": self.pending(), "jobs": kinds}
+
+### Global Variables ###
+
+scheduler = Scheduler()
+database.watch("workspace", lambda key: scheduler.cancel_all())
@@ -0,0 +1,54 @@
+"""
+Tests for the scheduler.
+Most tests have self-explanatory names.
+"""
+
+from threading import Event
+from time import time
+from scheduler import Scheduler
+
+# pylint: disable=missing-docstring
+
+### test Scheduler ###
+
+def test_scheduler_order():
+    scheduler = Scheduler()
+    ran = []
+    done = Event()
+
+    now = time()
+    scheduler.schedule(now + 0.2, "test", ran.append, "later")
+    scheduler.schedule(now + 0.3, "test", done.set)
+    # An earlier job wakes the thread up
+    scheduler.schedule(now + 0.1, "test", ran.append, "sooner")
+    scheduler.schedule(now - 1, "test", ran.append, "overdue")
+
+    assert done.wait(5)
+    assert ran == ["overdue", "sooner", "later"]
+
+    stats = scheduler.stats()
+    assert stats["pending"] == 0
+    assert stats["jobs"]["test"]["run"] == 4
+    assert stats["jobs"]["test"]["max_lag_seconds"] >= 1
+
+def test_scheduler_cancel():
+    scheduler = Scheduler()
+    ran = []
+    done = Event()
+
+    def fail():
+        raise ValueError
+
+    job = scheduler.schedule(time(), "test", ran.append, "cancelled")
+    job.cancel()
+    scheduler.schedule(time(), "test", fail)
+    scheduler.schedule(time() + 0.1, "test", done.set)
+    scheduler.schedule(time() + 60, "test", ran.append, "reset")
+
+    # The thread goes on after a job fails
+    assert done.wait(5)
+    scheduler.cancel_all()
+    assert not ran
+
+    stats = scheduler.stats()["jobs"]["test"]
+    assert stats["cancelled"] == 2 and stats["failed"] == 1 and stats["run"] == 1
@@ -3,15 +3,26 @@ Contains search function and its HTTP route
 """
 
 ### Builtin/pip Modules ###
-from json import dumps
 from flask import request, Blueprint
 
 ### Package Modules ###
 from data_store import database
+from responses import stream_response
+from channel import messages_version
+from cache import LRUCache
+from message_definition import json_for
 
 ### Page Blueprint ###
 SEARCH_PAGE = Blueprint("search_page", __name__)
 
+### Result Cache ###
+# The messages of a channel which match a query, keyed by the query and the
+# version of the channel's messages, so a change to a channel's messages
+# only stops the entries for that channel from being used. Sizes are counts
+# of messages.
+RESULT_CACHE = LRUCache("search", max_entries=65536, max_size=1024 * 1024)
+database.watch("workspace", lambda key: RESULT_CACHE.clear())
+
 ### Routes ###
 
 @SEARCH_PAGE.route("/search", methods=["GET"])
@@ -21,7 +32,7 @@ def route_search():
     """
     token = request.args.get("token")
     query = request.args.get("query_str")
-    return dumps(search(token, query))
+    return stream_response(search_payload(token, query))
 
 ### Functions ###
 
@@ -29,20 +40,52 @@ def search(token, query):
     """
     Searches the entire message history for messages matching a given query
     """
+    data = search_payload(token, query)
+    data["messages"] = list(data["messages"])
+
+    return data
+
+### Helper Functions ###
+
+def search_payload(token, query):
+    """
+    Does the work of search, leaving the results as a generator
+    so they can be streamed to the client
+    """
     user = database.get_authed_user(token, error=False)
-    results = []
+    results = iter([])
 
     if isinstance(token, str) and isinstance(query, str) and user:
         query = query.lower().strip()
         if query:
-            for channel in database.channels:
-                channel_messages = channel.json_messages(user)
-                results += [message for message in channel_messages \
-                                    if match(message["message"], query)]
+            results = iter_search(user, query)
 
     return {"messages": results}
 
-### Helper Functions ###
+def iter_search(user, query):
+    """
+    Lazily yields the messages in every channel that match a (processed) query
+    """
+    for channel in database.channels:
+        for fragment in channel_matches(channel, query):
+            yield json_for(fragment, user)
+
+def channel_matches(channel, query):
+    """
+    Returns the shared json of the visible messages of a channel that
+    match a (processed) query, using the cached matches if the channel has
+    not changed since. Messages are read from a snapshot of the channel,
+    so no lock is held while searching.
+    """
+    key = (query, channel.channel_id) + messages_version(channel.channel_id)
+    matches = RESULT_CACHE.get(key)
+
+    if matches is None:
+        matches = [fragment for fragment in channel.visible_messages()
+                   if match(fragment["message"], query)]
+        RESULT_CACHE.put(key, matches, len(matches) + 1)
+
+    return matches
 
 def match(message, query):
     """
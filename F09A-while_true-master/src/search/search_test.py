@@ -4,6 +4,7 @@ Most tests have self-explanatory names.
 """
 
 import string
+from json import dumps
 import pytest
 import search as _search # named like this to avoid a namespace
                          # conflict with the search wrapper
@@ -11,8 +12,9 @@ import search as _search # named like this to avoid a namespace
 from auth import auth_register, auth_logout
 from channels import channels_create
 from channel import channel_join, channel_messages
-from message import message_send
+from message import message_send, message_edit
 from workspace_reset import workspace_reset
+from responses import stream_json
 
 # pylint: disable=missing-docstring,line-too-long,redefined-outer-name,unused-variable
 
@@ -170,6 +172,24 @@ def test_search_wrong_type(setup):
     token, messages = setup
     assert search(token, 3) == []
 
+def test_search_streamed(setup):
+    token, messages = setup
+    streamed = "".join(stream_json(_search.search_payload(token, "moon")))
+    assert streamed == dumps(_search.search(token, "moon"))
+
+def test_search_cached(setup):
+    token, messages = setup
+    first = search(token, "moon")
+    hits = _search.RESULT_CACHE.hits
+    assert search(token, "moon") == first
+    assert _search.RESULT_CACHE.hits == hits + NUM_CHANNELS
+
+    edited = first[0]
+    message_edit(token, edited["message_id"], "no longer matching")
+    assert [message["message_id"] for message in search(token, "moon")] \
+        == [message["message_id"] for message in first[1:]]
+    assert _search.RESULT_CACHE.hits == hits + 2 * NUM_CHANNELS - 1
+
 # this must be the last test because
 # the first user is logged out
 def test_search_invalid_token(setup):
@@ -4,9 +4,11 @@ HTTP web server for slackr
 
 import sys
 from json import dumps
-from flask import Flask
+from threading import Thread
+from flask import Flask, request, g
 from flask_cors import CORS
 from data_store import database
+from locks import database_lock
 from channel import CHANNEL_PAGE
 from channels import CHANNELS_PAGE
 from message import MESSAGE_PAGE
@@ -17,6 +19,11 @@ from standup import STANDUP_PAGE
 from admin_user import ADMIN_USER_PAGE
 from workspace_reset import WORKSPACE_RESET_PAGE
 from search import SEARCH_PAGE
+from batch import BATCH_PAGE
+from stats import STATS_PAGE
+from changes import CHANGES_PAGE, wait_for_changes
+from hangman_words import words
+import hangman_bot # pylint: disable=unused-import
 
 def default_handler(err):
     """
@@ -32,6 +39,39 @@ def default_handler(err):
 
     return response
 
+# Requests with these methods only read the data store
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+def lock_database():
+    """
+    This is run before each request, and holds the data store lock for it:
+    shared for requests that only read or only change channels that they
+    lock themselves (routes marked with channel_scoped), and exclusive for
+    the rest (including routes marked with writes_data_store). Routes
+    marked with locks_data_store are given no lock.
+    """
+    route = APP.view_functions.get(request.endpoint)
+    if getattr(route, "locks_data_store", False):
+        return
+
+    g.reading = (request.method in READ_METHODS or getattr(route, "channel_scoped", False)) \
+                and not getattr(route, "writes_data_store", False)
+    if g.reading:
+        database_lock.acquire_read()
+    else:
+        database_lock.acquire_write()
+
+def unlock_database(_err):
+    """
+    This is run once each request is finished, including sending a
+    streamed response, and releases the data store lock
+    """
+    reading = g.pop("reading", None)
+    if reading is True:
+        database_lock.release_read()
+    elif reading is False:
+        database_lock.release_write()
+
 APP = Flask(__name__)
 CORS(APP)
 
@@ -45,15 +85,25 @@ for page in (CHANNEL_PAGE,
              USERPROFILE_PAGE,
              ADMIN_USER_PAGE,
              STANDUP_PAGE,
-             SEARCH_PAGE):
+             SEARCH_PAGE,
+             BATCH_PAGE,
+             STATS_PAGE,
+             CHANGES_PAGE):
     APP.register_blueprint(page)
 
+# Long polls wait before taking the data store lock
+APP.before_request(wait_for_changes)
+APP.before_request(lock_database)
+APP.teardown_request(unlock_database)
+
 APP.config["TRAP_HTTP_EXCEPTIONS"] = True
 APP.register_error_handler(Exception, default_handler)
 
 if __name__ == "__main__":
     # Sets up the Data Store
     database.setup()
+    # Reads the hangman words before the first game needs them
+    Thread(target=words.preload, daemon=True).start()
     PORT = int(sys.argv[1]) if len(sys.argv) == 2 else 8080
     database.current_port = PORT
     APP.run(port=PORT)
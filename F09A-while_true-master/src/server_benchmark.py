@@ -0,0 +1,176 @@
+"""
+Compares how server.py (a thread for each connection) and async_server.py
+(uvicorn's event loop, with a pool of threads for the routes) cope with many
+connections at once:
+
+    python3 src/server_benchmark.py [--polls N] [--requests N] [--concurrency N]
+
+Run it with the same PYTHONPATH as run_server.sh. Each server is started
+in a temporary directory, so the data store in the current directory is
+left alone. The benchmark then:
+
+    1. holds open --polls long polls of /changes, which wait for a change,
+    2. makes --requests requests for /users/all, --concurrency at a time,
+       while the polls are waiting, and times them,
+    3. records a change, and times how long until every poll has answered.
+
+It prints the requests per second, their median and slowest latency, the
+threads the server had while the polls were open, and the time for the
+polls to answer.
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from json import dumps, loads
+from time import perf_counter
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+SERVERS = (("threaded", "server.py", 8301), ("asyncio", "async_server.py", 8302))
+
+### Client ###
+
+async def fetch(port, method, path, payload=None):
+    """
+    Makes a request over a new connection, returning the decoded JSON body
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = dumps(payload).encode() if payload is not None else b""
+    writer.write((method + " " + path + " HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                  "Content-Type: application/json\r\nContent-Length: " + str(len(body))
+                  + "\r\nConnection: close\r\n\r\n").encode() + body)
+
+    response = await reader.read()
+    writer.close()
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    if b"transfer-encoding: chunked" in head.lower():
+        body = dechunk(body)
+
+    return loads(body)
+
+def dechunk(body):
+    """
+    Joins the chunks of a body sent with chunked transfer encoding
+    """
+    chunks = []
+    while True:
+        size, _, body = body.partition(b"\r\n")
+        size = int(size.split(b";")[0], 16)
+        if not size:
+            return b"".join(chunks)
+        chunks.append(body[:size])
+        body = body[size + 2:]
+
+### Benchmark ###
+
+async def wait_until_up(port, process):
+    """
+    Waits for a server to accept connections
+    """
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError("the server on port " + str(port) + " stopped")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+
+    raise RuntimeError("the server on port " + str(port) + " did not start")
+
+def thread_count(pid):
+    """
+    Returns the number of threads in a process, or None where /proc is missing
+    """
+    try:
+        with open("/proc/" + str(pid) + "/status") as status:
+            for line in status:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return None
+
+async def run(port, pid, args):
+    """
+    Runs the benchmark against a server, returning its results
+    """
+    await fetch(port, "POST", "/workspace/reset")
+    token = (await fetch(port, "POST", "/auth/register",
+                         {"email": "bench@example.com", "password": "benchmark",
+                          "name_first": "Bench", "name_last": "Mark"}))["token"]
+    since = (await fetch(port, "GET", "/changes?token=" + token + "&since=0"))["next_since"]
+
+    # Long polls, which wait for the change made at the end
+    polls = [asyncio.create_task(fetch(port, "GET", "/changes?token=" + token + "&since="
+                                       + str(since) + "&wait=" + str(args.wait)))
+             for _ in range(args.polls)]
+    await asyncio.sleep(1)
+    threads = thread_count(pid)
+
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def timed():
+        async with semaphore:
+            started = perf_counter()
+            await fetch(port, "GET", "/users/all?token=" + token)
+            latencies.append(perf_counter() - started)
+
+    started = perf_counter()
+    await asyncio.gather(*(timed() for _ in range(args.requests)))
+    elapsed = perf_counter() - started
+
+    changed = perf_counter()
+    await fetch(port, "POST", "/channels/create", {"token": token, "name": "bench",
+                                                   "is_public": True})
+    answered = await asyncio.gather(*polls)
+    polls_seconds = perf_counter() - changed
+
+    latencies.sort()
+    return {"requests_per_second": args.requests / elapsed,
+            "median_ms": latencies[len(latencies) // 2] * 1000,
+            "slowest_ms": latencies[-1] * 1000,
+            "threads": threads,
+            "polls_answered": sum(1 for poll in answered if poll["changes"]),
+            "polls_seconds": polls_seconds}
+
+def main():
+    """
+    Runs the benchmark against each server, and prints the results
+    """
+    parser = argparse.ArgumentParser(description="Compare server.py and async_server.py")
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--wait", type=int, default=30)
+    args = parser.parse_args()
+
+    print("%-9s %8s %10s %11s %8s %14s" % ("server", "req/s", "median ms", "slowest ms",
+                                          "threads", "polls answered"))
+
+    for name, script, port in SERVERS:
+        with tempfile.TemporaryDirectory() as directory:
+            process = subprocess.Popen([sys.executable, os.path.join(SRC, script), str(port)],
+                                       cwd=directory, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL)
+            try:
+                asyncio.run(wait_until_up(port, process))
+                results = asyncio.run(run(port, process.pid, args))
+            finally:
+                process.terminate()
+                process.wait()
+
+        print("%-9s %8.0f %10.1f %11.1f %8s %7d in %.2fs"
+              % (name, results["requests_per_second"], results["median_ms"],
+                 results["slowest_ms"], results["threads"] or "-", results["polls_answered"],
+                 results["polls_seconds"]))
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,19 @@ implementations for standup
 
 ### Builtin/pip Modules ###
 from json import dumps
+from time import time
 from datetime import timezone, datetime, timedelta
-from threading import Timer
 from flask import request, Blueprint
 
 ### Package Modules ###
 from error import InputError, AccessError
-from message import message_send
+from message import add_message
+from message_definition import Message
 from data_store import database
+from locks import database_lock, holding_channel, channel_scoped
+from channel_definition import channel_key
+from scheduler import scheduler
+from standup_journal import journal
 
 ### Page Blueprint ###
 STANDUP_PAGE = Blueprint("standup_page", __name__)
@@ -19,6 +24,7 @@ STANDUP_PAGE = Blueprint("standup_page", __name__)
 ### Routes ###
 
 @STANDUP_PAGE.route("/standup/start", methods=['POST'])
+@channel_scoped
 def route_standup_start():
     '''
     route for standup_start
@@ -30,6 +36,7 @@ def route_standup_start():
     return dumps(standup_start(token, channel_id, length))
 
 @STANDUP_PAGE.route("/standup/active", methods=['GET'])
+@channel_scoped
 def route_standup_active():
     '''
     route for standup_active
@@ -39,6 +46,7 @@ def route_standup_active():
     return dumps(standup_active(token, channel_id))
 
 @STANDUP_PAGE.route("/standup/send", methods=['POST'])
+@channel_scoped
 def route_standup_send():
     '''
     route for standup_send
@@ -51,6 +59,7 @@ def route_standup_send():
 
 ### Functions ###
 
+@holding_channel(channel_key)
 def standup_start(token, channel_id, length):
     '''
     Starts the standup given seconds in length.
@@ -83,14 +92,15 @@ def standup_start(token, channel_id, length):
 
     channel.time_finish = time_finish
     channel.is_active = True
+    channel.standup_user = user.user_id
 
     database.update()
 
-    timer = Timer(length, create_standup_message, [token, channel])
-    timer.start()
+    schedule_standup(channel)
 
     return {"time_finish": time_finish}
 
+@holding_channel(channel_key)
 def standup_active(token, channel_id):
     '''
     Return whether a standup is active in the channel or not
@@ -124,18 +134,20 @@ def standup_active(token, channel_id):
         is_active = False
         time_finish = None
     elif channel.time_finish <= current:
-        # Standup has finished, update the channel's fields
+        # Standup has finished, update the channel's fields, posting the
+        # summary if the scheduler has not got to it yet
+        post_summary(channel)
         channel.is_active = False
         channel.time_finish = None
         channel.buffer = []
+        database.update()
     else:
         is_active = True
         time_finish = channel.time_finish
 
-    database.update()
-
     return {"is_active": is_active, "time_finish": time_finish}
 
+@holding_channel(channel_key)
 def standup_send(token, channel_id, message):
     '''
     Save the messages during the standup to the buffer
@@ -167,18 +179,74 @@ def standup_send(token, channel_id, message):
     if channel.is_active is False:
         raise InputError(description="An active standup is not currently running in this channel")
 
-    new_message = handle + ': ' + message + '\n'
-    channel.buffer.append(new_message)
-
-    database.update()
+    # Kept in the journal rather than writing the whole data store
+    journal.append(channel, handle + ': ' + message + '\n')
 
     return {}
 
 ### Helper Functions ###
 
-def create_standup_message(token, channel):
+def schedule_standup(channel):
+    '''
+    Schedules the end of the active standup in the channel
     '''
-    Create the standup message from the buffered messages
+    scheduler.schedule(channel.time_finish, "standup", finish_standup,
+                       channel.channel_id, channel.time_finish)
+
+def finish_standup(channel_id, time_finish):
+    '''
+    Posts the buffered messages of the standup in the channel which was due
+    to finish at time_finish, as one message from the user who started it.
+    Only the user's ID is kept, not their token, so this still works after
+    they log out or the server restarts. The channel is left for
+    standup_active to mark as inactive. This runs on the scheduler thread,
+    so it holds the data store lock itself.
+    '''
+    with database_lock.write():
+        channel = next((channel for channel in database.channels
+                        if channel.channel_id == channel_id), None)
+
+        # The summary may have been posted already, or another standup started since
+        if channel is None or channel.standup_user is None or \
+                channel.time_finish != time_finish:
+            return
+
+        post_summary(channel)
+        database.update()
+
+def post_summary(channel):
     '''
+    Posts the buffered messages of the channel's finished standup, if they
+    have not been posted yet
+    '''
+    if channel.standup_user is None:
+        return
+
     message = "".join(channel.buffer).rstrip()
-    message_send(token, channel.channel_id, message)
+    if message:
+        add_message(Message(channel.standup_user, channel.channel_id, message, int(time())))
+
+    channel.buffer = []
+    channel.standup_user = None
+
+def replay_journal():
+    '''
+    Adds the standup messages sent since the data store was last written
+    back into the buffers of their standups
+    '''
+    if journal.replay(database.channels):
+        database.update()
+
+def resume_standups():
+    '''
+    Schedules the end of every standup whose summary had not been posted
+    when the data store was last written. Those that are overdue are
+    finished straight away.
+    '''
+    for channel in database.channels:
+        if channel.standup_user is not None and channel.time_finish is not None:
+            schedule_standup(channel)
+
+database.on_load(replay_journal)
+database.on_load(resume_standups)
+database.on_flush(journal.clear)
@@ -0,0 +1,92 @@
+'''
+standup_journal.py
+
+Contains the journal that keeps standup messages between writes of the
+data store
+'''
+
+### Builtin/pip Modules ###
+import json
+from threading import Lock
+
+### Journal Settings ###
+JOURNAL_FILE = 'standup_journal.jsonl'
+
+class StandupJournal:
+    '''
+    An append only file of the lines sent to standups since data_store.p was
+    last written, so that standup_send does not have to write the whole data
+    store for every message.
+
+    Each entry records the channel, the time its standup finishes, where the
+    line goes in the channel's buffer and the line itself. Replaying only
+    adds a line to a buffer which is exactly that long, so entries which the
+    data store already has are skipped, and replaying twice changes nothing.
+    The journal is emptied each time the data store is written.
+    '''
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.file = None
+        self.lock = Lock()
+
+    def append(self, channel, line):
+        '''
+        Adds a line to the channel's standup buffer and records it in the journal
+        '''
+        entry = [channel.channel_id, channel.time_finish, len(channel.buffer), line]
+        channel.buffer.append(line)
+
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+
+    def replay(self, channels):
+        '''
+        Adds the lines in the journal which are missing from the buffers of
+        the given channels, returning how many were added
+        '''
+        by_id = {channel.channel_id: channel for channel in channels}
+        added = 0
+
+        with self.lock:
+            try:
+                with open(self.path, encoding='utf-8') as file:
+                    lines = file.readlines()
+            except OSError:
+                return 0
+
+        for text in lines:
+            try:
+                channel_id, time_finish, index, line = json.loads(text)
+            except ValueError:
+                # The last entry may have been cut off part way through
+                continue
+
+            channel = by_id.get(channel_id)
+            if channel is not None and channel.is_active and \
+                    channel.time_finish == time_finish and len(channel.buffer) == index:
+                channel.buffer.append(line)
+                added += 1
+
+        return added
+
+    def clear(self):
+        '''
+        Empties the journal, once everything in it has been written to the
+        data store
+        '''
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            try:
+                open(self.path, 'w', encoding='utf-8').close()
+            except OSError:
+                pass
+
+### Global Variables ###
+
+journal = StandupJournal()
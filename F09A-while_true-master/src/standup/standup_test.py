@@ -6,10 +6,13 @@ from time import sleep
 from datetime import datetime, timezone
 import pytest
 from error import InputError, AccessError
-from auth import auth_register
+from auth import auth_register, auth_logout
 from channels import channels_create
+from channel import channel_messages
 from standup import standup_active, standup_send, standup_start
 from workspace_reset import workspace_reset
+from data_store import database
+from scheduler import scheduler
 
 @pytest.fixture(autouse=True)
 def call_workspace_reset():
@@ -115,6 +118,20 @@ def test_standup_active_wait(setup_user):
     sleep(2)
     assert standup_active(token, channel_id)["is_active"] is False
 
+def test_standup_active_no_update(setup_user, monkeypatch):
+    '''
+    test that polling an active standup does not write the data store
+    '''
+    token = setup_user["token"]
+    channel_id = channels_create(token, "Standup", True)["channel_id"]
+    standup_start(token, channel_id, 1)
+
+    updates = []
+    monkeypatch.setattr(type(database), "update", lambda self: updates.append(True))
+    assert standup_active(token, channel_id)["is_active"] is True
+    assert not updates
+    sleep(2)
+
 def test_standup_active_not_in_channel(setup_user, setup_user2):
     '''
     test that standup raise access error for user not in channel
@@ -173,3 +190,73 @@ def test_standup_send_normal(setup_user):
     standup_start(token, channel_id, 1)
     assert standup_send(token, channel_id, "message") == {}
     sleep(2)
+
+def test_standup_summary_after_logout(setup_user, setup_user2):
+    '''
+    test the summary is posted as the user who started the standup,
+    even once they have logged out
+    '''
+    token = setup_user["token"]
+    channel_id = channels_create(token, "Standup", True)["channel_id"]
+    standup_start(token, channel_id, 1)
+    standup_send(token, channel_id, "first")
+    auth_logout(token)
+    sleep(2)
+
+    token = auth_register("validemail2@gmail.com", "123456", "Jane", "Citizen")["token"]
+    database.get_channel(channel_id).add_member(database.get_authed_user(token))
+    handle = database.get_user(setup_user["u_id"]).handle
+    messages = channel_messages(token, channel_id, 0)["messages"]
+    assert [(message["u_id"], message["message"]) for message in messages] \
+           == [(setup_user["u_id"], handle + ": first")]
+
+def test_standup_resumed_after_restart(setup_user, monkeypatch):
+    '''
+    test a standup which was due while the server was stopped has its
+    summary posted once the data store is loaded again
+    '''
+    monkeypatch.setattr(database.changes, "floor", database.changes.floor)
+    token = setup_user["token"]
+    channel_id = channels_create(token, "Standup", True)["channel_id"]
+    standup_start(token, channel_id, 1)
+    standup_send(token, channel_id, "first")
+
+    # The server stops before the standup ends, and starts after
+    scheduler.cancel_all()
+    database.flush()
+    sleep(1)
+    database.setup()
+    sleep(1)
+
+    handle = database.get_user(setup_user["u_id"]).handle
+    messages = channel_messages(token, channel_id, 0)["messages"]
+    assert [message["message"] for message in messages] == [handle + ": first"]
+
+def test_standup_send_journal(setup_user, monkeypatch):
+    '''
+    test standup_send does not write the data store, and that its messages
+    are replayed from the journal when the data store is loaded again
+    '''
+    monkeypatch.setattr(database.changes, "floor", database.changes.floor)
+    token = setup_user["token"]
+    channel_id = channels_create(token, "Standup", True)["channel_id"]
+    standup_start(token, channel_id, 60)
+
+    flushes = []
+    flush = database.flush
+    monkeypatch.setattr(database, "flush", lambda: flushes.append(1))
+    standup_send(token, channel_id, "first")
+    standup_send(token, channel_id, "second")
+    assert not flushes
+    monkeypatch.setattr(database, "flush", flush)
+
+    # The server stops before the data store is written again
+    scheduler.cancel_all()
+    database.setup()
+    handle = database.get_user(setup_user["u_id"]).handle
+    assert database.get_channel(channel_id).buffer == [handle + ": first\n",
+                                                       handle + ": second\n"]
+
+    # Replaying the journal again adds nothing
+    database.setup()
+    assert len(database.get_channel(channel_id).buffer) == 2
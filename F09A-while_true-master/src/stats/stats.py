@@ -0,0 +1,115 @@
+"""
+Contains the functions that report how the server is performing,
+and their HTTP routes:
+
+    /stats/caches
+    /stats/locks
+    /stats/scheduler
+    /stats/outbox
+    /stats/bots
+"""
+
+### Builtin/pip Modules ###
+from json import dumps
+from flask import request, Blueprint
+
+### Package Modules ###
+from data_store import database
+from cache import cache_stats
+from locks import lock_stats
+from scheduler import scheduler
+from outbox import outbox
+from bots import engine
+
+### Page Blueprint ###
+STATS_PAGE = Blueprint("stats_page", __name__)
+
+### Routes ###
+
+@STATS_PAGE.route("/stats/caches", methods=["GET"])
+def route_stats_caches():
+    """
+    HTTP route for stats_caches
+    """
+    token = request.args.get("token")
+    return dumps(stats_caches(token))
+
+@STATS_PAGE.route("/stats/locks", methods=["GET"])
+def route_stats_locks():
+    """
+    HTTP route for stats_locks
+    """
+    token = request.args.get("token")
+    return dumps(stats_locks(token))
+
+@STATS_PAGE.route("/stats/scheduler", methods=["GET"])
+def route_stats_scheduler():
+    """
+    HTTP route for stats_scheduler
+    """
+    token = request.args.get("token")
+    return dumps(stats_scheduler(token))
+
+@STATS_PAGE.route("/stats/outbox", methods=["GET"])
+def route_stats_outbox():
+    """
+    HTTP route for stats_outbox
+    """
+    token = request.args.get("token")
+    return dumps(stats_outbox(token))
+
+@STATS_PAGE.route("/stats/bots", methods=["GET"])
+def route_stats_bots():
+    """
+    HTTP route for stats_bots
+    """
+    token = request.args.get("token")
+    return dumps(stats_bots(token))
+
+### Functions ###
+def stats_caches(token):
+    """
+    Returns the entries, size, hits, misses, evictions and hit rate
+    of every response cache, by the name of the cache
+    """
+    database.get_authed_user(token)
+
+    return {"caches": cache_stats()}
+
+def stats_locks(token):
+    """
+    Returns how many times every lock was acquired for reading and for
+    writing, how many of those had to wait, and the total and longest
+    waits in seconds, by the name of the lock
+    """
+    database.get_authed_user(token)
+
+    return {"locks": lock_stats()}
+
+def stats_scheduler(token):
+    """
+    Returns how many scheduled jobs are pending, and for each kind of job,
+    how many were run, cancelled and failed, and the total and longest lag
+    in seconds between a job being due and being run
+    """
+    database.get_authed_user(token)
+
+    return {"scheduler": scheduler.stats()}
+
+def stats_outbox(token):
+    """
+    Returns how many emails were queued, sent, retried and failed, how many
+    batches and connections were made, and how many emails are waiting
+    """
+    database.get_authed_user(token)
+
+    return {"outbox": outbox.stats()}
+
+def stats_bots(token):
+    """
+    Returns how many bot commands were queued, run and failed, and how many
+    are waiting
+    """
+    database.get_authed_user(token)
+
+    return {"bots": engine.stats()}
@@ -0,0 +1,69 @@
+"""
+HTTP tests for the stats functions.
+Most tests have self-explanatory names.
+"""
+
+from time import sleep
+import pytest
+from http_test import get, post
+from error import AccessError
+
+# pylint: disable=missing-docstring,redefined-outer-name,invalid-name
+
+### setup ###
+
+def http_auth_register(email, password, first, last):
+    return post("auth/register", {"email": email, "password": password, \
+                                  "name_first": first, "name_last": last})
+
+@pytest.fixture
+def user():
+    post("workspace/reset")
+    return http_auth_register("email0@domain.com", "a" * 8, "F" * 5, "L" * 5)
+
+### test stats_caches ###
+
+def test_http_stats_caches_hit(user):
+    token = user["token"]
+    channel_id = post("channels/create", {"token": token, "name": "channel",
+                                          "is_public": True})["channel_id"]
+    post("message/send", {"token": token, "channel_id": channel_id, "message": "hi"})
+
+    before = get("stats/caches", {"token": token})["caches"]["channel_messages"]
+    for _ in range(2):
+        get("channel/messages", {"token": token, "channel_id": channel_id, "start": 0})
+    after = get("stats/caches", {"token": token})["caches"]["channel_messages"]
+
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+def test_http_stats_caches_invalid_token(user):
+    with pytest.raises(AccessError):
+        get("stats/caches", {"token": "invalidtoken"})
+
+### test stats_locks ###
+
+def test_http_stats_locks(user):
+    token = user["token"]
+    before = get("stats/locks", {"token": token})["locks"]["database"]
+    post("channels/create", {"token": token, "name": "channel", "is_public": True})
+    after = get("stats/locks", {"token": token})["locks"]["database"]
+
+    assert after["write"]["acquired"] == before["write"]["acquired"] + 1
+    assert after["read"]["acquired"] == before["read"]["acquired"] + 1
+
+### test stats_scheduler ###
+
+def test_http_stats_scheduler(user):
+    token = user["token"]
+    channel_id = post("channels/create", {"token": token, "name": "channel",
+                                          "is_public": True})["channel_id"]
+    before = get("stats/scheduler", {"token": token})["scheduler"]
+    post("standup/start", {"token": token, "channel_id": channel_id, "length": 1})
+    after = get("stats/scheduler", {"token": token})["scheduler"]
+
+    assert after["pending"] == before["pending"] + 1
+    sleep(2)
+
+    jobs = get("stats/scheduler", {"token": token})["scheduler"]["jobs"]
+    assert jobs["standup"]["run"] >= 1
@@ -0,0 +1,87 @@
+"""
+Tests for the stats functions.
+Most tests have self-explanatory names.
+"""
+
+import pytest
+from stats import stats_caches, stats_locks, stats_scheduler, stats_outbox, stats_bots
+from cache import LRUCache
+from scheduler import scheduler as global_scheduler
+from auth import auth_register
+from channels import channels_create
+from standup import standup_start
+from error import AccessError
+from workspace_reset import workspace_reset
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+### setup ###
+
+@pytest.fixture
+def token():
+    workspace_reset()
+    return auth_register("email0@domain.com", "a" * 8, "F" * 5, "L" * 5)["token"]
+
+### test stats_caches ###
+
+def test_stats_caches(token):
+    cache = LRUCache("test_stats_caches", max_entries=2)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    stats = stats_caches(token)["caches"]
+    assert stats["test_stats_caches"] == {"entries": 1, "size": 1, "hits": 1, "misses": 1,
+                                          "evictions": 0, "hit_rate": 0.5}
+    assert "channel_messages" in stats
+
+def test_stats_caches_invalid_token(token):
+    with pytest.raises(AccessError):
+        stats_caches("invalidtoken")
+
+### test stats_locks ###
+
+def test_stats_locks(token):
+    stats = stats_locks(token)["locks"]
+    assert stats["database"]["write"]["acquired"] > 0
+    assert "read" in stats["channels"] and "write" in stats["channels"]
+
+def test_stats_locks_invalid_token(token):
+    with pytest.raises(AccessError):
+        stats_locks("invalidtoken")
+
+### test stats_scheduler ###
+
+def test_stats_scheduler_reset(token):
+    channel_id = channels_create(token, "a", True)["channel_id"]
+    standup_start(token, channel_id, 60)
+    assert stats_scheduler(token)["scheduler"]["pending"] == 1
+
+    # A reset cancels everything that was scheduled
+    workspace_reset()
+    assert global_scheduler.pending() == 0
+
+def test_stats_scheduler_invalid_token(token):
+    with pytest.raises(AccessError):
+        stats_scheduler("invalidtoken")
+
+### test stats_outbox ###
+
+def test_stats_outbox(token):
+    stats = stats_outbox(token)["outbox"]
+    assert set(stats) == {"queued", "sent", "retried", "failed", "batches", "connections",
+                          "waiting"}
+
+def test_stats_outbox_invalid_token(token):
+    with pytest.raises(AccessError):
+        stats_outbox("invalidtoken")
+
+### test stats_bots ###
+
+def test_stats_bots(token):
+    stats = stats_bots(token)["bots"]
+    assert set(stats) == {"queued", "run", "failed", "waiting"}
+
+def test_stats_bots_invalid_token(token):
+    with pytest.raises(AccessError):
+        stats_bots("invalidtoken")
@@ -0,0 +1,115 @@
+'''
+photo_jobs.py
+
+Contains the worker pool that profile photos are fetched and cropped on
+'''
+
+### Builtin/pip Modules ###
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from threading import Lock
+
+### Package Modules ###
+from error import InputError, AccessError
+from data_store import database
+from cache import LRUCache
+
+### Pool Settings ###
+WORKERS = 4
+# Most jobs which may be waiting or running at once
+MAX_PENDING = 64
+# Seconds that the status of a job is kept for
+STATUS_SECONDS = 60 * 60
+
+class PhotoJobs:
+    '''
+    A bounded pool of worker threads which run profile photo jobs, so that
+    fetching an image from a slow host does not hold up a request. Each job
+    gets an ID, which its user can look up the status of until STATUS_SECONDS
+    after it was submitted. A job fails with the description of the error it
+    raised.
+    '''
+
+    def __init__(self, name, workers=WORKERS, max_pending=MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.max_pending = max_pending
+        self.pending = 0
+        self.ids = count(1)
+        self.lock = Lock()
+        self.jobs = LRUCache(name, max_entries=100000, ttl=STATUS_SECONDS)
+
+    def submit(self, user_id, work, *args):
+        '''
+        Runs work(*args) on the pool for the user, returning the job ID.
+        Raises an InputError if too many jobs are already waiting.
+        '''
+        with self.lock:
+            if self.pending >= self.max_pending:
+                raise InputError(description='Input error: too many photo uploads are in progress')
+            self.pending += 1
+            job_id = next(self.ids)
+
+        future = self.executor.submit(self.run, work, args)
+        self.jobs.put(job_id, (user_id, future))
+
+        return job_id
+
+    def run(self, work, args):
+        '''
+        Runs a job on a worker thread
+        '''
+        try:
+            return work(*args)
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def status(self, user_id, job_id):
+        '''
+        Returns the status of one of the user's jobs: pending, running, done
+        or failed, along with the error of a failed job
+        '''
+        future = self.future(user_id, job_id)
+
+        if future.running():
+            return {'job_id': job_id, 'status': 'running', 'error': None}
+        if not future.done():
+            return {'job_id': job_id, 'status': 'pending', 'error': None}
+
+        error = future.exception()
+        if error is None:
+            return {'job_id': job_id, 'status': 'done', 'error': None}
+
+        return {'job_id': job_id, 'status': 'failed', 'error': describe(error)}
+
+    def result(self, user_id, job_id, timeout=None):
+        '''
+        Waits for one of the user's jobs to finish, raising its error if it failed
+        '''
+        return self.future(user_id, job_id).result(timeout)
+
+    def future(self, user_id, job_id):
+        '''
+        Returns the future of one of the user's jobs
+        '''
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise InputError(description='Input error: invalid job ID')
+
+        if job[0] != user_id:
+            raise AccessError(description='Access error: the job belongs to another user')
+
+        return job[1]
+
+### Helper Functions ###
+
+def describe(error):
+    '''
+    Returns the message of an error raised by a job
+    '''
+    return getattr(error, 'description', None) or str(error) or type(error).__name__
+
+### Global Variables ###
+
+photo_jobs = PhotoJobs('photo_jobs')
+database.watch('workspace', lambda key: photo_jobs.jobs.clear())
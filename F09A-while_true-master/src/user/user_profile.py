@@ -3,20 +3,60 @@ implementations for user_profile functions
 '''
 #pylint: disable=invalid-name, line-too-long, len-as-condition, inconsistent-return-statements, too-many-boolean-expressions, too-many-arguments, unexpected-keyword-arg
 ### Builtin/pip Modules ###
+import os
 from json import dumps
 from io import BytesIO
-from flask import request, Blueprint, send_from_directory
+from hashlib import sha1
+from time import monotonic
+from threading import get_ident
+from datetime import datetime, timezone
+from flask import request, Blueprint, make_response, current_app
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
 from PIL import Image
 import requests
 
 ### Package Modules ###
 from error import InputError, AccessError
 from auth import email_valid
-from data_store import database
+from data_store import database, integral_id
+from responses import conditional_response
+from cache import LRUCache
+from locks import database_lock, locks_data_store
+from photo_jobs import photo_jobs
 
 ### Page Blueprint ###
 USERPROFILE_PAGE = Blueprint("user_page", __name__)
 
+### Profile Image Cache ###
+# The bytes of profile images, keyed by file name and modification time,
+# along with their ETag. A new upload replaces the file, so it gets a new key
+# and the old image is left to fall out of the cache.
+IMAGE_CACHE = LRUCache("profile_images", max_entries=1024, max_size=32 * 1024 * 1024)
+IMAGE_DIRECTORY = '../ProfilePics/'
+
+### Profile Images ###
+# Directory that uploaded profile images are saved in
+PHOTO_DIRECTORY = 'ProfilePics/'
+
+### Photo Download Limits ###
+# Seconds to wait to connect to an image host and for each read from it,
+# and for the whole download
+DOWNLOAD_TIMEOUT = (5, 10)
+DOWNLOAD_SECONDS = 30
+# Largest image that will be downloaded, in bytes, and decoded, in pixels
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40 * 1000 * 1000
+
+### Hangman Bot Profile ###
+HANGMAN_ID = 0
+HANGMAN_PROFILE = {'u_id': HANGMAN_ID,
+                   'email': "hangman@slackr.com.au",
+                   'name_first': "Hangman",
+                   'name_last': "Bot",
+                   'handle_str': "hangman",
+                   'profile_img_url': "https://visualpharm.com/assets/825/Bot-595b40b65ba036ed117d3818.svg"}
+
 ### Routes ###
 
 @USERPROFILE_PAGE.route("/user/profile", methods=['GET'])
@@ -26,7 +66,21 @@ def route_user_profile():
     '''
     u_id = int(request.args.get('u_id'))
     token = request.args.get('token')
-    return dumps(user_profile(token, u_id))
+    return conditional_response(user_profile_version(token, u_id),
+                                lambda: user_profile(token, u_id))
+
+@USERPROFILE_PAGE.route("/user/profile/batch", methods=['GET'])
+def route_user_profile_batch():
+    '''
+    routes for user_profile_batch, taking u_ids as a comma separated list
+    '''
+    token = request.args.get('token')
+    u_ids = ','.join(request.args.getlist('u_ids'))
+    try:
+        u_ids = [int(u_id) for u_id in u_ids.split(',') if u_id.strip()]
+    except ValueError:
+        raise InputError(description="Input error: u_ids must be a list of numbers")
+    return dumps(user_profile_batch(token, u_ids))
 
 @USERPROFILE_PAGE.route("/user/profile/setname", methods=['PUT'])
 def route_user_profile_setname():
@@ -57,6 +111,7 @@ def route_user_profile_sethandle():
     return dumps(user_profile_sethandle(token, handlestr))
 
 @USERPROFILE_PAGE.route('/user/profile/uploadphoto', methods=['POST'])
+@locks_data_store
 def route_user_profile_uploadphoto():
     '''
     Route for user_profile_uploadphoto
@@ -71,8 +126,19 @@ def route_user_profile_uploadphoto():
     y_start = int(payload.get('y_start'))
     x_end = int(payload.get('x_end'))
     y_end = int(payload.get('y_end'))
+    wait = payload.get('wait') is True
+
+    return dumps(user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end, wait))
+
+@USERPROFILE_PAGE.route('/user/profile/uploadphoto/status', methods=['GET'])
+def route_user_profile_uploadphoto_status():
+    '''
+    Route for user_profile_uploadphoto_status
+    '''
+    token = request.args.get('token')
+    job_id = int(request.args.get('job_id'))
 
-    return dumps(user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end))
+    return dumps(user_profile_uploadphoto_status(token, job_id))
 
 @USERPROFILE_PAGE.route('/imgurl', methods=['GET'])
 def route_imgurl():
@@ -81,8 +147,18 @@ def route_imgurl():
     '''
 
     u_id = request.args.get('u_id')
+    data, etag, modified = profile_image(f'{u_id}profileImg.jpg')
+
+    response = make_response(data)
+    response.mimetype = 'image/jpeg'
+    response.set_etag(etag)
+    response.last_modified = modified
+    # Clients may keep the image, but must check it has not changed, as a
+    # user's image is always served from the same URL
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
 
-    return send_from_directory('../ProfilePics/', f'{u_id}profileImg.jpg')
+    return response.make_conditional(request)
 
 
 ### Functions ###
@@ -104,25 +180,26 @@ def user_profile(token, u_id):
 
     database.get_authed_user(token)
 
-    if u_id != 0:
-        user = database.get_user(u_id)
-        return {
-            'user':{'u_id': u_id,
-                    'email': user.email,
-                    'name_first': user.name_first,
-                    'name_last': user.name_last,
-                    'handle_str': user.handle,
-                    'profile_img_url': user.profile_img_url}
-        }
+    return {'user': profile_json(u_id)}
 
-    return {
-        'user':{'u_id': u_id,
-                'email': "hangman@slackr.com.au",
-                'name_first': "Hangman",
-                'name_last': "Bot",
-                'handle_str': "hangman",
-                'profile_img_url': "https://visualpharm.com/assets/825/Bot-595b40b65ba036ed117d3818.svg"}
-    }
+def user_profile_batch(token, u_ids):
+    '''
+    Returns the profiles of many users at once, authenticating only once
+
+    Arguments:
+        token (string)    - Token of the authorised user
+        u_ids (list)      - User IDs of the user profiles
+
+    Exceptions:
+        InputError  - Occurs when any of the u_ids is not a valid user
+
+    Return Value:
+        Returns users, a list of the profiles (as returned by user_profile) in the order of u_ids on success
+    '''
+
+    database.get_authed_user(token)
+
+    return {'users': [profile_json(u_id) for u_id in u_ids]}
 
 def user_profile_setname(token, name_first, name_last):
     '''
@@ -148,6 +225,8 @@ def user_profile_setname(token, name_first, name_last):
 
     user.name_first = name_first
     user.name_last = name_last
+    database.record("profile_updated", {"u_id": user.user_id, "fields": ["name_first", "name_last"]},
+                    "users", ("user", user.user_id))
     database.update()
 
     return {
@@ -185,6 +264,8 @@ def user_profile_setemail(token, email):
 
     user.email = email
 
+    database.record("profile_updated", {"u_id": user.user_id, "fields": ["email"]},
+                    "users", ("user", user.user_id))
     database.update()
 
     return {'user' :{
@@ -220,6 +301,8 @@ def user_profile_sethandle(token, handle_str):
         raise InputError(description="Handle already taken by another user")
 
     user.set_handle(handle_str)
+    database.record("profile_updated", {"u_id": user.user_id, "fields": ["handle_str"]},
+                    "users", ("user", user.user_id))
     database.update()
 
     return {'user' :{
@@ -231,9 +314,11 @@ def user_profile_sethandle(token, handle_str):
         'profile_img_url':user.profile_img_url}
            }
 
-def user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end):
+def user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end, wait=False):
     '''
-    Upload a profile photo and crop for the authorised user
+    Upload a profile photo and crop for the authorised user. The image is
+    fetched and cropped on the photo worker pool, and by default this
+    returns straight away rather than waiting for it.
 
     Arguments:
         token (string)          - Token of the authorised user
@@ -242,39 +327,83 @@ def user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end):
         y_start (int)           - Start of the y-axis for cropping the image
         x_end (int)             - End of the x-axis for cropping the image
         y_end (int)             - End of the y-axis for cropping the image
+        wait (bool)             - Whether to wait for the photo to be uploaded,
+                                  in which case the errors of the upload are raised
 
     Exceptions:
         InputError  - Occurs when img_url returns an HTTP status other than 200
                     - X_start, y_start, x_end, y_end are not within the dimensions of the image
                     - Image uploaded is not a JPG
+                    - Image is too large, or takes too long to download
+                    - Too many uploads are already in progress
 
     Return Value:
-        Returns {} on success
+        Returns {job_id} straight away, whose status is given by
+        user_profile_uploadphoto_status, or {} once the photo is uploaded
+        when waiting
     '''
-    PATH = 'ProfilePics/'
     BOX = (x_start, y_start, x_end, y_end)
 
-    if token not in database.active_tokens:
-        raise AccessError('Unauthorised User')
+    # The data store lock is only held to start the job, as the job takes it
+    # to set the profile image URL, and may take a while to download the image
+    with database_lock.read():
+        if token not in database.active_tokens:
+            raise AccessError('Unauthorised User')
 
-    if not img_url.endswith('.jpg') and not img_url.endswith('.jpeg'):
-        raise InputError('Image must be of .jpg format')
+        if not img_url.endswith('.jpg') and not img_url.endswith('.jpeg'):
+            raise InputError('Image must be of .jpg format')
 
-    FILENAME = str(database.active_tokens[token]) + 'profileImg.jpg'
-    ROUTE = 'http://127.0.0.1:' + str(database.current_port) + '/imgurl?u_id=' + str(database.active_tokens[token])
+        user_id = database.active_tokens[token]
+        job_id = photo_jobs.submit(user_id, upload_photo_job, user_id, img_url, BOX)
 
-    try:
-        img_data = requests.get(img_url)
-    except:
-        raise InputError('The request failed.')
+    if not wait:
+        return {'job_id': job_id}
 
-    if img_data.status_code != 200:
-        raise InputError('The request failed.')
+    photo_jobs.result(user_id, job_id)
+
+    return {}
+
+def user_profile_uploadphoto_status(token, job_id):
+    '''
+    Returns the status of a photo upload made by the authorised user
+
+    Arguments:
+        token (string)          - Token of the authorised user
+        job_id (int)            - ID returned by user_profile_uploadphoto
+
+    Exceptions:
+        InputError  - Occurs when there is no upload with the job ID
+        AccessError - Occurs when the upload was made by another user
+
+    Return Value:
+        Returns {job_id, status, error} on success, where status is one of
+        pending, running, done or failed, and error describes a failure
+    '''
+    user = database.get_authed_user(token)
+
+    return photo_jobs.status(user.user_id, job_id)
+
+### Helper Functions ###
+
+def upload_photo(user_id, img_url, box):
+    '''
+    Downloads an image, crops it to the box and saves it as the user's
+    profile image. This runs on the photo worker pool.
+    '''
+    PATH = PHOTO_DIRECTORY
+    FILENAME = str(user_id) + 'profileImg.jpg'
+    x_start, y_start, x_end, y_end = box
 
     # Create, crop and save the image
-    image = Image.open(BytesIO(img_data.content))
+    try:
+        image = Image.open(BytesIO(download_image(img_url)))
+    except OSError:
+        raise InputError('The image could not be read.')
 
     width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise InputError('Image is too large.')
+
     if x_start < 0 or \
        y_start < 0 or \
        (x_end - x_start) < 0 or \
@@ -283,12 +412,110 @@ def user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end):
        (y_end - y_start) > height:
         raise InputError('Dimensions do not fit image size.')
 
-    image = image.crop(BOX)
-    image.save(f'{PATH}{FILENAME}')
+    # Replaced in one step, so the image is never read half written
+    image = image.crop(box)
+    TEMPORARY = f'{PATH}{FILENAME}.{get_ident()}'
+    image.save(TEMPORARY, format='JPEG')
+    os.replace(TEMPORARY, f'{PATH}{FILENAME}')
+
+def upload_photo_job(user_id, img_url, box):
+    '''
+    Does upload_photo, then sets the user's profile image URL, taking the
+    data store lock itself. This runs on the photo worker pool.
+    '''
+    upload_photo(user_id, img_url, box)
+
+    with database_lock.write():
+        set_photo_url(user_id)
+
+def download_image(img_url):
+    '''
+    Returns the bytes of the image at the URL, raising an InputError if
+    it cannot be fetched, is larger than MAX_IMAGE_BYTES or takes longer
+    than DOWNLOAD_SECONDS
+    '''
+    started = monotonic()
+    data = bytearray()
+
+    try:
+        with requests.get(img_url, timeout=DOWNLOAD_TIMEOUT, stream=True) as response:
+            if response.status_code != 200:
+                raise InputError('The request failed.')
+
+            length = response.headers.get('Content-Length', '')
+            if length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+                raise InputError('Image is too large.')
+
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > MAX_IMAGE_BYTES:
+                    raise InputError('Image is too large.')
+                if monotonic() - started > DOWNLOAD_SECONDS:
+                    raise InputError('The request took too long.')
+    except requests.RequestException:
+        raise InputError('The request failed.')
+
+    return bytes(data)
+
+def set_photo_url(user_id):
+    '''
+    Points the user's profile image URL at their uploaded image
+    '''
+    ROUTE = 'http://127.0.0.1:' + str(database.current_port) + '/imgurl?u_id=' + str(user_id)
 
     # Update the data_store.
     for user in database.users:
-        if user.user_id == database.active_tokens[token]:
+        if user.user_id == user_id:
             user.profile_img_url = ROUTE
+            database.record("profile_updated", {"u_id": user.user_id, "fields": ["profile_img_url"]},
+                            "users", ("user", user.user_id))
             database.update()
-            return {}
+            return
+
+def profile_image(filename):
+    '''
+    Returns the bytes, ETag and modification time of a profile image,
+    reading it from disk only if it is not cached
+    '''
+    path = safe_join(os.path.join(current_app.root_path, IMAGE_DIRECTORY), filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    image = IMAGE_CACHE.get((filename, os.stat(path).st_mtime_ns))
+
+    if image is None:
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            data = file.read()
+
+        modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+        image = (data, sha1(data).hexdigest(), modified)
+        IMAGE_CACHE.put((filename, stat.st_mtime_ns), image, len(data))
+
+    return image
+
+def user_profile_version(token, u_id):
+    '''
+    Checks the user profile can be fetched, and returns the versions it depends on
+    '''
+    database.get_authed_user(token)
+
+    if u_id != HANGMAN_ID:
+        database.get_user(u_id)
+
+    return (database.version(("user", u_id)),)
+
+def profile_json(u_id):
+    '''
+    Returns the profile of the user with the given ID, including the hangman bot
+    '''
+    if integral_id(u_id) == HANGMAN_ID:
+        return dict(HANGMAN_PROFILE)
+
+    user = database.get_user(u_id)
+    return {'u_id': user.user_id,
+            'email': user.email,
+            'name_first': user.name_first,
+            'name_last': user.name_last,
+            'handle_str': user.handle,
+            'profile_img_url': user.profile_img_url}
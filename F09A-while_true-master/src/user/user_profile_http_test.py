@@ -2,9 +2,15 @@
 '''
 Tests user_profile routes at the HTTP level
 '''
+import os
 import json
+from io import BytesIO
+from time import sleep
+from threading import Thread
+from http.server import HTTPServer, BaseHTTPRequestHandler
 import pytest
 import requests
+from PIL import Image
 from http_test import APP_URL
 
 ### setup ###
@@ -58,6 +64,28 @@ def test_user_profile_valid_case(setup_user):
              'profile_img_url': 'https://iupac.org/wp-content/uploads/2018/05/default-avatar.png'}
     }
 
+def test_user_profile_batch_valid_case(setup_user):
+    '''
+    tests user_profile_batch returns each requested profile in order
+    '''
+    token = setup_user["token"]
+    u_id = setup_user["u_id"]
+    payload = {"token":token, "u_ids":f"0,{u_id}"}
+    response = requests.get(APP_URL + "/user/profile/batch", params=payload)
+    data = json.loads(response.text)
+    assert [user['u_id'] for user in data['users']] == [0, u_id]
+    assert data['users'][1]['email'] == 'johncitizen@hotmail.com'
+
+def test_user_profile_batch_invalid_uid(setup_user):
+    '''
+    tests user_profile_batch when one of the u_ids is invalid
+    '''
+    token = setup_user["token"]
+    payload = {"token":token, "u_ids":"5000"}
+    response = requests.get(APP_URL + "/user/profile/batch", params=payload)
+    data = json.loads(response.text)
+    assert response.status_code == 400 and "invalid user ID" in data["message"]
+
 def test_user_profile_setname_valid(setup_user):
     '''
     changing the user's name to a valid name
@@ -193,7 +221,8 @@ def test_user_profile_setimage_valid(setup_user):
     img_url = 'https://library.kissclipart.com/20180904/taq/kissclipart-user-default-clipart-user-default-computer-icons-56aaaf9bba4a6738.jpg'
     SIZE = 500
 
-    payload = {'token':token, 'img_url': img_url, 'x_start':0, 'y_start':0, 'x_end': SIZE, 'y_end': SIZE}
+    payload = {'token':token, 'img_url': img_url, 'x_start':0, 'y_start':0, 'x_end': SIZE, 'y_end': SIZE,
+               'wait': True}
     response = requests.post(APP_URL + '/user/profile/uploadphoto', json=payload)
     assert response.status_code == 200
 
@@ -218,7 +247,8 @@ def test_user_profile_setimage_invalidurl(setup_user):
     img_url = 'https://doesnotexistcom.au/profile.jpg'
     SIZE = 500
 
-    payload = {'token':token, 'img_url': img_url, 'x_start':0, 'y_start':0, 'x_end': SIZE, 'y_end': SIZE}
+    payload = {'token':token, 'img_url': img_url, 'x_start':0, 'y_start':0, 'x_end': SIZE, 'y_end': SIZE,
+               'wait': True}
     response = requests.post(APP_URL + '/user/profile/uploadphoto', json=payload)
     data = json.loads(response.text)['message']
     assert response.status_code == 400 and 'The request failed' in data
@@ -244,7 +274,8 @@ def test_user_profile_setimage_invalid_boundshigher(setup_user):
     img_url = 'https://library.kissclipart.com/20180904/taq/kissclipart-user-default-clipart-user-default-computer-icons-56aaaf9bba4a6738.jpg'
     SIZE = 1000
 
-    payload = {'token':token, 'img_url': img_url, 'x_start':0, 'y_start':0, 'x_end': SIZE, 'y_end': SIZE}
+    payload = {'token':token, 'img_url': img_url, 'x_start':0, 'y_start':0, 'x_end': SIZE, 'y_end': SIZE,
+               'wait': True}
     response = requests.post(APP_URL + '/user/profile/uploadphoto', json=payload)
     data = json.loads(response.text)['message']
     assert response.status_code == 400 and 'Dimensions do not fit image size' in data
@@ -257,7 +288,76 @@ def test_user_profile_setimage_invalid_boundslower(setup_user):
     img_url = 'https://library.kissclipart.com/20180904/taq/kissclipart-user-default-clipart-user-default-computer-icons-56aaaf9bba4a6738.jpg'
     SIZE = 500
 
-    payload = {'token':token, 'img_url': img_url, 'x_start':-100, 'y_start':-100, 'x_end': SIZE, 'y_end': SIZE}
+    payload = {'token':token, 'img_url': img_url, 'x_start':-100, 'y_start':-100, 'x_end': SIZE, 'y_end': SIZE,
+               'wait': True}
     response = requests.post(APP_URL + '/user/profile/uploadphoto', json=payload)
     data = json.loads(response.text)['message']
     assert response.status_code == 400 and 'Dimensions do not fit image size' in data
+
+def test_imgurl_conditional():
+    '''
+    Fetching a profile image gives validators, and a 304 when it is unchanged
+    '''
+    directory = os.path.join(os.path.dirname(__file__), '..', '..', 'ProfilePics')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '-1profileImg.jpg')
+    with open(path, 'wb') as file:
+        file.write(b'not really a jpeg')
+
+    try:
+        response = requests.get(APP_URL + '/imgurl', params={'u_id': -1})
+        assert response.status_code == 200 and response.content == b'not really a jpeg'
+        assert 'no-cache' in response.headers['Cache-Control']
+        assert 'Last-Modified' in response.headers
+
+        response = requests.get(APP_URL + '/imgurl', params={'u_id': -1},
+                                headers={'If-None-Match': response.headers['ETag']})
+        assert response.status_code == 304 and response.content == b''
+    finally:
+        os.remove(path)
+
+def test_imgurl_missing():
+    '''
+    Fetching the image of a user who has not uploaded one
+    '''
+    response = requests.get(APP_URL + '/imgurl', params={'u_id': -2})
+    assert response.status_code == 404
+
+class ImageHandler(BaseHTTPRequestHandler):
+    '''
+    Serves a 100 by 50 JPEG at every path
+    '''
+    def do_GET(self):
+        data = BytesIO()
+        Image.new('RGB', (100, 50)).save(data, 'JPEG')
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(data.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+def test_user_profile_uploadphoto_status(setup_user):
+    '''
+    Uploading a profile image returns a job straight away, whose status can be checked
+    '''
+    server = HTTPServer(('127.0.0.1', 0), ImageHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    img_url = f'http://127.0.0.1:{server.server_address[1]}/image.jpg'
+    token = setup_user['token']
+
+    try:
+        payload = {'token': token, 'img_url': img_url, 'x_start': 0, 'y_start': 0,
+                   'x_end': 50, 'y_end': 50}
+        job_id = requests.post(APP_URL + '/user/profile/uploadphoto', json=payload).json()['job_id']
+
+        for _ in range(100):
+            status = requests.get(APP_URL + '/user/profile/uploadphoto/status',
+                                  params={'token': token, 'job_id': job_id}).json()
+            if status['status'] != 'pending' and status['status'] != 'running':
+                break
+            sleep(0.05)
+        assert status == {'job_id': job_id, 'status': 'done', 'error': None}
+    finally:
+        server.shutdown()
+        server.server_close()
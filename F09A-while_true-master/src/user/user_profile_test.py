@@ -2,13 +2,21 @@
 '''
 integration tests for user_profile.py
 '''
+import os
+from io import BytesIO
+from time import sleep
+from threading import Thread, Event
+from http.server import HTTPServer, BaseHTTPRequestHandler
 import pytest
+from PIL import Image
 from error import InputError, AccessError
-from user_profile import user_profile, user_profile_setname, \
+import user_profile as _user_profile
+from user_profile import user_profile, user_profile_batch, user_profile_setname, \
                          user_profile_setemail, user_profile_sethandle, \
-                         user_profile_uploadphoto
+                         user_profile_uploadphoto, user_profile_uploadphoto_status
 from auth import auth_register
 from workspace_reset import workspace_reset
+from locks import database_lock
 
 @pytest.fixture(autouse=True)
 def call_workspace_reset():
@@ -49,6 +57,59 @@ def test_invalid_uid_user_profile(get_new_user):
     with pytest.raises(InputError):
         user_profile(token, invalid_uid)
 
+def test_user_profile_uid_types(get_new_user):
+    '''
+    Tests that a u_id given as a float or a string is looked up as an int
+    '''
+    token = get_new_user["token"]
+    u_id = get_new_user["u_id"]
+    assert user_profile(token, float(u_id)) == user_profile(token, u_id)
+    assert user_profile(token, str(u_id)) == user_profile(token, u_id)
+    assert user_profile(token, "0")['user']['handle_str'] == 'hangman'
+    for invalid in (None, float('inf'), 2.5, 1.9, True, "1.0", " 1", "-1"):
+        with pytest.raises(InputError):
+            user_profile(token, invalid)
+
+def test_user_profile_uid_not_rounded(get_new_user):
+    '''
+    Tests that a u_id with a fractional part is not taken to mean another user
+    '''
+    token = get_new_user["token"]
+    other = auth_register("johncitizen@unsw.edu.au", "123456", "John", "Citizen")["u_id"]
+    with pytest.raises(InputError):
+        user_profile(token, other + 0.5)
+    with pytest.raises(InputError):
+        user_profile(token, other - 0.1)
+
+def test_user_profile_batch(get_new_user):
+    '''
+    Tests fetching many profiles at once, including the hangman bot
+    '''
+    token = get_new_user["token"]
+    u_id = get_new_user["u_id"]
+    other = auth_register("johncitizen@unsw.edu.au", "123456", "John", "Citizen")["u_id"]
+    result = user_profile_batch(token, [other, 0, u_id])
+    assert result == {'users': [user_profile(token, other)['user'],
+                                user_profile(token, 0)['user'],
+                                user_profile(token, u_id)['user']]}
+    assert result['users'][1]['handle_str'] == 'hangman'
+
+def test_user_profile_batch_invalid_uid(get_new_user):
+    '''
+    Tests that one invalid u_id fails the whole batch
+    '''
+    token = get_new_user["token"]
+    u_id = get_new_user["u_id"]
+    with pytest.raises(InputError):
+        user_profile_batch(token, [u_id, 5000])
+
+def test_user_profile_batch_invalid_token():
+    '''
+    Tests that the batch is rejected for an invalid token
+    '''
+    with pytest.raises(AccessError):
+        user_profile_batch('invalidtoken', [0])
+
 def test_user_profile_setname_valid(get_new_user):
     '''
     Test for when the first and last name is valid
@@ -255,7 +316,7 @@ def test_user_profile_setimage_valid(get_new_user):
     img_url = 'https://library.kissclipart.com/20180904/taq/kissclipart-user-default-clipart-user-default-computer-icons-56aaaf9bba4a6738.jpg'
     SIZE = 500
 
-    assert user_profile_uploadphoto(token, img_url, 0, 0, SIZE, SIZE) == {}
+    assert user_profile_uploadphoto(token, img_url, 0, 0, SIZE, SIZE, wait=True) == {}
 
 def test_user_profile_setimage_invalidtoken():
     '''
@@ -279,7 +340,7 @@ def test_user_profile_setimage_invalidurl(get_new_user):
     SIZE = 500
 
     with pytest.raises(InputError) as _:
-        user_profile_uploadphoto(token, img_url, 0, 0, SIZE, SIZE)
+        user_profile_uploadphoto(token, img_url, 0, 0, SIZE, SIZE, wait=True)
 
 def test_user_profile_setimage_invalidformat(get_new_user):
     '''
@@ -303,7 +364,7 @@ def test_user_profile_setimage_invalid_boundshigher(get_new_user):
     SIZE = 1000
 
     with pytest.raises(InputError) as _:
-        user_profile_uploadphoto(token, img_url, 0, 0, SIZE, SIZE)
+        user_profile_uploadphoto(token, img_url, 0, 0, SIZE, SIZE, wait=True)
 
 def test_user_profile_setimage_invalid_boundslower(get_new_user):
     '''
@@ -314,4 +375,135 @@ def test_user_profile_setimage_invalid_boundslower(get_new_user):
     SIZE = 500
 
     with pytest.raises(InputError) as _:
-        user_profile_uploadphoto(token, img_url, -100, -100, SIZE, SIZE)
+        user_profile_uploadphoto(token, img_url, -100, -100, SIZE, SIZE, wait=True)
+
+### local image host ###
+
+class ImageHandler(BaseHTTPRequestHandler):
+    '''
+    Serves a 100 by 50 JPEG at every path
+    '''
+    def do_GET(self):
+        data = BytesIO()
+        Image.new('RGB', (100, 50)).save(data, 'JPEG')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data.getvalue())))
+        self.end_headers()
+        self.wfile.write(data.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def photo_directory(tmp_path, monkeypatch):
+    '''
+    Saves uploaded profile images in a temporary directory
+    '''
+    monkeypatch.setattr(_user_profile, 'PHOTO_DIRECTORY', f'{tmp_path}/')
+    return tmp_path
+
+@pytest.fixture
+def image_url(photo_directory):
+    '''
+    Runs a local image host, returning the URL of its image
+    '''
+    server = HTTPServer(('127.0.0.1', 0), ImageHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/image.jpg'
+    server.shutdown()
+    server.server_close()
+
+def wait_for_job(token, job_id):
+    '''
+    Waits for a photo upload job to finish, returning its status
+    '''
+    for _ in range(100):
+        status = user_profile_uploadphoto_status(token, job_id)
+        if status['status'] in ('done', 'failed'):
+            return status
+        sleep(0.05)
+    return status
+
+def test_user_profile_setimage_local(get_new_user, image_url, photo_directory):
+    '''
+    Uploading a profile image from a local host, waiting for it
+    '''
+    token = get_new_user['token']
+    assert user_profile_uploadphoto(token, image_url, 0, 0, 50, 50, wait=True) == {}
+    assert 'imgurl' in user_profile(token, get_new_user['u_id'])['user']['profile_img_url']
+    assert Image.open(photo_directory / f"{get_new_user['u_id']}profileImg.jpg").size == (50, 50)
+
+def test_user_profile_setimage_job(get_new_user, image_url):
+    '''
+    Uploading a profile image returns straight away, then its status is checked
+    '''
+    token = get_new_user['token']
+    job_id = user_profile_uploadphoto(token, image_url, 0, 0, 50, 50)['job_id']
+
+    assert wait_for_job(token, job_id) == {'job_id': job_id, 'status': 'done', 'error': None}
+    assert 'imgurl' in user_profile(token, get_new_user['u_id'])['user']['profile_img_url']
+
+def test_user_profile_setimage_job_failed(get_new_user, image_url):
+    '''
+    A job which does not fit the image fails with the error
+    '''
+    token = get_new_user['token']
+    job_id = user_profile_uploadphoto(token, image_url, 0, 0, 500, 500)['job_id']
+
+    status = wait_for_job(token, job_id)
+    assert status['status'] == 'failed' and 'Dimensions do not fit' in status['error']
+
+def test_user_profile_setimage_too_large(get_new_user, image_url, monkeypatch):
+    '''
+    Uploading a profile image larger than the limit
+    '''
+    monkeypatch.setattr(_user_profile, 'MAX_IMAGE_BYTES', 100)
+    token = get_new_user['token']
+
+    with pytest.raises(InputError):
+        user_profile_uploadphoto(token, image_url, 0, 0, 50, 50, wait=True)
+
+def test_user_profile_setimage_job_status_invalid(get_new_user, image_url):
+    '''
+    Checking the status of a job which does not exist or is another user's
+    '''
+    token = get_new_user['token']
+    job_id = user_profile_uploadphoto(token, image_url, 0, 0, 50, 50)['job_id']
+    other = auth_register("janesmith@unsw.edu.au", "123456", "Jane", "Smith")['token']
+
+    with pytest.raises(InputError):
+        user_profile_uploadphoto_status(token, job_id + 1)
+    with pytest.raises(AccessError):
+        user_profile_uploadphoto_status(other, job_id)
+    wait_for_job(token, job_id)
+
+def test_user_profile_setimage_unlocked(get_new_user, image_url, monkeypatch):
+    '''
+    Waiting for an upload does not keep the data store locked
+    '''
+    token = get_new_user['token']
+    release = Event()
+    download = _user_profile.download_image
+
+    def slow_download(img_url):
+        release.wait(5)
+        return download(img_url)
+
+    monkeypatch.setattr(_user_profile, 'download_image', slow_download)
+    upload = Thread(target=user_profile_uploadphoto, args=(token, image_url, 0, 0, 50, 50, True))
+    upload.start()
+
+    locked = Event()
+
+    def write():
+        with database_lock.write():
+            locked.set()
+
+    writer = Thread(target=write)
+    writer.start()
+    assert locked.wait(2)
+
+    release.set()
+    upload.join(5)
+    writer.join(5)
+    assert 'imgurl' in user_profile(token, get_new_user['u_id'])['user']['profile_img_url']
@@ -3,16 +3,38 @@ Contains users_all function and its HTTP route
 """
 
 ### Builtin/pip Modules ###
-from json import dumps
+from bisect import bisect_right
+from itertools import islice
 from flask import request, Blueprint
 
 ### Package Modules ###
 from error import InputError
 from data_store import database
+from responses import conditional_response
+from arguments import parse_int
+from cache import LRUCache
 
 ### Page Blueprint ###
 USERS_ALL_PAGE = Blueprint("users_page", __name__)
 
+### Payload Cache ###
+# Encoded payloads of /users/all, which are dropped whenever a user changes
+USERS_CACHE = LRUCache("users_all", max_entries=256, max_size=64 * 1024 * 1024)
+database.watch("users", lambda key: USERS_CACHE.clear())
+database.watch("workspace", lambda key: USERS_CACHE.clear())
+
+### User Fields ###
+# Maps each field that can be requested through `fields` to a function
+# which reads it from a User object. Insertion order is the output order.
+USER_FIELDS = {
+    "u_id": lambda user: user.user_id,
+    "email": lambda user: user.email,
+    "name_first": lambda user: user.name_first,
+    "name_last": lambda user: user.name_last,
+    "handle_str": lambda user: user.handle,
+    "profile_img_url": lambda user: user.profile_img_url
+}
+
 ### Routes ###
 
 @USERS_ALL_PAGE.route("/users/all", methods=["GET"])
@@ -21,30 +43,105 @@ def route_users_all():
     HTTP route for users_all
     """
     token = request.args.get("token")
-    return dumps(users_all(token))
+    limit = parse_int(request.args.get("limit"), "limit")
+    cursor = parse_int(request.args.get("cursor"), "cursor")
+    fields = request.args.get("fields")
+    fields = fields.split(",") if fields is not None else None
+
+    return conditional_response(users_all_version(token, limit, cursor, fields),
+                                lambda: users_all_payload(token, limit, cursor, fields),
+                                stream=True, cache=USERS_CACHE)
 
 ### Functions ###
 
-def users_all(token):
+def users_all(token, limit=None, cursor=None, fields=None):
+    """
+    Returns a list of all users in the workspace.
+
+    When `limit` is given, at most `limit` users are returned along with a
+    `next_cursor`, which is passed back as `cursor` to fetch the next page
+    (it is None on the last page). `fields` restricts each user to the
+    listed keys.
+    """
+    data = users_all_payload(token, limit, cursor, fields)
+    data["users"] = list(data["users"])
+
+    return data
+
+### Helper Functions ###
+
+def users_all_payload(token, limit=None, cursor=None, fields=None):
     """
-    Returns a list of all users in the workspace
+    Does the work of users_all, except that when the users are not paged
+    they are left as a generator, so they can be streamed to the client
     """
 
     if not isinstance(token, str):
         raise InputError(description="Input error: invalid arguments")
 
+    if limit is not None and limit < 1:
+        raise InputError(description="Input error: limit must be 1 or more")
+
+    fields = check_fields(fields)
+
     data = {"users": []}
-    users = data["users"]
 
     if database.get_authed_user(token, error=False):
-        for user in database.users:
-            users.append({
-                "u_id": user.user_id,
-                "email": user.email,
-                "name_first": user.name_first,
-                "name_last": user.name_last,
-                "handle_str": user.handle,
-                "profile_img_url": user.profile_img_url
-            })
+        users = iter_users(cursor, fields)
+
+        if limit is None:
+            data["users"] = users
+        else:
+            data["users"] = list(islice(users, limit))
+            has_more = next(users, None) is not None
+            data["next_cursor"] = data["users"][-1]["u_id"] if has_more else None
 
     return data
+
+def users_all_version(token, limit=None, cursor=None, fields=None):
+    """
+    Returns the versions that the list of users depends on. An invalid
+    token gets an empty list, so whether the token is valid is included,
+    as is the page and the fields asked for.
+    """
+    if not isinstance(token, str):
+        raise InputError(description="Input error: invalid arguments")
+
+    is_authed = database.get_authed_user(token, error=False) is not None
+
+    return (database.version("users"), int(is_authed), limit, cursor, ",".join(fields or ()))
+
+def iter_users(cursor=None, fields=None):
+    """
+    Lazily yields the json of every user with a user ID greater than
+    `cursor`, reading straight from the user list in the data store.
+    Users are stored in order of their IDs, so the starting point is
+    found with a binary search rather than a scan.
+    """
+    getters = [(field, USER_FIELDS[field]) for field in fields or USER_FIELDS]
+
+    start = 0
+    if cursor is not None:
+        start = bisect_right(database.users, cursor, key=lambda user: user.user_id)
+
+    for user in islice(database.users, start, None):
+        yield {field: getter(user) for field, getter in getters}
+
+def check_fields(fields):
+    """
+    Validates a list of requested user fields, returning None when every
+    field should be included. Always keeps u_id, as it is needed for paging.
+    """
+    if fields is None:
+        return None
+
+    fields = [field.strip() for field in fields if field.strip()]
+
+    for field in fields:
+        if field not in USER_FIELDS:
+            raise InputError(description="Input error: unknown user field " + field)
+
+    if "u_id" not in fields:
+        fields.insert(0, "u_id")
+
+    return fields
@@ -4,7 +4,8 @@ Most tests have self-explanatory names.
 """
 
 import pytest
-from http_test import get, post, put
+import requests
+from http_test import APP_URL, get, post, put
 from error import InputError
 
 # pylint: disable=missing-docstring,redefined-outer-name,unused-variable,invalid-name
@@ -107,6 +108,48 @@ def test_http_users_all_change_handle(setup):
     user = http_user_profile(token, user["u_id"])
     assert http_users_all(token) == [user]
 
+def test_http_users_all_paged(setup):
+    token, user = setup
+    users = [user] + [make_user(i)[1] for i in range(1, NUM_USERS + 1)]
+
+    page = get("users/all", {"token": token, "limit": 5})
+    assert page["users"] == users[:5]
+
+    page = get("users/all", {"token": token, "limit": 100, "cursor": page["next_cursor"]})
+    assert page == {"users": users[5:], "next_cursor": None}
+
+def test_http_users_all_fields(setup):
+    token, user = setup
+    result = get("users/all", {"token": token, "fields": "u_id,handle_str"})
+    assert result["users"] == [{"u_id": user["u_id"], "handle_str": user["handle_str"]}]
+
+def test_http_users_all_invalid_limit(setup):
+    token, user = setup
+    with pytest.raises(InputError):
+        get("users/all", {"token": token, "limit": "many"})
+
+def test_http_users_all_not_modified(setup):
+    token, user = setup
+    etag = requests.get(APP_URL + "/users/all", params={"token": token}).headers["ETag"]
+
+    response = requests.get(APP_URL + "/users/all", params={"token": token},
+                            headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    http_user_profile_setname(token, "G" * 5, "M" * 5)
+    response = requests.get(APP_URL + "/users/all", params={"token": token},
+                            headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["users"][0]["name_first"] == "G" * 5
+
+def test_http_users_all_cached(setup):
+    token, user = setup
+    first = requests.get(APP_URL + "/users/all", params={"token": token}).text
+    assert requests.get(APP_URL + "/users/all", params={"token": token}).text == first
+
+    http_user_profile_setname(token, "G" * 5, "M" * 5)
+    assert http_users_all(token)[0]["name_first"] == "G" * 5
+
 # this must be the last test because
 # the first user is logged out
 def test_http_users_all_invalid_token(setup):
@@ -3,7 +3,9 @@ Tests for the users_all function.
 Most tests have self-explanatory names.
 """
 
+from json import dumps, loads
 import pytest
+from error import InputError
 import users_all as _users_all # named like this to avoid a namespace
                                # conflict with the users_all wrapper
                                # function in this file
@@ -13,6 +15,8 @@ import user_profile as _user_profile # named like this to avoid a namespace
                                      # function in this file
 from user_profile import user_profile_setname, user_profile_setemail, user_profile_sethandle
 from workspace_reset import workspace_reset
+from responses import stream_json, CHUNK_SIZE
+from server import APP
 
 # pylint: disable=missing-docstring,redefined-outer-name,unused-variable
 
@@ -88,6 +92,100 @@ def test_users_all_change_handle(setup):
     user = user_profile(token, user["u_id"])
     assert users_all(token) == [user]
 
+def test_users_all_paged(setup):
+    token, user = setup
+    users = [user] + [make_user(i)[1] for i in range(1, NUM_USERS + 1)]
+
+    page = _users_all.users_all(token, limit=4)
+    assert page["users"] == users[:4]
+    assert page["next_cursor"] == users[3]["u_id"]
+
+    collected = []
+    cursor = None
+    while True:
+        page = _users_all.users_all(token, limit=4, cursor=cursor)
+        collected += page["users"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert collected == users
+
+def test_users_all_paged_exact(setup):
+    token, user = setup
+    page = _users_all.users_all(token, limit=1)
+    assert page == {"users": [user], "next_cursor": None}
+
+def test_users_all_fields(setup):
+    token, user = setup
+    result = _users_all.users_all(token, fields=["handle_str"])
+    assert result["users"] == [{"u_id": user["u_id"], "handle_str": user["handle_str"]}]
+
+def test_users_all_invalid_field(setup):
+    token, user = setup
+    with pytest.raises(InputError):
+        _users_all.users_all(token, fields=["password"])
+
+def test_users_all_invalid_limit(setup):
+    token, user = setup
+    with pytest.raises(InputError):
+        _users_all.users_all(token, limit=0)
+
+def test_users_all_streamed(setup):
+    token, user = setup
+    for i in range(1, NUM_USERS + 1):
+        make_user(i)
+
+    chunks = list(stream_json(_users_all.users_all_payload(token)))
+    assert "".join(chunks) == dumps(_users_all.users_all(token))
+    assert all(len(chunk) < CHUNK_SIZE * 2 for chunk in chunks)
+
+def test_users_all_cache_invalidated(setup):
+    token, user = setup
+    for change in (lambda: user_profile_setname(token, "G" * 5, "M" * 5),
+                   lambda: user_profile_setemail(token, "changed@unsw.edu.au"),
+                   lambda: user_profile_sethandle(token, "changed"),
+                   lambda: make_user(1)):
+        _users_all.USERS_CACHE.put(("etag",), "[]")
+        change()
+        assert _users_all.USERS_CACHE.get(("etag",)) is None
+
+def test_users_all_not_modified_skips_cache(setup):
+    token, user = setup
+    client = APP.test_client()
+    response = client.get("/users/all", query_string={"token": token})
+    # The streamed body is cached once it has all been read
+    assert response.data
+    etag = response.headers["ETag"]
+    before = _users_all.USERS_CACHE.stats()
+
+    # A 304 neither hits nor misses the cache
+    response = client.get("/users/all", query_string={"token": token},
+                          headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    stats = _users_all.USERS_CACHE.stats()
+    assert (stats["hits"], stats["misses"]) == (before["hits"], before["misses"])
+
+    client.get("/users/all", query_string={"token": token})
+    assert _users_all.USERS_CACHE.stats()["hits"] == before["hits"] + 1
+
+def test_users_all_not_modified_per_page(setup):
+    token, user = setup
+    make_user(1)
+    client = APP.test_client()
+    response = client.get("/users/all", query_string={"token": token})
+    assert response.data
+    etag = response.headers["ETag"]
+
+    # Another page or other fields are a different payload, so have another ETag
+    for args in ({"limit": 1}, {"cursor": user["u_id"]}, {"fields": "u_id"}):
+        response = client.get("/users/all", query_string=dict(args, token=token),
+                              headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert loads(response.data) == _users_all.users_all(token, **{
+            "limit": args.get("limit"), "cursor": args.get("cursor"),
+            "fields": args["fields"].split(",") if "fields" in args else None})
+
 # this must be the last test because
 # the first user is logged out
 def test_users_all_invalid_token(setup):